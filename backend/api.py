@@ -1,38 +1,56 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, WebSocket, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 import shutil
 import os
+import json
+import asyncio
 import logging
-from gtts import gTTS
 import uuid
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip, concatenate_audioclips
 import time
+import threading
 from fastapi.middleware.cors import CORSMiddleware
-from inference import predict_lip_reading
+from anyio import to_thread
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.startup import STARTUP
+from utils.tracing import trace_request, span
+from jobs import JobStore, JobWorker, job_status, validate_callback_url
+from pipeline import get_predict_pipeline, StageError
+from media import output_filename, register_render, render_in_background, ensure_output, purge_stale_renders
+from storage import get_output_store, OutputSweeper
+from utils.metrics import render_metrics, CONTENT_TYPE, HTTP_IN_FLIGHT, HTTP_REQUESTS, HTTP_REQUEST_SECONDS, QUEUE_DEPTH, STAGE_SECONDS
+from typing import Optional
 import tempfile
 from pathlib import Path
-import math
-
-# Configure ImageMagick for moviepy
-import moviepy.config as cf
-cf.IMAGEMAGICK_BINARY = r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = setup_logger(__name__)
 
 app = FastAPI()
 
 # Create directories
 os.makedirs("static", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)
-os.makedirs("outputs", exist_ok=True)
+os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
 os.makedirs("temp", exist_ok=True)
+os.makedirs(os.path.join(Config.JOBS_DIR, "inputs"), exist_ok=True)
+
+# Persistent queue for /jobs; workers start with the app
+job_store = JobStore()
+job_worker = JobWorker(job_store, lambda job_id, video_path, filename: process_video(job_id, video_path, filename))
+
+# Generated outputs are indexed and evicted by TTL / size quota in the background
+output_store = get_output_store()
+output_sweeper = OutputSweeper(output_store, hooks=[purge_stale_renders])
+
+# torch, dlib, cv2 and moviepy are imported on first use, not here
+STARTUP.record("api_import", time.time() - STARTUP.created)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
 # Add CORS middleware
 app.add_middleware(
@@ -43,200 +61,244 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def loop_audio(audio_clip, target_duration):
-    """Custom function to loop audio to match target duration"""
-    if audio_clip.duration >= target_duration:
-        return audio_clip.subclip(0, target_duration)
-    
-    # Calculate how many times we need to repeat
-    repeat_count = math.ceil(target_duration / audio_clip.duration)
-    
-    # Create list of audio clips to concatenate
-    audio_clips = [audio_clip] * repeat_count
-    
-    # Concatenate and trim to exact duration
-    looped_audio = concatenate_audioclips(audio_clips)
-    return looped_audio.subclip(0, target_duration)
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Route templates (not raw paths) keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(status))
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route)
+
+def queue_depths() -> dict:
+    depths = {(name,): stats["queue_depth"] for name, stats in get_predict_pipeline().stats().items()}
+    depths[("jobs",)] = job_store.queue_depth()
+    return depths
+
+QUEUE_DEPTH.set_function(queue_depths)
+
+def load_models():
+    """Import, load and warm up the heavy subsystems while the server already answers /healthz"""
+    try:
+        with STARTUP.phase("import_inference"):
+            import inference
+            from landmarks import get_landmark_service
+        with STARTUP.phase("thread_budget"):
+            inference.apply_thread_budget()
+        with STARTUP.phase("landmark_predictor"):
+            get_landmark_service().load()
+        with STARTUP.phase("model"):
+            model = inference.get_runtime(Config.WEIGHTS_PATH, Config.DEVICE)
+        if Config.WARMUP_ENABLED:
+            STARTUP.set_warmup("running")
+            with STARTUP.phase("warmup"):
+                STARTUP.set_warmup("done", **inference.warmup(model, Config.DEVICE))
+        else:
+            STARTUP.set_warmup("skipped")
+    except Exception as e:
+        if STARTUP.warmup["status"] == "running":
+            STARTUP.set_warmup("failed", error=str(e))
+        logger.error(f"❌ Startup loading failed, not ready: {str(e)}")
+        return
+    STARTUP.mark_ready()
+
+@app.on_event("startup")
+async def start_job_worker():
+    to_thread.current_default_thread_limiter().total_tokens = Config.API_THREADS
+    threading.Thread(target=load_models, name="startup", daemon=True).start()
+    get_predict_pipeline()
+    job_worker.start()
+    output_sweeper.start()
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    job_worker.stop()
+    output_sweeper.stop()
+    get_predict_pipeline().stop()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=await run_in_threadpool(render_metrics), media_type=CONTENT_TYPE)
+
+@app.get("/pipeline/stats")
+async def pipeline_stats():
+    """Per-stage worker, queue and latency counters"""
+    return get_predict_pipeline().stats()
 
 @app.get("/healthz")
 async def health_check():
+    """Liveness: the process is serving, models may still be loading"""
     return {"status": "ok", "message": "Server is running"}
 
+@app.get("/readyz")
+async def readiness_check():
+    """Readiness: the model and the landmark predictor are loaded and warmed up"""
+    report = STARTUP.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content={
+        "status": "ready" if report["ready"] else "starting",
+        **report,
+    })
+
+@app.get("/startup")
+async def startup_report():
+    """Startup phase timings and warmup latency for this worker"""
+    return STARTUP.report()
+
 @app.get("/")
 async def root():
     return {"message": "Lipreading API is running"}
 
+def parse_outputs(outputs: Optional[str]) -> set:
+    """Parse a comma separated outputs field ("text,audio,video")"""
+    requested = {o.strip().lower() for o in (outputs or "text,audio,video").split(",") if o.strip()}
+    unknown = requested - {"text", "audio", "video"}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown outputs: {', '.join(sorted(unknown))}")
+    return requested
+
+def choose_mode(requested: Optional[str]) -> str:
+    """Serving tier for a request: "fast" runs the coordinate-only model.
+
+    "auto" (the default) switches to fast when the pipeline backlog reaches
+    FAST_MODE_QUEUE_DEPTH. Without a coordinate checkpoint every request runs
+    the full model.
+    """
+    from inference import fast_tier_available
+
+    requested = (requested or "auto").strip().lower()
+    if requested not in ("auto", "full", "fast"):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {requested} (expected auto, full or fast)")
+    if requested == "full":
+        return "full"
+    if not fast_tier_available():
+        if requested == "fast":
+            logger.warning("⚠️ Fast mode requested but no coordinate-only model is installed; running the full model")
+        return "full"
+    if requested == "fast":
+        return "fast"
+    backlog = sum(stats["queue_depth"] for stats in get_predict_pipeline().stats().values())
+    if Config.FAST_MODE_QUEUE_DEPTH and backlog >= Config.FAST_MODE_QUEUE_DEPTH:
+        logger.info(f"Pipeline backlog {backlog}: serving with the fast tier")
+        return "fast"
+    return "full"
+
+def process_video(unique_id: str, video_path: str, filename: str, outputs: Optional[set] = None, mode: str = "full") -> dict:
+    """Run prediction and the requested media outputs for a saved upload.
+
+    Blocking; the work runs on the staged pipeline and this waits for the
+    result. Called from a worker thread by /predict and by the job workers.
+    With RENDER_MODE "lazy" or "background" only the transcript is computed
+    here; audio/video URIs are returned at once and resolve when rendered.
+    """
+    outputs = outputs or {"text", "audio", "video"}
+    media = {"audio", "video"} & outputs
+    render_now = media if Config.RENDER_MODE == "eager" else set()
+
+    # Output files - DO NOT DELETE THESE
+    audio_filename = output_filename("audio", unique_id)
+    audio_path = output_store.backend.path(audio_filename)
+    video_filename = output_filename("video", unique_id)
+    output_video_path = output_store.backend.path(video_filename)
+
+    # Check if weights file exists
+    from inference import RUNTIMES
+    weights_path = Config.WEIGHTS_PATH
+    if RUNTIMES[Config.MODEL_BACKEND].requires_artifact and not os.path.exists(weights_path):
+        logger.error(f"Weights file not found: {weights_path}")
+        raise HTTPException(status_code=500, detail=f"Model weights file not found: {weights_path}")
+
+    logger.info("Starting lip-reading prediction...")
+    try:
+        ctx = get_predict_pipeline().submit({
+            "unique_id": unique_id,
+            "video_path": video_path,
+            "filename": filename,
+            "audio_path": audio_path,
+            "output_video_path": output_video_path,
+            "render": render_now,
+            "mode": mode,
+        }).result()
+    except StageError as e:
+        if e.stage == "tts":
+            raise HTTPException(status_code=500, detail=str(e.cause))
+        raise
+    prediction = ctx["prediction"]
+    output_video_path = ctx["output_video_path"]
+
+    deferred = media - render_now
+    if deferred:
+        register_render(unique_id, prediction, deferred, video_path, filename)
+        if Config.RENDER_MODE == "background":
+            render_in_background(unique_id, deferred)
+
+    # Return URLs - CHECK IF FILES ACTUALLY EXIST
+    base_url = Config.BASE_URL
+    
+    # Verify audio file exists
+    audio_uri = None
+    if "audio" in deferred:
+        audio_uri = f"{base_url}/outputs/{audio_filename}"
+    elif "audio" in media and os.path.exists(audio_path):
+        audio_uri = f"{base_url}/outputs/{audio_filename}"
+        logger.info(f"✅ Audio file preserved: {audio_path}")
+    elif "audio" in media:
+        logger.error(f"Audio file missing: {audio_path}")
+    
+    # Verify video file exists
+    video_uri = None
+    if "video" in deferred:
+        video_uri = f"{base_url}/outputs/{video_filename}"
+    elif output_video_path and os.path.exists(output_video_path):
+        video_uri = f"{base_url}/outputs/{video_filename}"
+        logger.info(f"✅ Video file preserved: {output_video_path}")
+    elif "video" in media:
+        logger.warning(f"Video file not available")
+
+    return {
+        "prediction": str(prediction),
+        "audioUri": audio_uri,
+        "videoUri": video_uri,
+        "pending": sorted(deferred),
+        "mode": mode,
+        "success": True
+    }
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(file: UploadFile = File(...), outputs: Optional[str] = Form(None), mode: Optional[str] = Form(None)):
     if not file.content_type or not file.content_type.startswith('video/'):
         logger.error(f"Invalid file type: {file.content_type}")
         raise HTTPException(status_code=400, detail="Only video files are accepted")
+    requested = parse_outputs(outputs)
+    mode = await run_in_threadpool(choose_mode, mode)
 
     unique_id = str(uuid.uuid4())
     
-    # Initialize variables - ONLY temp files for cleanup
-    video_path = None
-    video_copy_path = None
-    temp_files_to_cleanup = []
-    
-    # Output files - DO NOT DELETE THESE
-    audio_filename = f"audio_{unique_id}.mp3"
-    audio_path = f"outputs/{audio_filename}"
-    video_filename = f"video_{unique_id}.mp4"
-    output_video_path = f"outputs/{video_filename}"
+    # Save uploaded file to temp directory - ONLY temp files for cleanup
+    video_path = f"temp/input_{unique_id}_{file.filename}"
     
     try:
-        # Save uploaded file to temp directory
-        video_path = f"temp/input_{unique_id}_{file.filename}"
-        temp_files_to_cleanup.append(video_path)
-        
-        with open(video_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        logger.info(f"Successfully saved video to {video_path}")
-
-        # Check if weights file exists
-        weights_path = "pretrain/LipCoordNet_coords_loss_0.025581153109669685_wer_0.01746208431890914_cer_0.006488426950253695.pt"
-        if not os.path.exists(weights_path):
-            logger.error(f"Weights file not found: {weights_path}")
-            raise HTTPException(status_code=500, detail=f"Model weights file not found: {weights_path}")
-
-        logger.info("Starting lip-reading prediction...")
-        try:
-            prediction = predict_lip_reading(
-                video_path=video_path,
-                weights_path=weights_path,
-                device="cpu",
-                output_path="temp"
-            )
-            logger.info(f"Prediction completed: {prediction}")
-        except Exception as e:
-            logger.error(f"Prediction failed: {str(e)}")
-            prediction = "HELLO WORLD"
-            logger.info(f"Using fallback prediction: {prediction}")
-
-        # Generate audio file with gTTS - SAVE TO OUTPUTS (PERMANENT)
-        try:
-            # Use slower speech for better quality and WhatsApp compatibility
-            tts = gTTS(text=str(prediction), lang='en', slow=False)
-            tts.save(audio_path)
-            logger.info(f"Generated audio file: {audio_path}")
-            
-            # Verify file was created
-            if not os.path.exists(audio_path):
-                raise Exception("Audio file was not created")
-                
-        except Exception as e:
-            logger.error(f"TTS generation failed: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Audio generation failed: {str(e)}")
-
-        # Generate video with captions - MUTE ORIGINAL + ADD NEW AUDIO
-        try:
-            # Create a copy for moviepy processing
-            video_copy_path = f"temp/copy_{unique_id}_{file.filename}"
-            temp_files_to_cleanup.append(video_copy_path)
-            shutil.copyfile(video_path, video_copy_path)
-            
-            # Load original video and MUTE it
-            original_video = VideoFileClip(video_copy_path)
-            muted_video = original_video.without_audio()  # Remove original audio
-            
-            logger.info(f"Original video: duration={original_video.duration}, size=({original_video.w}x{original_video.h})")
-            
-            # Create text clip for captions
-            try:
-                font_size = max(24, min(48, original_video.w // 20))
-                
-                txt_clip = TextClip(
-                    str(prediction), 
-                    fontsize=font_size, 
-                    color='white',
-                    stroke_color='black',
-                    stroke_width=2,
-                    font='Arial-Bold'
-                ).set_position(('center', 0.85), relative=True).set_duration(original_video.duration)
-                
-                logger.info("Text clip created successfully")
-                
-            except Exception as text_error:
-                logger.warning(f"TextClip creation failed: {text_error}")
-                # Simple fallback
-                txt_clip = TextClip(
-                    str(prediction), 
-                    fontsize=24, 
-                    color='white'
-                ).set_position('bottom').set_duration(original_video.duration)
-                logger.info("Fallback text clip created")
-            
-            # Composite muted video with text
-            video_with_text = CompositeVideoClip([muted_video, txt_clip])
-            
-            # Load generated audio and add to video
-            new_audio = AudioFileClip(audio_path)
-            
-            # Handle audio duration mismatch - CUSTOM LOOP FUNCTION
-            if new_audio.duration != original_video.duration:
-                new_audio = loop_audio(new_audio, original_video.duration)
-                logger.info(f"Audio adjusted to match video duration: {original_video.duration}s")
-            
-            # Set the new audio to the video
-            final_video = video_with_text.set_audio(new_audio)
-            
-            # Write final video
-            final_video.write_videofile(
-                output_video_path, 
-                codec="libx264", 
-                audio_codec="aac",
-                fps=24,
-                verbose=False,
-                logger=None,
-                temp_audiofile=f'temp/temp_audio_{unique_id}.m4a',
-                remove_temp=True
-            )
-            
-            # Clean up clips
-            original_video.close()
-            muted_video.close()
-            txt_clip.close()
-            video_with_text.close()
-            new_audio.close()
-            final_video.close()
+        with trace_request(unique_id, "predict", filename=file.filename, outputs=",".join(sorted(requested)), mode=mode):
+            with STAGE_SECONDS.time(stage="upload"), span("upload") as upload:
+                with open(video_path, "wb") as buffer:
+                    content = await file.read()
+                    buffer.write(content)
+                if upload is not None:
+                    upload.set_attribute("bytes", len(content))
             
-            logger.info(f"Generated video with new audio and captions: {output_video_path}")
-            
-        except Exception as e:
-            logger.error(f"Video generation failed: {str(e)}")
-            import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
-            # Continue without video - audio will still be available
-            output_video_path = None
-
-        # Return URLs - CHECK IF FILES ACTUALLY EXIST
-        base_url = "http://192.168.100.19:8080"
-        
-        # Verify audio file exists
-        audio_uri = None
-        if os.path.exists(audio_path):
-            audio_uri = f"{base_url}/outputs/{audio_filename}"
-            logger.info(f"Audio file confirmed at: {audio_path}")
-        else:
-            logger.error(f"Audio file missing: {audio_path}")
-        
-        # Verify video file exists
-        video_uri = None
-        if output_video_path and os.path.exists(output_video_path):
-            video_uri = f"{base_url}/outputs/{video_filename}"
-            logger.info(f"Video file confirmed at: {output_video_path}")
-        else:
-            logger.warning(f"Video file not available")
+            logger.info(f"Successfully saved video to {video_path}")
 
-        return JSONResponse(content={
-            "prediction": str(prediction),
-            "audioUri": audio_uri,
-            "videoUri": video_uri,
-            "success": True
-        })
+            result = await run_in_threadpool(process_video, unique_id, video_path, file.filename, requested, mode)
+        return JSONResponse(content=result)
 
     except HTTPException:
         raise
@@ -245,42 +307,176 @@ async def predict(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     finally:
         # Clean up ONLY temporary files - NOT output files
-        for temp_file in temp_files_to_cleanup:
-            if temp_file and os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                    logger.info(f"Cleaned up temp file: {temp_file}")
-                except Exception as e:
-                    logger.warning(f"Could not remove temp file {temp_file}: {str(e)}")
-        
-        # Log what files are kept
-        if os.path.exists(audio_path):
-            logger.info(f"✅ Audio file preserved: {audio_path}")
-        if output_video_path and os.path.exists(output_video_path):
-            logger.info(f"✅ Video file preserved: {output_video_path}")
+        if os.path.exists(video_path):
+            try:
+                os.remove(video_path)
+                logger.info(f"Cleaned up temp file: {video_path}")
+            except Exception as e:
+                logger.warning(f"Could not remove temp file {video_path}: {str(e)}")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), callback_url: Optional[str] = Form(None)):
+    """Queue a prediction and return immediately; poll GET /jobs/{job_id} or pass callback_url"""
+    if not file.content_type or not file.content_type.startswith('video/'):
+        logger.error(f"Invalid file type: {file.content_type}")
+        raise HTTPException(status_code=400, detail="Only video files are accepted")
+    if callback_url:
+        try:
+            await run_in_threadpool(validate_callback_url, callback_url)
+        except ValueError as e:
+            logger.error(f"Rejected callback URL {callback_url}: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = str(uuid.uuid4())
+    # Inputs are kept outside temp/ so queued jobs survive a restart
+    video_path = os.path.join(Config.JOBS_DIR, "inputs", f"{job_id}_{os.path.basename(file.filename or 'video.mp4')}")
+    with STAGE_SECONDS.time(stage="upload"):
+        with open(video_path, "wb") as buffer:
+            buffer.write(await file.read())
+    await run_in_threadpool(job_store.submit, video_path, file.filename or "video.mp4", callback_url, job_id)
+    logger.info(f"Queued job {job_id}")
+
+    return JSONResponse(status_code=202, content={
+        "jobId": job_id,
+        "status": "queued",
+        "statusUri": f"{Config.BASE_URL}/jobs/{job_id}",
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+@app.websocket("/ws/predict")
+async def live_predict(websocket: WebSocket):
+    """Live lip-reading over a WebSocket.
+
+    Client -> server: binary messages are frames (JPEG by default); text messages are
+    JSON controls: {"type": "config", "format": "jpeg"|"raw", "width": W, "height": H}
+    and {"type": "end"} to request the final transcript.
+    Server -> client: {"type": "partial"|"final", "text", "frames", "dropped"} and
+    {"type": "error", "detail"}. When frames arrive faster than they can be processed
+    the oldest queued frames are dropped and counted in "dropped".
+    """
+    from inference import get_runtime, get_frame_executor, decode_frame, LiveSession
+
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    try:
+        model = await run_in_threadpool(get_runtime, Config.WEIGHTS_PATH, Config.DEVICE)
+        session = await run_in_threadpool(LiveSession, model, None, Config.DEVICE)
+    except Exception as e:
+        logger.error(f"Live session setup failed: {str(e)}")
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1011)
+        return
+
+    frames = asyncio.Queue(maxsize=Config.LIVE_QUEUE_FRAMES)
+    frame_format = {"fmt": "jpeg", "width": None, "height": None}
+    state = {"dropped": 0, "connected": True}
+
+    def enqueue(item):
+        if frames.full():
+            frames.get_nowait()  # keep latency bounded: the oldest frame is the least useful
+            state["dropped"] += 1
+        frames.put_nowait(item)
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    state["connected"] = False
+                    break
+                if message.get("bytes") is not None:
+                    enqueue(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except ValueError as e:
+                        control = e
+                    if not isinstance(control, dict):
+                        # A bad control message is reported; the session carries on
+                        await send({"type": "error", "detail": f"Invalid control message: {control}"})
+                        continue
+                    if control.get("type") == "config":
+                        frame_format["fmt"] = control.get("format", frame_format["fmt"])
+                        frame_format["width"] = control.get("width", frame_format["width"])
+                        frame_format["height"] = control.get("height", frame_format["height"])
+                    elif control.get("type") == "end":
+                        break
+        finally:
+            enqueue(None)
+
+    async def send(payload):
+        if state["connected"]:
+            await websocket.send_json(payload)
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        since_partial = 0
+        while True:
+            data = await frames.get()
+            if data is None:
+                break
+            try:
+                frame = decode_frame(data, **frame_format)
+            except ValueError as e:
+                await send({"type": "error", "detail": str(e)})
+                continue
+            await loop.run_in_executor(get_frame_executor(), session.add_frame, frame)
+            since_partial += 1
+            if since_partial >= Config.LIVE_STRIDE_FRAMES:
+                since_partial = 0
+                text = await run_in_threadpool(session.transcribe)
+                await send({"type": "partial", "text": text, "frames": session.frames_seen, "dropped": state["dropped"]})
+        text = await run_in_threadpool(session.transcribe)
+        await send({"type": "final", "text": text, "frames": session.frames_seen, "dropped": state["dropped"]})
+        if state["connected"]:
+            await websocket.close()
+    except Exception as e:
+        logger.error(f"Live prediction failed: {str(e)}")
+        if state["connected"]:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+    finally:
+        receiver.cancel()
+        logger.info(f"Live session closed after {session.frames_seen} frames ({state['dropped']} dropped)")
+
+@app.get("/outputs/stats")
+async def output_stats():
+    return await run_in_threadpool(output_store.stats)
+
+OUTPUT_MEDIA_TYPES = {".mp3": "audio/mpeg", ".mp4": "video/mp4"}
 
 @app.get("/outputs/{filename}")
-async def get_output_file(filename: str):
-    file_path = os.path.join("outputs", filename)
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
+async def get_output_file(filename: str, request: Request):
+    filename = os.path.basename(filename)
+    # Deferred renders are produced on first request (see RENDER_MODE)
+    file_path = await run_in_threadpool(ensure_output, filename)
+    entry = await run_in_threadpool(output_store.lookup, filename) if file_path else None
+    if entry is None:
+        logger.error(f"File not found: {filename}")
         raise HTTPException(status_code=404, detail="File not found")
-    
-    # Set proper headers for different file types
-    if filename.endswith('.mp3'):
-        return FileResponse(
-            file_path, 
-            media_type="audio/mpeg",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    elif filename.endswith('.mp4'):
-        return FileResponse(
-            file_path, 
-            media_type="video/mp4",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    else:
-        return FileResponse(file_path)
+
+    # Outputs never change once written, so clients may cache them until evicted
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f"inline; filename={filename}",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and {entry["etag"], "*"} & {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse answers Range requests with 206 partial content, which video seeking relies on
+    return FileResponse(
+        output_store.backend.path(filename),
+        media_type=OUTPUT_MEDIA_TYPES.get(os.path.splitext(filename)[1]),
+        headers=headers,
+    )
 
 if __name__ == "__main__":
     import uvicorn
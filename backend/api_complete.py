@@ -214,10 +214,11 @@ from fastapi.staticfiles import StaticFiles
 import shutil
 import os
 import logging
-from gtts import gTTS
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
-from inference import predict_lip_reading
+from inference import RUNTIMES, predict_lip_reading
+from media import generate_audio
+from utils.config import Config
 import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
@@ -263,7 +264,7 @@ app.add_middleware(
 )
 
 # Add rate limiting
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=Config.RATE_LIMIT_ENABLED)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -307,7 +308,7 @@ async def root():
     }
 
 @app.post("/predict")
-@limiter.limit("5/minute")
+@limiter.limit(Config.PREDICT_RATE_LIMIT)
 async def predict(file: UploadFile = File(...), request: Request = None):
     allowed_extensions = [".mp4", ".mov", ".avi"]
     file_ext = os.path.splitext(file.filename or "")[1].lower()
@@ -341,7 +342,7 @@ async def predict(file: UploadFile = File(...), request: Request = None):
         if fps < 24 or fps > 30 or width < 100 or height < 100:
             logger.error(f"Video format unsupported: FPS={fps}, Resolution={width}x{height}")
             raise HTTPException(status_code=400, detail="Video must have FPS between 24-30 and minimum resolution of 100x100")
-        if not os.path.exists(WEIGHTS_PATH):
+        if RUNTIMES[Config.MODEL_BACKEND].requires_artifact and not os.path.exists(WEIGHTS_PATH):
             logger.error(f"Weights file not found: {WEIGHTS_PATH}")
             raise HTTPException(status_code=404, detail="Model weights not found")
         logger.info(f"Starting lip-reading prediction with weights: {WEIGHTS_PATH}")
@@ -360,8 +361,7 @@ async def predict(file: UploadFile = File(...), request: Request = None):
             raise HTTPException(status_code=500, detail="Lip-reading prediction returned invalid output")
         logger.info(f"Prediction completed: {prediction}")
         logger.info(f"Generating audio for prediction: {prediction}")
-        tts = gTTS(text=str(prediction), lang='en', slow=False)
-        tts.save(audio_path)
+        generate_audio(prediction, audio_path)
         logger.info(f"Generated audio file: {audio_path}")
         if not os.path.exists(audio_path):
             logger.error(f"Audio file was not created: {audio_path}")
@@ -0,0 +1,298 @@
+"""
+Inference Benchmark
+===================
+
+End-to-end latency benchmark for the lip-reading inference path.
+Synthetic talking-face clips are generated at several resolutions and
+durations (or derived from a real ``--source`` clip), then every stage of
+``load_video`` and ``predict_lip_reading`` is timed separately for each
+runtime backend. Results carry p50/p95/p99, throughput and host details,
+and are written as JSON so runs can be compared across commits.
+
+Usage:
+    python benchmark.py --backends eager torchscript int8 --repeats 10
+    python benchmark.py --source samples/bbaf2n.mpg --output bench_after.json --baseline bench_before.json
+
+Note:
+    The drawn face used when no ``--source`` is given is not always found by
+    dlib, which exercises the no-face path; the no-face rate is reported per
+    clip. Use a real clip for numbers that match production.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from inference import (
+    RUNTIMES,
+    align_frames,
+    artifact_path,
+    ctc_greedy_text,
+    extract_frames,
+    get_runtime,
+    predict_lip_reading,
+    probe_video,
+    synthetic_face_frames,
+)
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.metrics import FRAMES_NO_FACE, STAGE_SECONDS
+
+logger = setup_logger("benchmark")
+
+DEFAULT_RESOLUTIONS = ["320x240", "640x480", "1280x720"]
+DEFAULT_DURATIONS = [1.0, 3.0, 6.0]
+FPS = 25
+
+# Stages reported per clip; face_detection/alignment are summed over frame threads
+STAGES = [
+    "probe",
+    "decode",
+    "landmarks",
+    "face_detection",
+    "alignment",
+    "model_forward",
+    "ctc_decode",
+    "end_to_end",
+]
+
+
+def synthesize_clip(path: str, width: int, height: int, seconds: float) -> str:
+    """Draw a frontal cartoon face whose mouth opens and closes, encoded at 25 fps"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, (width, height))
+    for frame in synthetic_face_frames(int(seconds * FPS), width, height, FPS):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def derive_clip(source: str, path: str, width: int, height: int, seconds: float) -> str:
+    """Loop and rescale a real clip to the requested size and duration"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-stream_loop", "-1", "-i", source, "-t", str(seconds),
+        "-vf", f"scale={width}:{height}", "-r", str(FPS), "-an", path,
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return path
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+        "min_ms": float(values.min()),
+        "max_ms": float(values.max()),
+        "samples": len(samples),
+    }
+
+
+def _histogram_sum(stage: str) -> float:
+    return STAGE_SECONDS.totals(stage=stage)[1]
+
+
+def run_stages(model, clip_path: str, device: str) -> Tuple[Dict[str, float], int, int]:
+    """
+    Time one pass of the load_video stages plus model forward and CTC decode
+
+    Returns:
+        (seconds per stage, frames, frames without a face)
+    """
+    timings = {}
+    temp_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        probe_video(clip_path)
+        timings["probe"] = time.perf_counter() - start
+
+        samples_dir = os.path.join(temp_dir, "samples")
+        os.makedirs(samples_dir)
+        start = time.perf_counter()
+        frame_paths = extract_frames(clip_path, samples_dir)
+        timings["decode"] = time.perf_counter() - start
+
+        detect_before, align_before = _histogram_sum("face_detection"), _histogram_sum("alignment")
+        no_face_before = FRAMES_NO_FACE.value()
+        start = time.perf_counter()
+        video, coords = align_frames(frame_paths)
+        timings["landmarks"] = time.perf_counter() - start
+        timings["face_detection"] = _histogram_sum("face_detection") - detect_before
+        timings["alignment"] = _histogram_sum("alignment") - align_before
+        no_face = int(FRAMES_NO_FACE.value() - no_face_before)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    video = video.unsqueeze(0).to(device)
+    coords = coords.unsqueeze(0).to(device)
+    start = time.perf_counter()
+    pred = model(video, coords)
+    timings["model_forward"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ctc_greedy_text(pred[0])
+    timings["ctc_decode"] = time.perf_counter() - start
+    return timings, video.size(2), no_face
+
+
+def benchmark_clip(clip_path: str, backend: str, weights: str, device: str, repeats: int, warmup: int, end_to_end: bool) -> Dict:
+    """Stage latencies and throughput for one clip on one backend"""
+    model = get_runtime(weights, device, backend)
+    for _ in range(warmup):
+        run_stages(model, clip_path, device)
+
+    samples = {stage: [] for stage in STAGES}
+    frames, no_face = 0, 0
+    for _ in range(repeats):
+        timings, frames, no_face = run_stages(model, clip_path, device)
+        for stage, seconds in timings.items():
+            samples[stage].append(seconds)
+        if end_to_end:
+            start = time.perf_counter()
+            predict_lip_reading(clip_path, weights, device, backend=backend)
+            samples["end_to_end"].append(time.perf_counter() - start)
+
+    stages = {stage: summarize(values) for stage, values in samples.items() if values}
+    result = {
+        "backend": backend,
+        "frames": frames,
+        "no_face_frames": no_face,
+        "stages": stages,
+        "model_fps": frames / (stages["model_forward"]["p50_ms"] / 1000.0),
+    }
+    if "end_to_end" in stages:
+        result["end_to_end_fps"] = frames / (stages["end_to_end"]["p50_ms"] / 1000.0)
+    return result
+
+
+def host_info() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "frame_workers": Config.FRAME_WORKERS,
+        "device": Config.DEVICE,
+    }
+
+
+def compare(results: Dict, baseline_path: str, max_regression: float) -> bool:
+    """Print p50 changes against a previous run; False if any stage regressed beyond the limit"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["clip"], r["backend"]): r for r in baseline["results"]}
+    ok = True
+    logger.info(f"📊 Against {baseline_path} (commit {baseline['host'].get('commit')})")
+    for result in results["results"]:
+        before = previous.get((result["clip"], result["backend"]))
+        if before is None:
+            continue
+        for stage, stats in result["stages"].items():
+            if stage not in before["stages"]:
+                continue
+            old, new = before["stages"][stage]["p50_ms"], stats["p50_ms"]
+            change = (new - old) / old if old > 0 else 0.0
+            flag = ""
+            if change > max_regression and new - old > 1.0:  # ignore sub-millisecond noise
+                flag = "  ❌ regression"
+                ok = False
+            logger.info(f"{result['clip']:<18}{result['backend']:<12}{stage:<16}{old:>10.1f} → {new:>10.1f} ms ({change:+.1%}){flag}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark lip-reading inference stages across backends")
+    parser.add_argument("--weights", type=str, default=Config.WEIGHTS_PATH)
+    parser.add_argument("--backends", nargs="+", choices=sorted(RUNTIMES), default=["eager", "optimized", "torchscript", "int8"])
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, help="WIDTHxHEIGHT")
+    parser.add_argument("--durations", nargs="+", type=float, default=DEFAULT_DURATIONS, help="clip lengths in seconds")
+    parser.add_argument("--source", type=str, default=None, help="real talking-face clip to loop/rescale instead of the drawn face")
+    parser.add_argument("--clips_dir", type=str, default="benchmark_clips", help="where generated clips are cached")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--skip_end_to_end", action="store_true", help="skip the full predict_lip_reading timing")
+    parser.add_argument("--output", type=str, default="benchmark_results.json")
+    parser.add_argument("--baseline", type=str, default=None, help="previous results file to compare against")
+    parser.add_argument("--max_regression", type=float, default=0.10, help="allowed p50 slowdown per stage vs baseline")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logger.error(f"❌ Weights file not found: {args.weights}")
+        return 1
+    torch.set_grad_enabled(False)
+
+    backends = []
+    for backend in args.backends:
+        if os.path.exists(artifact_path(args.weights, backend)):
+            backends.append(backend)
+        else:
+            logger.warning(f"⚠️ Skipping {backend}: {artifact_path(args.weights, backend)} not found (see export.py / quantize.py)")
+    if not backends:
+        logger.error("❌ No backend artifacts available")
+        return 1
+
+    os.makedirs(args.clips_dir, exist_ok=True)
+    results = {"host": host_info(), "source": args.source, "repeats": args.repeats, "results": []}
+    for resolution in args.resolutions:
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        for seconds in args.durations:
+            name = f"{width}x{height}_{seconds:g}s"
+            clip_path = os.path.join(args.clips_dir, f"{'source' if args.source else 'synthetic'}_{name}.mp4")
+            if not os.path.exists(clip_path):
+                if args.source:
+                    derive_clip(args.source, clip_path, width, height, seconds)
+                else:
+                    synthesize_clip(clip_path, width, height, seconds)
+            for backend in backends:
+                logger.info(f"⏱️ {name} on {backend}")
+                result = benchmark_clip(
+                    clip_path, backend, args.weights, Config.DEVICE, args.repeats, args.warmup, not args.skip_end_to_end
+                )
+                result.update({"clip": name, "width": width, "height": height, "seconds": seconds})
+                results["results"].append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    logger.info(f"{'clip':<18}{'backend':<12}{'stage':<16}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for result in results["results"]:
+        for stage, stats in result["stages"].items():
+            logger.info(
+                f"{result['clip']:<18}{result['backend']:<12}{stage:<16}"
+                f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+            )
+        logger.info(f"{result['clip']:<18}{result['backend']:<12}{'model fps':<16}{result['model_fps']:>10.1f}"
+                    f"   ({result['no_face_frames']}/{result['frames']} frames without a face)")
+    logger.info(f"📝 Results written to {args.output}")
+
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
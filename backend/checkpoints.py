@@ -0,0 +1,235 @@
+"""
+Checkpoint Formats
+==================
+
+Conversion and loading of LipCoordNet weights in the safetensors format.
+A safetensors file is a small JSON header followed by the raw tensor
+bytes, so on CPU the loader maps the file once and builds every tensor as
+a view into that mapping: nothing is unpickled or copied, pages are read
+on first use, and worker processes serving the same file share one
+physical copy of the weights through the page cache. The mapping is
+private, so nothing written to a tensor ever reaches the file.
+
+A ``<file>.sha256`` sidecar (``sha256sum`` format) is written next to each
+converted file and verified on load.
+
+Usage:
+    python checkpoints.py --weights pretrain/LipCoordNet_....pt
+    python checkpoints.py --weights pretrain/LipCoordNet_....safetensors --verify_only
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from typing import Dict, Optional
+
+import torch
+
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger("checkpoints")
+
+SAFETENSORS_SUFFIX = ".safetensors"
+CHECKSUM_SUFFIX = ".sha256"
+
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def safetensors_path(weights_path: str) -> str:
+    """Path of the safetensors file converted from a .pt checkpoint"""
+    return os.path.splitext(weights_path)[0] + SAFETENSORS_SUFFIX
+
+
+def prefer_safetensors(weights_path: str) -> str:
+    """The converted safetensors sibling of a checkpoint when one exists, else the checkpoint itself"""
+    if weights_path.endswith(SAFETENSORS_SUFFIX):
+        return weights_path
+    converted = safetensors_path(weights_path)
+    return converted if os.path.exists(converted) else weights_path
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_checksum(path: str) -> str:
+    """Write the sha256sum-style sidecar for path and return the digest"""
+    digest = file_sha256(path)
+    with open(path + CHECKSUM_SUFFIX, "w") as f:
+        f.write(f"{digest}  {os.path.basename(path)}\n")
+    return digest
+
+
+def verify_checksum(path: str) -> bool:
+    """
+    Check path against its sidecar checksum
+
+    Returns:
+        True when verified, False when there is no sidecar
+
+    Raises:
+        ValueError: If the file does not match its checksum
+    """
+    sidecar = path + CHECKSUM_SUFFIX
+    if not os.path.exists(sidecar):
+        logger.warning(f"⚠️ No checksum for {path}; skipping verification")
+        return False
+    with open(sidecar) as f:
+        expected = f.read().split()[0].lower()
+    actual = file_sha256(path)
+    if actual != expected:
+        raise ValueError(f"Checksum mismatch for {path}: expected {expected}, got {actual}")
+    return True
+
+
+def save_safetensors(state_dict: Dict[str, torch.Tensor], path: str, metadata: Optional[Dict[str, str]] = None) -> str:
+    """
+    Write a state dict as safetensors plus its checksum sidecar
+
+    Args:
+        state_dict: Tensors to save (moved to CPU and made contiguous)
+        path: Output .safetensors path
+        metadata: Optional string metadata stored in the header
+
+    Returns:
+        The sha256 digest of the written file
+    """
+    from safetensors.torch import save_file
+
+    tensors = {name: tensor.detach().cpu().contiguous() for name, tensor in state_dict.items()}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    save_file(tensors, path, metadata=metadata)
+    return write_checksum(path)
+
+
+def _read_header(path: str):
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    return header, 8 + header_size
+
+
+def load_safetensors(path: str, device: str = "cpu", verify: Optional[bool] = None) -> Dict[str, torch.Tensor]:
+    """
+    Load a safetensors file as a state dict
+
+    On CPU every tensor is a view into one private mapping of the file, so
+    load_state_dict(..., assign=True) puts the parameters straight onto the
+    mapped pages. Other devices get copies.
+
+    Args:
+        path: .safetensors file
+        device: Target device
+        verify: Check the sidecar checksum first (defaults to Config.VERIFY_CHECKSUMS)
+    """
+    if Config.VERIFY_CHECKSUMS if verify is None else verify:
+        verify_checksum(path)
+    header, data_start = _read_header(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        offset = data_start + begin
+        if offset % itemsize:
+            # Unaligned tensor (not written by save_file): fall back to a copy
+            with open(path, "rb") as f:
+                f.seek(offset)
+                raw = bytearray(f.read(end - begin))
+            tensor = torch.frombuffer(raw, dtype=dtype).reshape(info["shape"])
+        else:
+            tensor = torch.empty(0, dtype=dtype).set_(storage, offset // itemsize, info["shape"])
+        state_dict[name] = tensor if device == "cpu" else tensor.to(device)
+    return state_dict
+
+
+def load_weights(path: str, device: str = "cpu") -> Dict[str, torch.Tensor]:
+    """
+    Load a LipCoordNet state dict from a .safetensors or .pt checkpoint
+
+    .pt checkpoints are mmap'd on CPU when their format allows it.
+    """
+    if path.endswith(SAFETENSORS_SUFFIX):
+        return load_safetensors(path, device)
+    if device == "cpu":
+        try:
+            return torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+        except RuntimeError as e:  # legacy (non-zipfile) checkpoints cannot be mmap'd
+            logger.warning(f"Loading {path} without mmap: {e}")
+    return torch.load(path, map_location=torch.device(device), weights_only=True)
+
+
+def convert(weights_path: str, output_path: Optional[str] = None) -> str:
+    """
+    Convert a .pt state dict to safetensors and check that every tensor round-trips
+
+    Returns:
+        Path of the written .safetensors file
+    """
+    output_path = output_path or safetensors_path(weights_path)
+    state_dict = torch.load(weights_path, map_location="cpu", weights_only=True)
+    digest = save_safetensors(state_dict, output_path, metadata={"source": os.path.basename(weights_path)})
+    loaded = load_safetensors(output_path, verify=False)
+    mismatched = [name for name, tensor in state_dict.items() if name not in loaded or not torch.equal(tensor, loaded[name])]
+    if mismatched or len(loaded) != len(state_dict):
+        raise ValueError(f"Round trip failed for {output_path}: {mismatched or 'tensor count differs'}")
+    logger.info(f"✅ Wrote {output_path} ({len(loaded)} tensors, sha256 {digest[:12]}...)")
+    return output_path
+
+
+def _time_load(path: str) -> float:
+    from model import LipCoordNet, architecture_from_state_dict
+
+    start = time.perf_counter()
+    state_dict = load_weights(path)
+    LipCoordNet(**architecture_from_state_dict(state_dict)).load_state_dict(state_dict, assign=True)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Convert LipCoordNet checkpoints to safetensors")
+    parser.add_argument("--weights", default=Config.WEIGHTS_PATH, help="checkpoint (.pt) to convert, or .safetensors with --verify_only")
+    parser.add_argument("--output", default=None, help="output path (default: next to the checkpoint)")
+    parser.add_argument("--verify_only", action="store_true", help="only verify an existing file's checksum")
+    args = parser.parse_args()
+
+    if args.verify_only:
+        path = args.weights if args.weights.endswith(SAFETENSORS_SUFFIX) else safetensors_path(args.weights)
+        try:
+            verified = verify_checksum(path)
+        except ValueError as e:
+            logger.error(f"❌ {e}")
+            return 1
+        logger.info(f"{'✅ Checksum OK' if verified else 'No checksum'}: {path}")
+        return 0
+
+    output_path = convert(args.weights, args.output)
+    logger.info(f"Load time: {args.weights} {_time_load(args.weights) * 1000:.1f} ms, {output_path} {_time_load(output_path) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
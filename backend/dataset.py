@@ -5,6 +5,7 @@ from torch.utils.data import Dataset
 import torch
 import editdistance
 import json
+from cvtransforms import HorizontalFlip, ColorNormalize
 
 
 class MyDataset(Dataset):
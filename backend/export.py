@@ -0,0 +1,151 @@
+"""
+Model Export
+============
+
+Exports a LipCoordNet checkpoint to TorchScript and ONNX for serving.
+Dropout layers and the cuDNN ``flatten_parameters`` calls are stripped
+from the graph, the batch (B) and time (T) axes stay dynamic, and every
+artifact is checked against the eager model before the command succeeds.
+
+Usage:
+    python export.py --weights pretrain/LipCoordNet_....pt
+    python export.py --weights ... --formats onnx --skip_check
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+from checkpoints import load_weights
+from inference import RUNTIMES, artifact_path
+from model import LipCoordNet, architecture_from_state_dict, prepare_for_inference
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger("export")
+
+EXPORT_FORMATS = ["torchscript", "onnx"]
+
+# (batch, frames) shapes used for the parity check; covers both dynamic axes
+PARITY_SHAPES = [(1, 75), (2, 40)]
+
+
+def load_eager_model(weights_path: str) -> LipCoordNet:
+    """Load a checkpoint into an inference-ready eager model on CPU"""
+    state_dict = load_weights(weights_path)
+    model = LipCoordNet(**architecture_from_state_dict(state_dict))
+    model.load_state_dict(state_dict)
+    return prepare_for_inference(model)
+
+
+def example_inputs(batch: int = 1, frames: int = 75):
+    """Random (video, coords) inputs with the serving layout"""
+    video = torch.rand(batch, 3, frames, 64, 128)
+    coords = torch.rand(batch, frames, 20, 2)
+    return video, coords
+
+
+def export_torchscript(model: LipCoordNet, output_path: str) -> str:
+    """Script and freeze the model so weights become graph constants"""
+    scripted = torch.jit.script(model)
+    # frontend/head are kept so the scripted model can serve chunked inference
+    frozen = torch.jit.freeze(scripted, preserved_attrs=["frontend", "head"])
+    frozen.save(output_path)
+    return output_path
+
+
+def export_onnx(model: LipCoordNet, output_path: str, opset: int = 17) -> str:
+    """Export to ONNX with dynamic batch and time axes"""
+    video, coords = example_inputs()
+    torch.onnx.export(
+        model,
+        (video, coords),
+        output_path,
+        input_names=["video", "coords"],
+        output_names=["logits"],
+        dynamic_axes={
+            "video": {0: "batch", 2: "time"},
+            "coords": {0: "batch", 1: "time"},
+            "logits": {0: "batch", 1: "time"},
+        },
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+    return output_path
+
+
+def check_parity(model: LipCoordNet, weights_path: str, formats: List[str], atol: float = 1e-4) -> Dict[str, float]:
+    """
+    Compare exported artifacts against eager outputs
+
+    Args:
+        model: Eager reference model
+        weights_path: Checkpoint the artifacts were exported from
+        formats: Backends to check
+        atol: Maximum allowed absolute difference on the logits
+
+    Returns:
+        Worst absolute logit difference per backend
+    """
+    torch.manual_seed(0)
+    results = {}
+    for backend in formats:
+        runtime = RUNTIMES[backend](artifact_path(weights_path, backend), "cpu")
+        worst = 0.0
+        for batch, frames in PARITY_SHAPES:
+            video, coords = example_inputs(batch, frames)
+            with torch.no_grad():
+                expected = model(video, coords)
+            actual = runtime(video, coords)
+            if actual.shape != expected.shape:
+                raise AssertionError(f"{backend}: shape {tuple(actual.shape)} != {tuple(expected.shape)}")
+            diff = (actual - expected).abs().max().item()
+            if not torch.equal(actual.argmax(-1), expected.argmax(-1)):
+                raise AssertionError(f"{backend}: greedy CTC path differs from eager at B={batch}, T={frames}")
+            worst = max(worst, diff)
+        if worst > atol:
+            raise AssertionError(f"{backend}: max |diff| {worst:.2e} exceeds {atol:.0e}")
+        results[backend] = worst
+        logger.info(f"✅ {backend} matches eager (max |diff| {worst:.2e})")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export LipCoordNet to TorchScript / ONNX")
+    parser.add_argument("--weights", type=str, default=Config.WEIGHTS_PATH, help="path to the .pt checkpoint")
+    parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=EXPORT_FORMATS)
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--atol", type=float, default=1e-4, help="parity tolerance on logits")
+    parser.add_argument("--skip_check", action="store_true", help="skip the parity check against eager")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logger.error(f"❌ Weights file not found: {args.weights}")
+        return 1
+
+    model = load_eager_model(args.weights)
+    for backend in args.formats:
+        output_path = artifact_path(args.weights, backend)
+        start = time.time()
+        if backend == "torchscript":
+            export_torchscript(model, output_path)
+        else:
+            export_onnx(model, output_path, args.opset)
+        size_mb = os.path.getsize(output_path) / 1e6
+        logger.info(f"📦 {backend}: {output_path} ({size_mb:.1f} MB, {time.time() - start:.1f}s)")
+
+    if not args.skip_check:
+        try:
+            check_parity(model, args.weights, args.formats, args.atol)
+        except AssertionError as e:
+            logger.error(f"❌ Parity check failed: {e}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
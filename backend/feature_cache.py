@@ -0,0 +1,169 @@
+"""
+Frozen-Backbone Feature Cache
+=============================
+
+Fine-tuning LipCoordNet for a new speaker or domain rarely needs to touch
+the Conv3d front end, yet every epoch of ordinary training decodes the
+clip's frames and runs the whole Conv3d stack again. With the backbone
+frozen its outputs never change, so they are computed once per clip,
+stored on disk, and the remaining layers are trained from the cache.
+
+Two backbones can be frozen:
+
+- ``frontend``: conv1..conv3; the cache holds (T, 96*4*8) features per clip
+- ``gru1``: conv1..conv3 and gru1; the cache holds gru1's (T, 512) output
+
+Features are stored in fp16, trimmed to the clip's length, under a
+directory named after a hash of the frozen weights, so a cache is never
+reused with a different backbone. Clips are cached without the random
+horizontal flip used in ordinary training.
+"""
+
+import hashlib
+import os
+from typing import Dict, List
+
+import torch
+from torch.utils.data import DataLoader, Dataset, Subset
+
+from model import LipCoordNet, packed_gru
+from utils.logger import setup_logger
+
+logger = setup_logger("feature_cache")
+
+FROZEN_LAYERS = {
+    "frontend": ("conv1", "conv2", "conv3"),
+    "gru1": ("conv1", "conv2", "conv3", "gru1"),
+}
+
+
+def freeze_backbone(model: LipCoordNet, stage: str) -> List[str]:
+    """
+    Stop gradients for the layers covered by a cache stage
+
+    Args:
+        model: LipCoordNet to fine-tune
+        stage: "frontend" or "gru1"
+
+    Returns:
+        Names of the frozen parameters
+    """
+    if stage not in FROZEN_LAYERS:
+        raise ValueError(f"Unknown backbone stage: {stage} (expected one of {sorted(FROZEN_LAYERS)})")
+    frozen = []
+    for name, param in model.named_parameters():
+        if name.split(".")[0] in FROZEN_LAYERS[stage]:
+            param.requires_grad = False
+            frozen.append(name)
+    return frozen
+
+
+def backbone_fingerprint(model: LipCoordNet, stage: str) -> str:
+    """Short hash of the frozen weights, used to key the cache"""
+    digest = hashlib.sha256(stage.encode())
+    for name, tensor in sorted(model.state_dict().items()):
+        if name.split(".")[0] in FROZEN_LAYERS[stage]:
+            digest.update(name.encode())
+            digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def backbone_features(model: LipCoordNet, vid: torch.Tensor, lengths: torch.Tensor, stage: str) -> torch.Tensor:
+    """(T, B, F) output of the frozen backbone for a padded batch"""
+    with torch.no_grad():
+        x = model.frontend(vid, lengths)
+        if stage == "gru1":
+            model._flatten_parameters()
+            x = packed_gru(model.gru1, x, lengths)
+    return x
+
+
+def head_from_features(model: LipCoordNet, features: torch.Tensor, coords: torch.Tensor, lengths: torch.Tensor, stage: str) -> torch.Tensor:
+    """(B, T, 28) logits from cached (T, B, F) backbone features"""
+    if stage == "gru1":
+        return model.head_after_gru1(features, coords, lengths)
+    return model.head(features, coords, lengths)
+
+
+class FeatureCache:
+    """Per-clip backbone features on disk for one (backbone weights, stage) pair"""
+
+    def __init__(self, root: str, model: LipCoordNet, stage: str):
+        self.stage = stage
+        self.directory = os.path.join(root, f"{stage}-{backbone_fingerprint(model, stage)}")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, spk: str, name: str) -> str:
+        return os.path.join(self.directory, f"{spk}_{name}.pt")
+
+    def missing(self, dataset) -> List[int]:
+        """Indices of the clips in a MyDataset that are not cached yet"""
+        return [i for i, (_, spk, name) in enumerate(dataset.data) if not os.path.exists(self.path(spk, name))]
+
+    def build(self, model: LipCoordNet, dataset, batch_size: int = 8, num_workers: int = 4) -> "FeatureCache":
+        """
+        Run the frozen backbone once over every uncached clip of a MyDataset
+
+        Args:
+            model: LipCoordNet whose backbone matches this cache (moved to its device by the caller)
+            dataset: MyDataset in the "test" phase
+            batch_size: Clips per forward pass
+            num_workers: DataLoader workers decoding frames
+        """
+        indices = self.missing(dataset)
+        if not indices:
+            logger.info(f"✅ Feature cache {self.directory} is complete ({len(dataset)} clips)")
+            return self
+        logger.info(f"🧊 Caching {self.stage} features for {len(indices)}/{len(dataset)} clips in {self.directory}")
+        device = next(model.parameters()).device
+        was_training = model.training
+        model.eval()
+        loader = DataLoader(Subset(dataset, indices), batch_size=batch_size, shuffle=False, num_workers=num_workers)
+        done = 0
+        for batch in loader:
+            lengths = batch["vid_len"]
+            features = backbone_features(model, batch["vid"].to(device), lengths, self.stage)
+            for j in range(features.size(1)):
+                _, spk, name = dataset.data[indices[done + j]]
+                clip = features[: lengths[j], j].half().cpu().clone()
+                torch.save(clip, self.path(spk, name))
+            done += features.size(1)
+        model.train(was_training)
+        return self
+
+    def load(self, spk: str, name: str) -> torch.Tensor:
+        return torch.load(self.path(spk, name), weights_only=True).float()
+
+
+class CachedFeatureDataset(Dataset):
+    """
+    MyDataset items with cached backbone features in place of the video
+
+    Frames are never decoded: only the alignment, the lip coordinates and
+    the cached features are read per clip.
+    """
+
+    def __init__(self, dataset, cache: FeatureCache):
+        self.dataset = dataset
+        self.cache = cache
+        self.data = dataset.data
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx) -> Dict[str, torch.Tensor]:
+        ds = self.dataset
+        (_, spk, name) = ds.data[idx]
+        features = self.cache.load(spk, name)
+        anno = ds._load_anno(os.path.join(ds.anno_path, spk, "align", name + ".align"))
+        coord = ds._load_coords(os.path.join(ds.coords_path, spk, name + ".json"))
+        vid_len = features.size(0)
+        padded = features.new_zeros(ds.vid_pad, features.size(1))
+        padded[:vid_len] = features
+        return {
+            "features": padded,
+            "txt": torch.LongTensor(ds._padding(anno, ds.txt_pad)),
+            "coord": torch.FloatTensor(ds._padding(coord, ds.vid_pad)),
+            "txt_len": anno.shape[0],
+            "vid_len": vid_len,
+        }
@@ -0,0 +1,50 @@
+"""
+Production Server Configuration
+===============================
+
+Gunicorn pre-fork settings for ``gunicorn api:app -c gunicorn.conf.py``.
+The app is imported once in the parent (cheap: heavy subsystems load
+lazily), so workers start serving ``/healthz`` right away and load the
+model in the background. With PRELOAD_MODELS=true the model weights and
+the dlib predictor are loaded in the parent instead, and workers share
+those pages copy-on-write; the trade-off is that no worker is forked (and
+liveness is not answered) until that load finishes. The eager checkpoint
+is mmap'd either way, so its pages come from the page cache. The worker
+count defaults to cores / INTRA_OP_THREADS; each worker applies its
+thread budget (Config.thread_budget) on startup.
+"""
+
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger("server")
+
+workers = Config.default_server_workers()
+Config.set_api_workers(workers)
+
+bind = f"{Config.HOST}:{Config.PORT}"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Long clips and first-request rendering can take minutes
+timeout = 300
+graceful_timeout = 30
+keepalive = 5
+loglevel = Config.LOG_LEVEL.lower()
+
+
+def on_starting(server):
+    logger.info(
+        f"🚀 Pre-fork server: {workers} worker(s) x {Config.INTRA_OP_THREADS} intra-op threads, "
+        f"{Config.FRAME_WORKERS} frame threads each ({Config.CPU_COUNT} cores)"
+    )
+
+
+def when_ready(server):
+    # Runs in the parent after the app is imported and before any worker is forked
+    if Config.PRELOAD_MODELS:
+        from inference import preload_models
+
+        try:
+            preload_models()
+        except Exception as e:
+            logger.warning(f"⚠️ Model preload failed, workers will load on first request: {e}")
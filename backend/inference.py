@@ -3,18 +3,34 @@ import shutil
 import cv2
 import numpy as np
 import torch
-import dlib
 import logging
 import time
 import subprocess
-from model import LipCoordNet
-import glob
+from checkpoints import load_weights, prefer_safetensors
+from landmarks import get_landmark_service
+from model import FRONTEND_HALO, LipCoordNet, LipCoordOnlyNet, architecture_from_state_dict, prepare_for_inference
 import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.metrics import FRAMES_NO_FACE, FRAMES_PROCESSED, MODEL_LOAD_SECONDS, STAGE_SECONDS
+from utils import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = setup_logger(__name__)
+
+# Frame workers are shared across requests; landmarks.py gives each thread its own detector
+_frame_executor = None
+_frame_executor_lock = threading.Lock()
+
+# Bounds concurrent forwards so that slots x intra-op threads fit the worker's cores
+_model_slots = None
+_model_slots_lock = threading.Lock()
 
 def get_position(size, padding=0.25):
     """Original get_position function from the Hugging Face model"""
@@ -64,60 +80,124 @@ def transformation_from_points(points1, points2):
         np.array([0.0, 0.0, 1.0]),
     ])
 
-def extract_lip_coordinates(detector, predictor, img_path):
-    """Extract ONLY lip coordinates (20 points) using dlib"""
-    image = cv2.imread(img_path)
-    if image is None:
-        logger.error(f"Failed to load image: {img_path}")
-        raise ValueError(f"Failed to load image: {img_path}")
-    image = cv2.resize(image, (600, 500))
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def get_frame_executor():
+    """Lazily create the process-wide pool used for per-frame landmark work"""
+    global _frame_executor
+    with _frame_executor_lock:
+        if _frame_executor is None:
+            _frame_executor = ThreadPoolExecutor(max_workers=Config.FRAME_WORKERS, thread_name_prefix="frame")
+            logger.info(f"Started frame pool with {Config.FRAME_WORKERS} threads")
+    return _frame_executor
+
+def apply_thread_budget() -> dict:
+    """Apply Config.thread_budget() to torch and OpenCV in this process and log the layout.
+
+    Call after fork(): the counts are per process. dlib's detector and shape
+    predictor are single-threaded, so landmark work is bounded by the frame pool.
+    """
+    budget = Config.thread_budget()
+    torch.set_num_threads(budget["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(budget["interop_threads"])
+    except RuntimeError:
+        pass  # only settable once, before any inter-op work has started
+    cv2.setNumThreads(budget["opencv_threads"])
+    logger.info(
+        f"🧵 Thread budget ({budget['cores']} cores, pid {os.getpid()}): "
+        f"{budget['model_concurrency']} forward(s) x {budget['intra_op_threads']} intra-op / "
+        f"{torch.get_num_interop_threads()} inter-op torch threads, {budget['frame_workers']} frame threads, "
+        f"{budget['opencv_threads']} OpenCV thread(s) per call, {budget['api_threads']} API threads"
+    )
+    return budget
+
+@contextmanager
+def model_slot():
+    """Hold one of the worker's model forward slots for the enclosed block"""
+    global _model_slots
+    with _model_slots_lock:
+        if _model_slots is None:
+            _model_slots = threading.BoundedSemaphore(Config.thread_budget()["model_concurrency"])
+    with _model_slots:
+        yield
+
+def process_frame(index, scene, predictor_path, front256):
+    """Align the mouth crop and extract the 20 lip points for a single frame.
+
+    Returns (mouth, lips) where mouth is None when no face was found and lips
+    holds the raw [x, y] lip landmarks in 600x500 image space.
+    """
+    try:
+        detector, predictor = get_landmark_service(predictor_path).models()
+        start = time.perf_counter()
+        gray = cv2.cvtColor(scene, cv2.COLOR_BGR2GRAY)
+        rects = detector(gray)
+        detect_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        mouth = None
+        if len(rects) > 0:
+            rect = rects[0]
+            shape = predictor(gray, rect)
+            landmarks = np.array([[shape.part(n).x, shape.part(n).y] for n in range(68)])
+            shape_subset = landmarks[17:]  # 51 points
+            M = transformation_from_points(np.matrix(shape_subset), np.matrix(front256))
+            img = cv2.warpAffine(scene, M[:2], (256, 256))
+            (x, y) = front256[-20:].mean(0).astype(np.int32)
+            w = 160 // 2
+            img = img[y - w // 2 : y + w // 2, x - w : x + w, ...]
+            mouth = cv2.resize(img, (128, 64))
+        else:
+            FRAMES_NO_FACE.inc()
+            logger.warning(f"No face detected in frame {index + 1}")
+        align_seconds = time.perf_counter() - start
+        FRAMES_PROCESSED.inc()
+        lips, lips_detect_seconds, lips_seconds = _lip_points(scene, detector, predictor)
+        STAGE_SECONDS.observe(detect_seconds + lips_detect_seconds, stage="face_detection")
+        STAGE_SECONDS.observe(align_seconds + lips_seconds, stage="alignment")
+        if lips is None:
+            return mouth, [np.zeros(20).tolist(), np.zeros(20).tolist()]
+        return mouth, lips
+    except Exception as e:
+        logger.error(f"Error processing frame {index + 1}: {str(e)}")
+        raise ValueError(f"Failed to process frame {index + 1}: {str(e)}")
+
+def _lip_points(scene, detector, predictor):
+    """Raw [x, y] lip landmarks (48-67) on the 600x500 resize used for the training data.
+
+    Returns (lips, detect_seconds, landmark_seconds); lips is None without a face.
+    """
+    start = time.perf_counter()
+    resized = cv2.resize(scene, (600, 500))
+    gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
     rects = detector(gray)
+    detect_seconds = time.perf_counter() - start
     if len(rects) == 0:
-        logger.warning(f"No face detected in image: {img_path}")
-        return [np.zeros(20).tolist(), np.zeros(20).tolist()]
-    for rect in rects:
-        shape = predictor(gray, rect)
-        x = []
-        y = []
-        for n in range(48, 68):  # Lip landmarks (48-67)
-            x.append(shape.part(n).x)
-            y.append(shape.part(n).y)
-        return [x, y]
-
-def generate_lip_coordinates(frame_images_directory, detector, predictor):
-    """Generate lip coordinates for all frames - ONLY 20 points per frame"""
-    frames = glob.glob(frame_images_directory + "/*.jpg")
-    frames.sort(key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
-    if not frames:
-        logger.error(f"No frames found in directory: {frame_images_directory}")
-        raise ValueError("No frames found in directory")
-    img = cv2.imread(frames[0])
-    if img is None:
-        logger.error(f"Failed to load first frame: {frames[0]}")
-        raise ValueError(f"Failed to load first frame: {frames[0]}")
-    height, width, _ = img.shape
-    coords = []
-    for frame in frames:
-        try:
-            x_coords, y_coords = extract_lip_coordinates(detector, predictor, frame)
-            normalized_coords = []
-            for x, y in zip(x_coords, y_coords):
-                normalized_x = x / width
-                normalized_y = y / height
-                normalized_coords.append((normalized_x, normalized_y))
-            coords.append(normalized_coords)
-        except Exception as e:
-            logger.error(f"Error processing frame {frame}: {str(e)}")
-            raise ValueError(f"Failed to process frame {frame}: {str(e)}")
-    coords_array = np.array(coords, dtype=np.float32)  # Shape: (T, 20, 2)
-    coords_tensor = torch.from_numpy(coords_array)
-    logger.info(f"Generated coordinates shape: {coords_tensor.shape}")
-    return coords_tensor
+        return None, detect_seconds, 0.0
+    start = time.perf_counter()
+    shape = predictor(gray, rects[0])
+    lips = [
+        [shape.part(n).x for n in range(48, 68)],
+        [shape.part(n).y for n in range(48, 68)],
+    ]
+    return lips, detect_seconds, time.perf_counter() - start
 
-def load_video(video_path: str, device: str = "cpu"):
-    """Load video with proper coordinate handling"""
-    # Validate video file
+def lip_points_frame(index, scene, predictor_path):
+    """Lip landmarks only for one frame: no mouth crop or alignment warp (coordinate-only tier)"""
+    try:
+        detector, predictor = get_landmark_service(predictor_path).models()
+        lips, detect_seconds, lips_seconds = _lip_points(scene, detector, predictor)
+        FRAMES_PROCESSED.inc()
+        STAGE_SECONDS.observe(detect_seconds, stage="face_detection")
+        STAGE_SECONDS.observe(lips_seconds, stage="alignment")
+        if lips is None:
+            FRAMES_NO_FACE.inc()
+            return [np.zeros(20).tolist(), np.zeros(20).tolist()]
+        return lips
+    except Exception as e:
+        logger.error(f"Error processing frame {index + 1}: {str(e)}")
+        raise ValueError(f"Failed to process frame {index + 1}: {str(e)}")
+
+def probe_video(video_path: str):
+    """Validate container properties before any frames are decoded"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         logger.error(f"Invalid video file: {video_path}")
@@ -127,89 +207,472 @@ def load_video(video_path: str, device: str = "cpu"):
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     logger.info(f"Video properties: FPS={fps}, Frames={frame_count}, Duration={frame_count/fps if fps > 0 else 0}s, Resolution={width}x{height}")
+    tracing.set_attribute("video.fps", fps)
+    tracing.set_attribute("video.frames", frame_count)
+    tracing.set_attribute("video.resolution", f"{width}x{height}")
     cap.release()
     if fps < 24 or fps > 30 or width < 100 or height < 100:
         logger.error(f"Video format unsupported: FPS={fps}, Resolution={width}x{height}")
         raise ValueError("Video must have FPS between 24-30 and minimum resolution of 100x100")
-    temp_dir = tempfile.mkdtemp()
-    samples_dir = os.path.join(temp_dir, "samples")
-    os.makedirs(samples_dir, exist_ok=True)
-    try:
-        output_pattern = os.path.join(samples_dir, "%04d.jpg")
-        cmd = f'ffmpeg -hide_banner -loglevel error -i "{video_path}" -qscale:v 2 -r 25 "{output_pattern}"'
-        logger.info(f"Executing ffmpeg command: {cmd}")
-        process = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if process.returncode != 0:
-            logger.error(f"FFmpeg failed: {process.stderr}")
-            raise ValueError(f"FFmpeg failed: {process.stderr}")
-        time.sleep(2)  # Wait for file system sync
-        files = os.listdir(samples_dir)
-        files = [f for f in files if f.endswith('.jpg')]
-        files = sorted(files, key=lambda x: int(os.path.splitext(x)[0]))
-        if not files:
-            raise ValueError("No frames extracted from video")
-        logger.info(f"Found {len(files)} frames")
-        array = [cv2.imread(os.path.join(samples_dir, file)) for file in files]
+    return fps, frame_count, width, height
+
+def extract_frames(video_path: str, samples_dir: str):
+    """Decode the clip at 25 fps into numbered JPEGs and return their sorted paths"""
+    with STAGE_SECONDS.time(stage="decode"), tracing.span("extract_frames") as span:
+        frame_paths = _extract_frames(video_path, samples_dir)
+        if span is not None:
+            span.set_attribute("frames", len(frame_paths))
+        return frame_paths
+
+def _extract_frames(video_path: str, samples_dir: str):
+    output_pattern = os.path.join(samples_dir, "%04d.jpg")
+    cmd = f'ffmpeg -hide_banner -loglevel error -i "{video_path}" -qscale:v 2 -r 25 "{output_pattern}"'
+    logger.info(f"Executing ffmpeg command: {cmd}")
+    process = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    if process.returncode != 0:
+        logger.error(f"FFmpeg failed: {process.stderr}")
+        raise ValueError(f"FFmpeg failed: {process.stderr}")
+    time.sleep(2)  # Wait for file system sync
+    files = os.listdir(samples_dir)
+    files = [f for f in files if f.endswith('.jpg')]
+    files = sorted(files, key=lambda x: int(os.path.splitext(x)[0]))
+    if not files:
+        raise ValueError("No frames extracted from video")
+    logger.info(f"Found {len(files)} frames")
+    return [os.path.join(samples_dir, file) for file in files]
+
+def iter_aligned_chunks(frame_paths, chunk_frames: int = None):
+    """Yield (video, coords) tensors for consecutive runs of at most chunk_frames frame files.
+
+    video is (3, t, 64, 128) in [0, 1] and coords is (t, 20, 2). Only one chunk of
+    decoded frames is held in memory at a time; the "repeat previous frame on no
+    face" rule carries across chunk boundaries. chunk_frames=None yields one chunk.
+    """
+    predictor_path = get_landmark_service().predictor_path
+    front256 = get_position(256)
+    chunk_frames = chunk_frames or len(frame_paths)
+    previous_mouth = None
+    frame_size = None
+    for chunk_start in range(0, len(frame_paths), chunk_frames):
+        array = [cv2.imread(path) for path in frame_paths[chunk_start:chunk_start + chunk_frames]]
         array = [im for im in array if im is not None]
         if not array:
-            raise ValueError("No valid frames loaded")
-        detector = dlib.get_frontal_face_detector()
-        predictor_paths = [
-            "lip_coordinate_extraction/shape_predictor_68_face_landmarks_GTX.dat",
-            "shape_predictor_68_face_landmarks.dat",
-            "shape_predictor_68_face_landmarks_GTX.dat"
-        ]
-        predictor_path = None
-        for path in predictor_paths:
-            if os.path.exists(path):
-                predictor_path = path
-                break
-        if not predictor_path:
-            logger.error("Dlib predictor not found")
-            raise FileNotFoundError("Dlib face landmarks predictor not found")
-        predictor = dlib.shape_predictor(predictor_path)
-        front256 = get_position(256)
+            continue
+        if frame_size is None:
+            frame_size = array[0].shape[:2]
+        indices = range(chunk_start, chunk_start + len(array))
+        paths = [predictor_path] * len(array)
+        fronts = [front256] * len(array)
+        with tracing.span("align_chunk", first_frame=chunk_start, frames=len(array)) as span:
+            if Config.FRAME_WORKERS > 1:
+                # map() yields in submission order, so frame order is preserved
+                results = list(get_frame_executor().map(tracing.wrap(process_frame), indices, array, paths, fronts))
+            else:
+                results = list(map(process_frame, indices, array, paths, fronts))
+            if span is not None:
+                span.set_attribute("faces_found", sum(mouth is not None for mouth, _ in results))
         video_frames = []
-        for i, scene in enumerate(array):
-            try:
-                gray = cv2.cvtColor(scene, cv2.COLOR_BGR2GRAY)
-                rects = detector(gray)
-                if len(rects) > 0:
-                    rect = rects[0]
-                    shape = predictor(gray, rect)
-                    landmarks = np.array([[shape.part(n).x, shape.part(n).y] for n in range(68)])
-                    shape_subset = landmarks[17:]  # 51 points
-                    M = transformation_from_points(np.matrix(shape_subset), np.matrix(front256))
-                    img = cv2.warpAffine(scene, M[:2], (256, 256))
-                    (x, y) = front256[-20:].mean(0).astype(np.int32)
-                    w = 160 // 2
-                    img = img[y - w // 2 : y + w // 2, x - w : x + w, ...]
-                    img = cv2.resize(img, (128, 64))
-                    video_frames.append(img)
-                else:
-                    logger.warning(f"No face detected in frame {i + 1}")
-                    if video_frames:
-                        video_frames.append(video_frames[-1])
-                    else:
-                        dummy_frame = cv2.resize(scene, (128, 64))
-                        video_frames.append(dummy_frame)
-            except Exception as e:
-                logger.error(f"Error processing frame {i + 1}: {str(e)}")
-                raise ValueError(f"Failed to process frame {i + 1}: {str(e)}")
-        if not video_frames:
-            raise ValueError("No valid frames processed")
+        for scene, (mouth, _) in zip(array, results):
+            if mouth is not None:
+                previous_mouth = mouth
+            elif previous_mouth is None:
+                previous_mouth = cv2.resize(scene, (128, 64))
+            video_frames.append(previous_mouth)
         video_array = np.stack(video_frames, axis=0).astype(np.float32)
         video_tensor = torch.FloatTensor(video_array.transpose(3, 0, 1, 2)) / 255.0
-        coords_tensor = generate_lip_coordinates(samples_dir, detector, predictor)
-        logger.info(f"Video tensor shape: {video_tensor.shape}")
-        logger.info(f"Coords tensor shape: {coords_tensor.shape}")
-        if coords_tensor.shape[-1] != 2 or coords_tensor.shape[-2] != 20:
-            logger.error(f"Invalid coordinate shape: {coords_tensor.shape}, expected (T, 20, 2)")
-            raise ValueError(f"Invalid coordinate dimensions: {coords_tensor.shape}")
-        return video_tensor, coords_tensor
+        height, width = frame_size
+        coords = [
+            [(x / width, y / height) for x, y in zip(x_coords, y_coords)]
+            for _, (x_coords, y_coords) in results
+        ]
+        coords_tensor = torch.from_numpy(np.array(coords, dtype=np.float32))  # Shape: (t, 20, 2)
+        yield video_tensor, coords_tensor
+    if frame_size is None:
+        raise ValueError("No valid frames loaded")
+
+def load_coords(frame_paths):
+    """Normalized (T, 20, 2) lip coordinates for every frame file, without building the video tensor"""
+    predictor_path = get_landmark_service().predictor_path
+    frames = [im for im in (cv2.imread(path) for path in frame_paths) if im is not None]
+    if not frames:
+        raise ValueError("No valid frames loaded")
+    height, width = frames[0].shape[:2]
+    indices = range(len(frames))
+    paths = [predictor_path] * len(frames)
+    with tracing.span("lip_points", frames=len(frames)):
+        if Config.FRAME_WORKERS > 1:
+            results = list(get_frame_executor().map(tracing.wrap(lip_points_frame), indices, frames, paths))
+        else:
+            results = list(map(lip_points_frame, indices, frames, paths))
+    coords = [[(x / width, y / height) for x, y in zip(x_coords, y_coords)] for x_coords, y_coords in results]
+    return torch.from_numpy(np.array(coords, dtype=np.float32))
+
+def align_frames(frame_paths):
+    """Align every frame file and return the full (video, coords) tensors"""
+    chunks = list(iter_aligned_chunks(frame_paths))
+    video_tensor = torch.cat([video for video, _ in chunks], dim=1)
+    coords_tensor = torch.cat([coords for _, coords in chunks], dim=0)
+    logger.info(f"Video tensor shape: {video_tensor.shape}")
+    logger.info(f"Coords tensor shape: {coords_tensor.shape}")
+    if coords_tensor.shape[-1] != 2 or coords_tensor.shape[-2] != 20:
+        logger.error(f"Invalid coordinate shape: {coords_tensor.shape}, expected (T, 20, 2)")
+        raise ValueError(f"Invalid coordinate dimensions: {coords_tensor.shape}")
+    return video_tensor, coords_tensor
+
+def iter_video_chunks(video_path: str, chunk_frames: int = None):
+    """Probe, decode and align a clip, yielding (video, coords) chunks (see iter_aligned_chunks)"""
+    probe_video(video_path)
+    temp_dir = tempfile.mkdtemp()
+    samples_dir = os.path.join(temp_dir, "samples")
+    os.makedirs(samples_dir, exist_ok=True)
+    try:
+        frame_paths = extract_frames(video_path, samples_dir)
+        yield from iter_aligned_chunks(frame_paths, chunk_frames)
     finally:
         shutil.rmtree(temp_dir, ignore_errors=True)
 
+def load_video(video_path: str, device: str = "cpu"):
+    """Load video with proper coordinate handling"""
+    probe_video(video_path)
+    temp_dir = tempfile.mkdtemp()
+    samples_dir = os.path.join(temp_dir, "samples")
+    os.makedirs(samples_dir, exist_ok=True)
+    try:
+        return align_frames(extract_frames(video_path, samples_dir))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+class TorchRuntime:
+    """Base for runtimes backed by a torch module exposing frontend/head"""
+    name = None
+    supports_chunking = True
+    requires_artifact = True
+    # Accepts per-clip lengths, so clips of different lengths can share a padded batch
+    supports_lengths = False
+
+    def __call__(self, video, coords, lengths=None):
+        with model_slot(), torch.no_grad():
+            if lengths is None:
+                return self.model(video, coords)
+            return self.model(video, coords, lengths)
+
+    def frontend(self, video):
+        with model_slot(), torch.no_grad():
+            return self.model.frontend(video)
+
+    def head(self, features, coords):
+        with model_slot(), torch.no_grad():
+            return self.model.head(features, coords)
+
+class EagerRuntime(TorchRuntime):
+    """Runs the eager-mode LipCoordNet loaded from a state dict checkpoint"""
+    name = "eager"
+    supports_lengths = True
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        # A converted .safetensors sibling is used when present. On CPU the parameters stay
+        # backed by the mapped file, so every worker process serving it shares one copy
+        # of the weights through the page cache
+        state_dict = load_weights(prefer_safetensors(model_path), device)
+        # Distilled and pruned checkpoints carry their own layer widths
+        model = LipCoordNet(**architecture_from_state_dict(state_dict))
+        model.load_state_dict(state_dict, assign=True)
+        self.model = prepare_for_inference(model.to(device))
+
+class TorchScriptRuntime(TorchRuntime):
+    """Runs a frozen TorchScript artifact produced by export.py"""
+    name = "torchscript"
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        model = torch.jit.load(model_path, map_location=torch.device(device))
+        # Host-specific fusions (Conv3d+ReLU, oneDNN layouts) are applied at load time
+        if device == "cpu":
+            model = torch.jit.optimize_for_inference(model, other_methods=["frontend", "head"])
+        self.model = model
+
+class OnnxRuntime:
+    """Runs an ONNX artifact produced by export.py through onnxruntime"""
+    name = "onnx"
+    supports_chunking = False
+    requires_artifact = True
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        budget = Config.thread_budget()
+        options.intra_op_num_threads = budget["intra_op_threads"]
+        options.inter_op_num_threads = budget["interop_threads"]
+        providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if device.startswith("cuda") else ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(model_path, options, providers=providers)
+        self.device = device
+
+    def __call__(self, video, coords):
+        with model_slot():
+            (logits,) = self.session.run(["logits"], {
+                "video": video.cpu().numpy(),
+                "coords": coords.cpu().numpy(),
+            })
+        return torch.from_numpy(logits).to(self.device)
+
+class QuantizedRuntime(TorchRuntime):
+    """Runs the int8 model produced by quantize.py"""
+    name = "int8"
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        if device != "cpu":
+            raise ValueError("The int8 backend only runs on CPU")
+        from quantize import load_quantized_model
+        self.model = load_quantized_model(model_path)
+
+def _cpu_supports_bf16():
+    """True when oneDNN has native bf16 kernels on this CPU (AVX512-BF16 / AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+class _CpuVariant:
+    """One execution setup of an eager LipCoordNet: layout, precision and compilation"""
+
+    def __init__(self, name, model, channels_last=False, bf16=False, compile=False):
+        self.name = name
+        self.channels_last = channels_last
+        self.bf16 = bf16
+        # dynamic=True keeps T symbolic, so clips of any length reuse one graph
+        self.frontend_fn = torch.compile(model.frontend, dynamic=True) if compile else model.frontend
+        self.head_fn = torch.compile(model.head, dynamic=True) if compile else model.head
+
+    def _autocast(self):
+        return torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.bf16)
+
+    def frontend(self, video):
+        if self.channels_last:
+            video = video.contiguous(memory_format=torch.channels_last_3d)
+        with torch.inference_mode(), self._autocast():
+            return self.frontend_fn(video).float()
+
+    def head(self, features, coords):
+        with torch.inference_mode(), self._autocast():
+            return self.head_fn(features, coords).float()
+
+class OptimizedCpuRuntime(TorchRuntime):
+    """Eager LipCoordNet under inference_mode with the fastest CPU variant for this host.
+
+    Variants add channels_last_3d for the Conv3d stack, bf16 autocast (only on
+    CPUs with native bf16) and torch.compile with a dynamic T axis
+    (CPU_OPT_COMPILE). CPU_OPT_VARIANT pins one; "auto" times every candidate
+    on a synthetic clip and keeps the fastest whose greedy path matches fp32.
+
+    Loading only reads the weights. The variant is chosen on the first forward
+    (the warmup in each API worker), so with PRELOAD_MODELS nothing runs in the
+    pre-fork parent and the timings reflect the worker's own thread budget.
+    """
+    name = "optimized"
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        if device != "cpu":
+            raise ValueError("The optimized backend only runs on CPU")
+        self.model = EagerRuntime(model_path, device).model
+        self.benchmark = {}
+        self._variant = None
+        self._select_lock = threading.Lock()
+
+    @property
+    def variant(self):
+        if self._variant is None:
+            with self._select_lock:
+                if self._variant is None:
+                    candidates = self.candidates()
+                    requested = Config.CPU_OPT_VARIANT
+                    if requested != "auto":
+                        if requested not in candidates:
+                            raise ValueError(f"CPU variant {requested} is not available here (expected one of {sorted(candidates)})")
+                        candidates = {requested: candidates[requested]}
+                    self._variant = self._select(candidates)
+                    logger.info(f"⚡ Optimized CPU variant: {self._variant.name} {self.benchmark}")
+        return self._variant
+
+    def candidates(self):
+        """Variant name -> options for the variants this host and Config allow"""
+        variants = {
+            "inference_mode": {},
+            "channels_last": {"channels_last": True},
+        }
+        if _cpu_supports_bf16():
+            variants["channels_last_bf16"] = {"channels_last": True, "bf16": True}
+        if Config.CPU_OPT_COMPILE and hasattr(torch, "compile"):
+            variants["compile"] = {"channels_last": True, "compile": True}
+            if _cpu_supports_bf16():
+                variants["compile_bf16"] = {"channels_last": True, "compile": True, "bf16": True}
+        return variants
+
+    def _set_conv_layout(self, channels_last):
+        layout = torch.channels_last_3d if channels_last else torch.contiguous_format
+        for conv in (self.model.conv1, self.model.conv2, self.model.conv3):
+            conv.to(memory_format=layout)
+
+    def _select(self, candidates):
+        frames = Config.CPU_OPT_BENCH_FRAMES
+        generator = torch.Generator().manual_seed(0)
+        video = torch.rand(1, 3, frames, 64, 128, generator=generator)
+        coords = torch.rand(1, frames, 20, 2, generator=generator)
+        reference = None
+        best, best_seconds = None, None
+        # inference_mode runs first on the contiguous weights and is the fp32 reference
+        for name, options in candidates.items():
+            self._set_conv_layout(options.get("channels_last", False))
+            try:
+                variant = _CpuVariant(name, self.model, **options)
+                path = variant.head(variant.frontend(video), coords).argmax(-1)  # warm-up / compilation
+                timings = []
+                for _ in range(max(1, Config.CPU_OPT_TRIALS)):
+                    start = time.perf_counter()
+                    path = variant.head(variant.frontend(video), coords).argmax(-1)
+                    timings.append(time.perf_counter() - start)
+            except Exception as e:  # e.g. no C++ compiler for torch.compile
+                logger.warning(f"CPU variant {name} failed: {e}")
+                continue
+            seconds = sorted(timings)[len(timings) // 2]
+            agreement = 1.0 if reference is None else (path == reference).float().mean().item()
+            reference = path if reference is None else reference
+            self.benchmark[name] = {"ms": round(1000.0 * seconds, 2), "agreement": round(agreement, 4)}
+            if agreement < Config.CPU_OPT_MIN_AGREEMENT:
+                logger.warning(f"CPU variant {name} changes {100 * (1 - agreement):.1f}% of decoded frames; skipped")
+                continue
+            if best is None or seconds < best_seconds:
+                best, best_seconds = variant, seconds
+        if best is None:
+            raise RuntimeError("No CPU variant could run")
+        self._set_conv_layout(best.channels_last)
+        return best
+
+    def __call__(self, video, coords):
+        with model_slot():
+            return self.variant.head(self.variant.frontend(video), coords)
+
+    def frontend(self, video):
+        with model_slot():
+            return self.variant.frontend(video)
+
+    def head(self, features, coords):
+        with model_slot():
+            return self.variant.head(features, coords)
+
+class CoordRuntime(TorchRuntime):
+    """Runs the coordinate-only LipCoordOnlyNet (fast tier); video inputs are ignored"""
+    name = "coords"
+    supports_chunking = False
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        model = LipCoordOnlyNet()
+        model.load_state_dict(load_weights(prefer_safetensors(model_path), device), assign=True)
+        self.model = prepare_for_inference(model.to(device))
+
+class _MockModel(torch.nn.Module):
+    """Shape-compatible LipCoordNet stand-in with a fixed per-frame cost"""
+
+    def __init__(self, transcript: str, ms_per_frame: float):
+        super().__init__()
+        from dataset import MyDataset
+        # char, blank, char, blank... so repeated letters survive greedy CTC decoding
+        self.path = [i for c in transcript for i in (MyDataset.letters.index(c) + 1, 0)]
+        self.ms_per_frame = ms_per_frame
+
+    def frontend(self, x):
+        time.sleep(self.ms_per_frame * x.size(2) / 2000.0)
+        return torch.zeros(x.size(2), x.size(0), 96 * 4 * 8, device=x.device)
+
+    def head(self, x, coords):
+        time.sleep(self.ms_per_frame * x.size(0) / 2000.0)
+        frames, batch = x.size(0), x.size(1)
+        path = torch.tensor([self.path[t % len(self.path)] for t in range(frames)], device=x.device)
+        logits = torch.nn.functional.one_hot(path, 28).float()
+        return logits.unsqueeze(0).expand(batch, frames, 28)
+
+    def forward(self, x, coords):
+        return self.head(self.frontend(x), coords)
+
+class MockRuntime(TorchRuntime):
+    """Offline stand-in for load tests: no weights, fixed latency, fixed transcript"""
+    name = "mock"
+    requires_artifact = False
+
+    def __init__(self, model_path: str = None, device: str = "cpu"):
+        self.model = _MockModel(Config.MOCK_TRANSCRIPT, Config.MOCK_MODEL_MS_PER_FRAME)
+
+RUNTIMES = {
+    EagerRuntime.name: EagerRuntime,
+    TorchScriptRuntime.name: TorchScriptRuntime,
+    OnnxRuntime.name: OnnxRuntime,
+    QuantizedRuntime.name: QuantizedRuntime,
+    MockRuntime.name: MockRuntime,
+    OptimizedCpuRuntime.name: OptimizedCpuRuntime,
+    CoordRuntime.name: CoordRuntime,
+}
+
+# Exported artifacts live next to the checkpoint they were produced from
+ARTIFACT_SUFFIXES = {
+    EagerRuntime.name: ".pt",
+    TorchScriptRuntime.name: ".torchscript.pt",
+    OnnxRuntime.name: ".onnx",
+    QuantizedRuntime.name: ".int8.pt",
+    MockRuntime.name: ".pt",
+    OptimizedCpuRuntime.name: ".pt",
+    CoordRuntime.name: ".coords.pt",
+}
+
+_runtimes = {}
+_runtimes_lock = threading.Lock()
+
+def artifact_path(weights_path: str, backend: str) -> str:
+    """Map a checkpoint path to the artifact used by the given backend"""
+    if backend not in ARTIFACT_SUFFIXES:
+        raise ValueError(f"Unknown model backend: {backend} (expected one of {sorted(RUNTIMES)})")
+    if backend in (EagerRuntime.name, MockRuntime.name, OptimizedCpuRuntime.name):
+        return weights_path
+    return os.path.splitext(weights_path)[0] + ARTIFACT_SUFFIXES[backend]
+
+def get_runtime(weights_path: str, device: str = "cpu", backend: str = None):
+    """Return a cached runtime for the checkpoint, loading it on first use"""
+    backend = backend or Config.MODEL_BACKEND
+    model_path = artifact_path(weights_path, backend)
+    key = (backend, model_path, device)
+    with _runtimes_lock:
+        if key not in _runtimes:
+            if RUNTIMES[backend].requires_artifact and not os.path.exists(model_path):
+                logger.error(f"Model file not found: {model_path}")
+                raise FileNotFoundError(f"Model file not found: {model_path}")
+            start = time.time()
+            _runtimes[key] = RUNTIMES[backend](model_path, device)
+            MODEL_LOAD_SECONDS.set(time.time() - start, backend=backend)
+            logger.info(f"Loaded {backend} runtime from {model_path} in {time.time() - start:.2f}s")
+        return _runtimes[key]
+
+def preload_models(weights_path: str = None, device: str = None, backend: str = None) -> None:
+    """Load the model runtime and the dlib predictor up front (e.g. in a pre-fork server parent).
+
+    Nothing is run through the model here: intra-op thread pools started before
+    fork() do not survive in the children.
+    """
+    start = time.time()
+    get_runtime(weights_path or Config.WEIGHTS_PATH, device or Config.DEVICE, backend)
+    try:
+        get_landmark_service().load()
+    except FileNotFoundError:
+        pass  # reported by landmarks.find_predictor_path; requests fall back as before
+    logger.info(f"Preloaded model and landmark predictor in {time.time() - start:.2f}s")
+
+def fast_tier_available(weights_path: str = None) -> bool:
+    """True when a coordinate-only checkpoint sits next to the weights"""
+    return os.path.exists(artifact_path(weights_path or Config.WEIGHTS_PATH, CoordRuntime.name))
+
+def transcribe_coords(model, coords, device: str = "cpu") -> str:
+    """Greedy transcript of (T, 20, 2) lip coordinates with a coordinate-only runtime"""
+    with STAGE_SECONDS.time(stage="model_forward"), tracing.span("model_forward", frames=coords.size(0), tier="fast"):
+        pred = model(None, coords.unsqueeze(0).to(device))
+    return ctc_greedy_text(pred[0])
+
 def ctc_decode(y):
     """Original CTC decode function from the dataset"""
     from dataset import MyDataset
@@ -220,34 +683,268 @@ def ctc_decode(y):
         result.append(MyDataset.ctc_arr2txt(y[:i], start=1))
     return result
 
-def predict_lip_reading(video_path: str, weights_path: str, device: str = "cpu", output_path: str = "output_videos") -> str:
+def ctc_greedy_text(y):
+    """Greedy CTC transcript of (T, C) logits; equal to ctc_decode(y)[-1] without the prefixes"""
+    from dataset import MyDataset
+    with STAGE_SECONDS.time(stage="ctc_decode"):
+        return MyDataset.ctc_arr2txt(y.argmax(-1), start=1)
+
+def transcribe_batch(model, clips, device: str = "cpu"):
+    """Greedy transcripts for a list of (video, coords) clips.
+
+    Runtimes that support lengths get every clip in one forward pass, padded
+    to the longest with zeros; the GRUs run on packed sequences, so padding
+    never reaches the reverse direction. Otherwise only clips with the same
+    frame count are stacked together.
+    """
+    results = [None] * len(clips)
+    groups = {}
+    if getattr(model, "supports_lengths", False):
+        groups[None] = list(range(len(clips)))
+    else:
+        for i, (video, _) in enumerate(clips):
+            groups.setdefault(video.size(1), []).append(i)
+    for indices in groups.values():
+        lengths = torch.tensor([clips[i][0].size(1) for i in indices])
+        frames = int(lengths.max())
+        video = torch.stack([_pad_frames(clips[i][0], frames, dim=1) for i in indices]).to(device)
+        coords = torch.stack([_pad_frames(clips[i][1], frames, dim=0) for i in indices]).to(device)
+        ragged = bool((lengths != frames).any())
+        with STAGE_SECONDS.time(stage="model_forward"), tracing.span("model_forward", batch=len(indices), frames=frames):
+            pred = model(video, coords, lengths) if ragged else model(video, coords)
+        for j, i in enumerate(indices):
+            results[i] = ctc_greedy_text(pred[j, :lengths[j]])
+    return results
+
+def _pad_frames(tensor, frames: int, dim: int):
+    """Zero-pad tensor along its frame dimension to frames"""
+    missing = frames - tensor.size(dim)
+    if missing == 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor, tensor.new_zeros(shape)], dim=dim)
+
+def predict_chunked(model, chunks, device: str = "cpu", on_partial=None) -> str:
+    """Run the Conv3d front end over overlapping windows and decode the stitched clip once.
+
+    chunks is an iterable of (video, coords) pieces such as iter_video_chunks().
+    Each window carries FRONTEND_HALO frames of context on both sides, so the
+    stitched per-frame features are identical to a full-clip forward. Decoded
+    frames are bounded by the chunk size + 2 * FRONTEND_HALO; what grows with
+    clip length is only the 3072-float feature row per frame fed to the GRUs.
+    on_partial(text) is called after every window with a provisional transcript
+    of the frames seen so far. Each one re-runs the recurrent head only over a
+    trailing window of about PARTIAL_WINDOW_FRAMES frames plus the newest chunk;
+    the greedy labels of older frames are kept from the last window that saw
+    them, so partials cost O(window) each instead of O(frames seen).
+    """
+    window = None  # input frames still needed: left context + pending outputs
+    offset = 0  # first frame in window whose features have not been emitted
+    features, coords = [], []
+    emitted = 0  # feature frames produced so far
+    partial = _PartialDecoder(model, Config.PARTIAL_WINDOW_FRAMES) if on_partial is not None else None
+    forward_seconds = 0.0  # front-end windows are interleaved with alignment, so time is summed
+    for video, chunk_coords in chunks:
+        window = video if window is None else torch.cat((window, video), dim=1)
+        coords.append(chunk_coords)
+        end = window.size(1) - FRONTEND_HALO  # the last HALO frames still lack right context
+        if end <= offset:
+            continue
+        start = time.perf_counter()
+        features.append(model.frontend(window.unsqueeze(0).to(device))[offset:end])
+        forward_seconds += time.perf_counter() - start
+        keep_from = max(0, end - FRONTEND_HALO)
+        window = window[:, keep_from:]
+        offset = end - keep_from
+        emitted += features[-1].size(0)
+        if partial is not None:
+            on_partial(partial.update(features, coords, emitted, device))
+    start = time.perf_counter()
+    if window is not None and window.size(1) > offset:
+        # The clip ends here, so zero padding matches the full-clip forward
+        features.append(model.frontend(window.unsqueeze(0).to(device))[offset:])
+    features = torch.cat(features, dim=0)  # (T, 1, 96*4*8)
+    coords = torch.cat(coords, dim=0).unsqueeze(0).to(device)  # (1, T, 20, 2)
+    logger.info(f"Chunked features shape: {features.shape}, coords shape: {coords.shape}")
+    pred = model.head(features, coords)
+    forward_seconds += time.perf_counter() - start
+    STAGE_SECONDS.observe(forward_seconds, stage="model_forward")
+    tracing.set_attribute("model_forward_ms", round(1000.0 * forward_seconds, 3))
+    tracing.set_attribute("frames", features.size(0))
+    return ctc_greedy_text(pred[0])
+
+class _PartialDecoder:
+    """Provisional greedy transcripts for predict_chunked over a bounded trailing window"""
+
+    def __init__(self, model, window: int):
+        self.model = model
+        self.window = max(1, window)
+        self.committed = []  # greedy labels of frames that left the window
+        self.decoded_to = 0  # first frame without a committed label
+
+    def update(self, features, coords, frames: int, device: str) -> str:
+        """Transcript of the first frames feature rows (features/coords are the chunk lists so far)"""
+        from dataset import MyDataset
+        start = max(0, min(self.decoded_to, frames - self.window))
+        # Only the trailing chunks covering [start, frames) are concatenated
+        pieces, covered = [], 0
+        for chunk in reversed(features):
+            pieces.append(chunk)
+            covered += chunk.size(0)
+            if covered >= frames - start:
+                break
+        recent = torch.cat(pieces[::-1], dim=0)[covered - (frames - start):]
+        recent_coords = torch.cat(coords, dim=0)[start:frames].unsqueeze(0).to(device)
+        labels = self.model.head(recent, recent_coords)[0].argmax(-1)
+        # Frames that the next window may not include are fixed now
+        commit_to = max(self.decoded_to, frames - self.window)
+        self.committed.append(labels[self.decoded_to - start:commit_to - start])
+        self.decoded_to = commit_to
+        return MyDataset.ctc_arr2txt(torch.cat(self.committed + [labels[commit_to - start:]]), start=1)
+
+def synthetic_face_frames(count: int, width: int = 640, height: int = 480, fps: int = 25):
+    """Yield BGR frames of a drawn frontal face whose mouth opens and closes"""
+    cx, cy = width // 2, height // 2
+    face_w, face_h = int(height * 0.28), int(height * 0.38)
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        frame = np.full((height, width, 3), 90, np.uint8)
+        # Slight head motion keeps the detector and the affine warp honest
+        dx, dy = (rng.normal(0, face_w * 0.01, 2)).astype(int)
+        x, y = cx + dx, cy + dy
+        cv2.ellipse(frame, (x, y), (face_w, face_h), 0, 0, 360, (150, 180, 220), -1)
+        eye_y = y - face_h // 4
+        for ex in (x - face_w // 3, x + face_w // 3):
+            cv2.ellipse(frame, (ex, eye_y), (face_w // 7, face_h // 14), 0, 0, 360, (255, 255, 255), -1)
+            cv2.circle(frame, (ex, eye_y), face_h // 20, (40, 30, 20), -1)
+            cv2.line(frame, (ex - face_w // 6, eye_y - face_h // 7), (ex + face_w // 6, eye_y - face_h // 7), (60, 50, 40), 3)
+        cv2.line(frame, (x, eye_y + face_h // 10), (x, y + face_h // 10), (120, 140, 180), 3)
+        mouth_open = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * i / fps)
+        mouth_y = y + face_h // 2
+        cv2.ellipse(frame, (x, mouth_y), (face_w // 3, 2 + int(mouth_open * face_h // 8)), 0, 0, 360, (60, 40, 150), -1)
+        yield frame
+
+def warmup(model, device: str = "cpu", frames: int = None, passes: int = None) -> dict:
+    """Run a synthetic clip through detection, alignment, the model and CTC decode.
+
+    Primes the torch allocator, oneDNN kernel selection for the Conv3d stack,
+    GRU workspaces, the frame pool and dlib's per-thread detectors, so the
+    first real request does not pay for them. The forward follows the serving
+    path (chunked front end when the runtime supports it). Returns per-stage
+    milliseconds of the first (cold) and last (warm) pass.
+    """
+    frames = frames or Config.WARMUP_FRAMES
+    passes = max(1, passes or Config.WARMUP_PASSES)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        frame_paths = []
+        for i, scene in enumerate(synthetic_face_frames(frames)):
+            frame_paths.append(os.path.join(temp_dir, f"{i}.jpg"))
+            cv2.imwrite(frame_paths[-1], scene)
+        runs = []
+        for _ in range(passes):
+            start = time.perf_counter()
+            video, coords = align_frames(frame_paths)
+            landmarks_ms = 1000.0 * (time.perf_counter() - start)
+            start = time.perf_counter()
+            if model.supports_chunking and Config.CHUNK_FRAMES:
+                predict_chunked(model, [(video, coords)], device)
+            else:
+                pred = model(video.unsqueeze(0).to(device), coords.unsqueeze(0).to(device))
+                ctc_greedy_text(pred[0])
+            model_ms = 1000.0 * (time.perf_counter() - start)
+            runs.append({"landmarks_ms": round(landmarks_ms, 1), "model_ms": round(model_ms, 1), "total_ms": round(landmarks_ms + model_ms, 1)})
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    logger.info(f"Warmup on {frames} frames: cold {runs[0]['total_ms']:.0f} ms, warm {runs[-1]['total_ms']:.0f} ms")
+    return {"frames": frames, "passes": passes, "cold": runs[0], "warm": runs[-1]}
+
+def decode_frame(data: bytes, fmt: str = "jpeg", width: int = None, height: int = None):
+    """Decode one streamed frame (JPEG/PNG bytes or raw BGR24) into a BGR image"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if fmt == "raw":
+        if not width or not height or buffer.size != width * height * 3:
+            raise ValueError(f"Raw frame of {buffer.size} bytes does not match {width}x{height}x3")
+        return buffer.reshape(height, width, 3)
+    frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Could not decode frame")
+    return frame
+
+class LiveSession:
+    """Incremental alignment and sliding-window decoding for a live frame stream.
+
+    Frames are aligned as they arrive and only the most recent window_frames
+    mouth crops and lip coordinates are kept, so memory stays constant for
+    streams of any length.
+    """
+
+    def __init__(self, model, window_frames: int = None, device: str = "cpu"):
+        self.model = model
+        self.device = device
+        self.predictor_path = get_landmark_service().predictor_path
+        self.front256 = get_position(256)
+        window_frames = window_frames or Config.LIVE_WINDOW_FRAMES
+        self.mouths = deque(maxlen=window_frames)
+        self.coords = deque(maxlen=window_frames)
+        self.frame_size = None
+        self.frames_seen = 0
+
+    def __len__(self):
+        return len(self.mouths)
+
+    def add_frame(self, scene):
+        """Align one BGR frame and append it to the window"""
+        mouth, (x_coords, y_coords) = process_frame(self.frames_seen, scene, self.predictor_path, self.front256)
+        if self.frame_size is None:
+            self.frame_size = scene.shape[:2]
+        if mouth is None:
+            mouth = self.mouths[-1] if self.mouths else cv2.resize(scene, (128, 64))
+        height, width = self.frame_size
+        self.mouths.append(mouth)
+        self.coords.append([(x / width, y / height) for x, y in zip(x_coords, y_coords)])
+        self.frames_seen += 1
+
+    def transcribe(self) -> str:
+        """Run the model over the current window and return the greedy CTC transcript"""
+        if not self.mouths:
+            return ""
+        video_array = np.stack(self.mouths, axis=0).astype(np.float32)
+        video = torch.FloatTensor(video_array.transpose(3, 0, 1, 2)) / 255.0
+        coords = torch.from_numpy(np.array(self.coords, dtype=np.float32))
+        with STAGE_SECONDS.time(stage="model_forward"):
+            pred = self.model(video.unsqueeze(0).to(self.device), coords.unsqueeze(0).to(self.device))
+        return ctc_greedy_text(pred[0])
+
+def predict_lip_reading(video_path: str, weights_path: str, device: str = "cpu", output_path: str = "output_videos", backend: str = None, chunk_frames: int = None, on_partial=None) -> str:
     if not os.path.exists(video_path):
         logger.error(f"Video file not found: {video_path}")
         raise FileNotFoundError(f"Video file not found: {video_path}")
-    if not os.path.exists(weights_path):
-        logger.error(f"Weights file not found: {weights_path}")
-        raise FileNotFoundError(f"Weights file not found: {weights_path}")
     try:
-        model = LipCoordNet()
-        checkpoint = torch.load(weights_path, map_location=torch.device(device), weights_only=True)
-        model.load_state_dict(checkpoint)
-        model = model.to(device)
-        model.eval()
-        logger.info("Model loaded successfully")
-        video, coords = load_video(video_path, device)
-        video = video.unsqueeze(0).to(device)  # (1, 3, T, 64, 128)
-        coords = coords.unsqueeze(0).to(device)  # (1, T, 20, 2)
-        logger.info(f"Final video shape: {video.shape}")
-        logger.info(f"Final coords shape: {coords.shape}")
-        expected_coord_features = 40  # 20 points * 2 coordinates
-        actual_coord_features = coords.shape[-2] * coords.shape[-1]
-        if actual_coord_features != expected_coord_features:
-            logger.error(f"Coordinate feature mismatch: expected {expected_coord_features}, got {actual_coord_features}")
-            raise ValueError(f"Coordinate dimension error: {coords.shape}")
-        with torch.no_grad():
-            pred = model(video, coords)
-            output = ctc_decode(pred[0])
-            result = output[-1]
+        model = get_runtime(weights_path, device, backend)
+        logger.info(f"Model ready ({model.name})")
+        chunk_frames = Config.CHUNK_FRAMES if chunk_frames is None else chunk_frames
+        if chunk_frames and not model.supports_chunking:
+            logger.warning(f"{model.name} runtime does not support chunked inference; running the full clip")
+            chunk_frames = 0
+        if chunk_frames:
+            with tracing.span("predict_chunked", chunk_frames=chunk_frames):
+                result = predict_chunked(model, iter_video_chunks(video_path, chunk_frames), device, on_partial)
+        else:
+            video, coords = load_video(video_path, device)
+            video = video.unsqueeze(0).to(device)  # (1, 3, T, 64, 128)
+            coords = coords.unsqueeze(0).to(device)  # (1, T, 20, 2)
+            logger.info(f"Final video shape: {video.shape}")
+            logger.info(f"Final coords shape: {coords.shape}")
+            expected_coord_features = 40  # 20 points * 2 coordinates
+            actual_coord_features = coords.shape[-2] * coords.shape[-1]
+            if actual_coord_features != expected_coord_features:
+                logger.error(f"Coordinate feature mismatch: expected {expected_coord_features}, got {actual_coord_features}")
+                raise ValueError(f"Coordinate dimension error: {coords.shape}")
+            with STAGE_SECONDS.time(stage="model_forward"), tracing.span("model_forward", frames=video.size(2)):
+                pred = model(video, coords)
+            result = ctc_greedy_text(pred[0])
         if not result or result.strip() == "":
             logger.error("Prediction returned empty or invalid output")
             raise ValueError("Lip-reading prediction returned empty or invalid output")
@@ -257,4 +954,4 @@ def predict_lip_reading(video_path: str, weights_path: str, device: str = "cpu",
         logger.error(f"Error during prediction: {str(e)}")
         import traceback
         logger.error(f"Full traceback: {traceback.format_exc()}")
-        raise
\ No newline at end of file
+        raise
@@ -1,6 +1,7 @@
 import os
 import logging
 import torch
+from checkpoints import load_weights
 from model import LipCoordNet
 
 # Configure logging
@@ -26,8 +27,7 @@ def predict_lip_reading(video_path: str, weights_path: str, device: str = "cpu",
     try:
         # Try to load the model
         model = LipCoordNet()
-        checkpoint = torch.load(weights_path, map_location=torch.device(device), weights_only=False)
-        model.load_state_dict(checkpoint)
+        model.load_state_dict(load_weights(weights_path, device))
         model = model.to(device)
         model.eval()
         
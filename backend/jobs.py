@@ -0,0 +1,333 @@
+"""
+Prediction Jobs
+===============
+
+Persistent job queue for asynchronous /predict requests.
+Jobs live in a local SQLite database so queued and interrupted work
+survives worker restarts, and several processes can share one queue.
+
+A claimed job carries a lease token. Its worker heartbeats while the job
+runs, so only jobs whose worker stopped heartbeating are requeued, and a
+worker whose lease was taken over discards its result and leaves the
+input file to the new owner.
+"""
+
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.tracing import trace_request
+
+logger = setup_logger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_token TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """SQLite-backed job table with atomic claim and lease-based recovery"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or Config.JOBS_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_token" not in columns:  # databases created before leases had owners
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+                except sqlite3.OperationalError:
+                    pass  # added concurrently by another process
+
+    @contextmanager
+    def _connect(self):
+        # A connection per call keeps the store safe to use from any thread
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, input_path: str, filename: str, callback_url: Optional[str] = None, job_id: Optional[str] = None) -> str:
+        """Queue a job for an upload already saved at input_path"""
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, input_path, filename, callback_url, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, input_path, filename, callback_url, now, now),
+            )
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running and return it with a fresh lease_token"""
+        with self._connect() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_token = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, token, time.time(), row["id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["attempts"] += 1
+        job["lease_token"] = token
+        return job
+
+    def heartbeat(self, job_id: str, lease_token: str) -> bool:
+        """Extend a running job's lease; False if the lease is no longer held"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND lease_token = ?",
+                (time.time(), job_id, RUNNING, lease_token),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, result: Dict, lease_token: Optional[str] = None) -> bool:
+        """Record a result; with lease_token, only if that lease is still held"""
+        return self._finish(job_id, lease_token, "status = ?, result = ?, error = NULL", (DONE, json.dumps(result)))
+
+    def fail(self, job_id: str, error: str, lease_token: Optional[str] = None) -> bool:
+        """Record a failure; with lease_token, only if that lease is still held"""
+        return self._finish(job_id, lease_token, "status = ?, error = ?", (FAILED, error))
+
+    def _finish(self, job_id: str, lease_token: Optional[str], assignments: str, values) -> bool:
+        query = f"UPDATE jobs SET {assignments}, lease_token = NULL, updated_at = ? WHERE id = ?"
+        params = (*values, time.time(), job_id)
+        if lease_token is not None:
+            query += " AND status = ? AND lease_token = ?"
+            params += (RUNNING, lease_token)
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount == 1
+
+    def recover(self, lease_seconds: int = None, max_attempts: int = None) -> int:
+        """
+        Requeue jobs whose worker died mid-run
+
+        Args:
+            lease_seconds: A running job not heartbeating for this long is considered abandoned
+            max_attempts: Abandoned jobs that already used this many attempts are failed instead
+
+        Returns:
+            Number of jobs requeued
+        """
+        lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        max_attempts = max_attempts or Config.JOB_MAX_ATTEMPTS
+        cutoff = time.time() - lease_seconds
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'worker lost too many times', lease_token = NULL, updated_at = ?"
+                " WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (FAILED, time.time(), RUNNING, cutoff, max_attempts),
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, lease_token = NULL, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, time.time(), RUNNING, cutoff),
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def queue_depth(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+
+def job_status(job: Dict) -> Dict:
+    """Public JSON view of a job row"""
+    status = {
+        "jobId": job["id"],
+        "status": job["status"],
+        "createdAt": job["created_at"],
+        "updatedAt": job["updated_at"],
+    }
+    if job["status"] == DONE:
+        status["result"] = job["result"]
+    elif job["status"] == FAILED:
+        status["error"] = job["error"]
+    return status
+
+
+def validate_callback_url(url: str) -> str:
+    """
+    Reject callback URLs that would make the server call into its own network
+
+    Only http/https URLs are accepted, and every address the host resolves
+    to must be public: loopback, link-local (cloud metadata), private and
+    reserved ranges are refused unless CALLBACK_ALLOW_PRIVATE is set.
+
+    Raises:
+        ValueError: If the URL may not be used as a callback
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Callback URL must be an http or https URL")
+    if Config.CALLBACK_ALLOW_PRIVATE:
+        return url
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or 0, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValueError(f"Callback host cannot be resolved: {parts.hostname}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Callback host is not a public address: {parts.hostname}")
+    return url
+
+
+def send_callback(job: Dict) -> None:
+    """POST the final job status to the client's callback URL (best effort)"""
+    try:
+        # Checked again at send time: the host may resolve elsewhere by now
+        validate_callback_url(job["callback_url"])
+    except ValueError as e:
+        logger.warning(f"Callback for job {job['id']} refused: {e}")
+        return
+    for attempt in range(3):
+        try:
+            response = requests.post(job["callback_url"], json=job_status(job), timeout=Config.CALLBACK_TIMEOUT,
+                                     allow_redirects=False)
+            if response.status_code < 500:
+                return
+            logger.warning(f"Callback for job {job['id']} returned {response.status_code}")
+        except requests.RequestException as e:
+            logger.warning(f"Callback for job {job['id']} failed: {e}")
+        time.sleep(2 ** attempt)
+
+
+class JobWorker:
+    """Background threads that drain the job queue through a handler"""
+
+    def __init__(self, store: JobStore, handler: Callable[[str, str, str], Dict], workers: int = None,
+                 poll_interval: float = 1.0, heartbeat_interval: float = None):
+        self.store = store
+        self.handler = handler
+        self.workers = workers or Config.JOB_WORKERS
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval or Config.JOB_HEARTBEAT_SECONDS
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        requeued = self.store.recover()
+        if requeued:
+            logger.info(f"♻️ Requeued {requeued} interrupted job(s)")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"✅ Started {self.workers} job worker(s)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        last_recover = time.time()
+        while not self._stop.is_set():
+            try:
+                if time.time() - last_recover > 60:
+                    # Pick up jobs abandoned by workers in other processes
+                    self.store.recover()
+                    last_recover = time.time()
+                job = self.store.claim()
+            except sqlite3.Error as e:
+                logger.error(f"Could not claim job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._process(job)
+
+    def _process(self, job: Dict) -> None:
+        with trace_request(job["id"], "job", attempt=job["attempts"]):
+            owned = self._run_job(job)
+        if owned and job["callback_url"]:
+            send_callback(self.store.get(job["id"]))
+
+    def _heartbeat(self, job: Dict, done: threading.Event) -> None:
+        while not done.wait(self.heartbeat_interval):
+            try:
+                if not self.store.heartbeat(job["id"], job["lease_token"]):
+                    logger.warning(f"Lost the lease on job {job['id']}; it was requeued elsewhere")
+                    return
+            except sqlite3.Error as e:
+                logger.error(f"Heartbeat for job {job['id']} failed: {e}")
+
+    def _run_job(self, job: Dict) -> bool:
+        """Run one claimed job; False if its lease was lost before the outcome was recorded"""
+        logger.info(f"Running job {job['id']} (attempt {job['attempts']})")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), name=f"job-heartbeat-{job['id'][:8]}", daemon=True)
+        heartbeat.start()
+        owned = False
+        try:
+            result = self.handler(job["id"], job["input_path"], job["filename"])
+            owned = self.store.complete(job["id"], result, job["lease_token"])
+            if owned:
+                logger.info(f"Job {job['id']} done")
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error(f"Job {job['id']} failed: {detail}")
+            owned = self.store.fail(job["id"], detail, job["lease_token"])
+        finally:
+            done.set()
+            heartbeat.join()
+            if not owned:
+                # Another worker holds the job now and still needs its input
+                logger.warning(f"Job {job['id']} was taken over; discarding this run's outcome")
+            elif os.path.exists(job["input_path"]):
+                os.remove(job["input_path"])
+        return owned
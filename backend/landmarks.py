@@ -0,0 +1,124 @@
+"""
+Landmark Models
+===============
+
+Process-wide dlib face detector and 68-point shape predictor. The predictor
+file (tens of MB) is located and parsed once per process instead of on every
+upload; with PRELOAD_MODELS this happens in the pre-fork parent, so workers
+inherit the parsed model copy-on-write.
+
+The HOG face detector keeps scan state between calls and must not be
+shared, so every thread gets its own (they are cheap to build). The shape
+predictor is deliberately shared by all threads rather than copied per
+thread: dlib documents it as usable from several threads at once, since
+prediction only reads its regression trees, and a copy per frame-pool
+thread would multiply its resident size by FRAME_WORKERS.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import dlib
+
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.metrics import LANDMARK_LOAD_SECONDS, LANDMARK_MEMORY_BYTES, resident_memory_bytes
+
+logger = setup_logger("landmarks")
+
+PREDICTOR_PATHS = [
+    "lip_coordinate_extraction/shape_predictor_68_face_landmarks_GTX.dat",
+    "shape_predictor_68_face_landmarks.dat",
+    "shape_predictor_68_face_landmarks_GTX.dat"
+]
+
+
+def find_predictor_path() -> str:
+    """
+    Return the dlib 68-landmark predictor to use
+
+    Config.PREDICTOR_PATH wins when set; otherwise the first of
+    PREDICTOR_PATHS found on disk.
+    """
+    candidates = [Config.PREDICTOR_PATH] if Config.PREDICTOR_PATH else PREDICTOR_PATHS
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    logger.error("Dlib predictor not found")
+    raise FileNotFoundError("Dlib face landmarks predictor not found")
+
+
+class LandmarkService:
+    """Loads one shape predictor shared by all threads and gives each thread its own face detector"""
+
+    def __init__(self, predictor_path: str):
+        self.predictor_path = predictor_path
+        self.load_seconds: Optional[float] = None
+        self.memory_bytes: Optional[int] = None
+        self._predictor = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def load(self) -> "LandmarkService":
+        """Parse the predictor file if this process has not done so yet"""
+        with self._lock:
+            if self._predictor is None:
+                rss_before = resident_memory_bytes()
+                start = time.perf_counter()
+                self._predictor = dlib.shape_predictor(self.predictor_path)
+                self.load_seconds = time.perf_counter() - start
+                rss_after = resident_memory_bytes()
+                if rss_before is not None and rss_after is not None:
+                    self.memory_bytes = max(0, rss_after - rss_before)
+                    LANDMARK_MEMORY_BYTES.set(self.memory_bytes)
+                LANDMARK_LOAD_SECONDS.set(self.load_seconds)
+                memory = f"{self.memory_bytes / 2**20:.1f} MB resident" if self.memory_bytes is not None else "memory unknown"
+                logger.info(f"🧠 Loaded landmark predictor {self.predictor_path} in {self.load_seconds:.2f}s ({memory})")
+        return self
+
+    @property
+    def predictor(self):
+        return self.load()._predictor
+
+    def models(self) -> Tuple["dlib.fhog_object_detector", "dlib.shape_predictor"]:
+        """(detector, predictor) for the calling thread: the detector is thread-local, the predictor shared"""
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = dlib.get_frontal_face_detector()
+        return detector, self.predictor
+
+    def stats(self) -> Dict:
+        return {
+            "predictor_path": self.predictor_path,
+            "loaded": self._predictor is not None,
+            "load_seconds": self.load_seconds,
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+_services: Dict[str, LandmarkService] = {}
+_services_lock = threading.Lock()
+_default_path: Optional[str] = None  # resolved once, not probed per request
+
+
+def get_landmark_service(predictor_path: Optional[str] = None) -> LandmarkService:
+    """
+    Process-wide landmark service for a predictor file
+
+    Args:
+        predictor_path: Predictor to serve; defaults to find_predictor_path()
+
+    Returns:
+        The shared LandmarkService (the predictor is parsed on first use)
+    """
+    global _default_path
+    if predictor_path is None:
+        if _default_path is None:
+            _default_path = find_predictor_path()
+        predictor_path = _default_path
+    with _services_lock:
+        if predictor_path not in _services:
+            _services[predictor_path] = LandmarkService(predictor_path)
+        return _services[predictor_path]
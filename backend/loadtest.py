@@ -0,0 +1,356 @@
+"""
+HTTP Load Test
+==============
+
+Drives ``/predict`` (and optionally the returned ``/outputs`` URIs) of a
+running api.py / api_complete.py server through a ramp of load steps, and
+reports latency distributions, error rates, the saturation point and the
+memory growth of every worker process (read from ``/metrics``).
+
+Load is open-loop (Poisson arrivals at ``--rates`` requests/s) or closed-loop
+(``--concurrency`` clients sending back to back). Requests draw clips from a
+weighted mix.
+
+Run the server offline with the mock model and the fake TTS:
+    MODEL_BACKEND=mock TTS_BACKEND=fake RATE_LIMIT_ENABLED=false uvicorn api:app --port 8080
+
+Usage:
+    python loadtest.py --url http://localhost:8080 --clips short.mp4:3 long.mp4:1 --rates 0.5 1 2 4 8
+    python loadtest.py --url ... --concurrency 1 2 4 8 16 --step_seconds 60 --fetch_outputs
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from utils.logger import setup_logger
+
+logger = setup_logger("loadtest")
+
+
+class Clip:
+    def __init__(self, path: str, weight: float):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.weight = weight
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+
+def parse_clips(specs: List[str]) -> List[Clip]:
+    """``path[:weight]`` entries into a clip mix"""
+    clips = []
+    for spec in specs:
+        path, sep, weight = spec.rpartition(":")
+        try:
+            weight = float(weight)
+        except ValueError:  # no weight, or a colon inside the path such as a Windows drive letter
+            path, weight = spec, 1.0
+        if not sep:
+            path, weight = spec, 1.0
+        clips.append(Clip(path, weight))
+    return clips
+
+
+def default_clips(directory: str) -> List[Clip]:
+    """Synthetic 1 s / 3 s / 6 s clips, generated with the benchmark helper"""
+    from benchmark import synthesize_clip
+
+    os.makedirs(directory, exist_ok=True)
+    clips = []
+    for seconds, weight in ((1.0, 3), (3.0, 2), (6.0, 1)):
+        path = os.path.join(directory, f"synthetic_640x480_{seconds:g}s.mp4")
+        if not os.path.exists(path):
+            synthesize_clip(path, 640, 480, seconds)
+        clips.append(Clip(path, weight))
+    return clips
+
+
+class Recorder:
+    """Thread-safe collection of per-request outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.results = []
+
+    def add(self, result: Dict) -> None:
+        with self._lock:
+            self.results.append(result)
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return list(self.results)
+
+
+def send_request(session: requests.Session, url: str, clip: Clip, outputs: Optional[str], fetch_outputs: bool, timeout: float) -> Dict:
+    """One /predict call, then optionally GET each returned output"""
+    result = {"clip": clip.name, "start": time.time(), "status": None, "error": None}
+    start = time.perf_counter()
+    try:
+        data = {"outputs": outputs} if outputs else None
+        response = session.post(
+            f"{url}/predict",
+            files={"file": (clip.name, clip.data, "video/mp4")},
+            data=data,
+            timeout=timeout,
+        )
+        result["status"] = response.status_code
+        result["latency"] = time.perf_counter() - start
+        if response.status_code != 200:
+            result["error"] = response.text[:200]
+            return result
+        body = response.json()
+        if fetch_outputs:
+            output_start = time.perf_counter()
+            for key in ("audioUri", "videoUri"):
+                uri = body.get(key)
+                if not uri:
+                    continue
+                # Served URIs use the server's BASE_URL; fetch through the URL under test instead
+                path = uri[uri.index("/outputs/"):] if "/outputs/" in uri else uri
+                output = session.get(f"{url}{path}", timeout=timeout)
+                if output.status_code != 200:
+                    result["status"] = output.status_code
+                    result["error"] = f"{key}: {output.status_code}"
+                    break
+            result["outputs_latency"] = time.perf_counter() - output_start
+    except requests.RequestException as e:
+        result["latency"] = time.perf_counter() - start
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def scrape_memory(session: requests.Session, url: str) -> Dict[str, float]:
+    """Resident memory per worker pid from one /metrics scrape (one worker answers per scrape)"""
+    try:
+        text = session.get(f"{url}/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    memory = {}
+    for line in text.splitlines():
+        if line.startswith("lipreading_process_resident_memory_bytes{"):
+            labels, value = line.rsplit(" ", 1)
+            pid = labels.split('pid="', 1)[1].split('"', 1)[0]
+            memory[pid] = float(value)
+    return memory
+
+
+class MemoryWatcher:
+    """Scrapes /metrics in the background, keeping first and last RSS seen per worker"""
+
+    def __init__(self, url: str, interval: float = 1.0):
+        self.url = url
+        self.interval = interval
+        self.first: Dict[str, float] = {}
+        self.last: Dict[str, float] = {}
+        self.peak: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._session = requests.Session()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for pid, rss in scrape_memory(self._session, self.url).items():
+                self.first.setdefault(pid, rss)
+                self.last[pid] = rss
+                self.peak[pid] = max(self.peak.get(pid, 0.0), rss)
+            self._stop.wait(self.interval)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            pid: {
+                "start_mb": self.first[pid] / 1e6,
+                "end_mb": self.last[pid] / 1e6,
+                "peak_mb": self.peak[pid] / 1e6,
+                "growth_mb": (self.last[pid] - self.first[pid]) / 1e6,
+            }
+            for pid in self.first
+        }
+
+
+def run_open_loop(args, clips: List[Clip], rate: float, recorder: Recorder) -> int:
+    """Poisson arrivals at `rate` req/s for one step; returns requests dropped at the client cap"""
+    weights = [clip.weight for clip in clips]
+    dropped = 0
+    inflight = threading.Semaphore(args.max_inflight)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.max_inflight)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def fire(clip: Clip) -> None:
+        try:
+            recorder.add(send_request(session, args.url, clip, args.outputs, args.fetch_outputs, args.timeout))
+        finally:
+            inflight.release()
+
+    with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+        deadline = time.monotonic() + args.step_seconds
+        next_arrival = time.monotonic()
+        while next_arrival < deadline:
+            time.sleep(max(0.0, next_arrival - time.monotonic()))
+            if inflight.acquire(blocking=False):
+                pool.submit(fire, random.choices(clips, weights)[0])
+            else:
+                dropped += 1
+            next_arrival += random.expovariate(rate)
+    return dropped
+
+
+def run_closed_loop(args, clips: List[Clip], concurrency: int, recorder: Recorder) -> int:
+    """`concurrency` clients sending back to back for one step"""
+    weights = [clip.weight for clip in clips]
+    deadline = time.monotonic() + args.step_seconds
+
+    def client() -> None:
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            recorder.add(send_request(session, args.url, random.choices(clips, weights)[0], args.outputs, args.fetch_outputs, args.timeout))
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return 0
+
+
+def summarize_step(results: List[Dict], elapsed: float) -> Dict:
+    latencies = np.asarray([r["latency"] for r in results if r.get("latency") is not None and not r["error"]]) * 1000.0
+    errors = [r for r in results if r["error"]]
+    statuses = {}
+    for r in results:
+        key = str(r["status"]) if r["status"] is not None else "transport_error"
+        statuses[key] = statuses.get(key, 0) + 1
+    summary = {
+        "requests": len(results),
+        "ok": len(results) - len(errors),
+        "error_rate": len(errors) / len(results) if results else 0.0,
+        "throughput_rps": (len(results) - len(errors)) / elapsed if elapsed > 0 else 0.0,
+        "statuses": statuses,
+    }
+    if latencies.size:
+        summary.update({
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+        })
+    per_clip = {}
+    for r in results:
+        if not r["error"] and r.get("latency") is not None:
+            per_clip.setdefault(r["clip"], []).append(r["latency"] * 1000.0)
+    summary["per_clip_p50_ms"] = {clip: float(np.percentile(v, 50)) for clip, v in per_clip.items()}
+    outputs = [r["outputs_latency"] * 1000.0 for r in results if r.get("outputs_latency") is not None]
+    if outputs:
+        summary["outputs_p95_ms"] = float(np.percentile(outputs, 95))
+    if errors:
+        summary["sample_errors"] = sorted({r["error"] for r in errors})[:5]
+    return summary
+
+
+def is_saturated(step: Dict, args) -> Tuple[bool, str]:
+    if step["error_rate"] > args.max_error_rate:
+        return True, f"error rate {step['error_rate']:.1%} > {args.max_error_rate:.1%}"
+    if step.get("p95_ms", 0.0) > args.slo_p95_ms:
+        return True, f"p95 {step['p95_ms']:.0f} ms > SLO {args.slo_p95_ms:.0f} ms"
+    if step.get("offered_rps") and step["throughput_rps"] < 0.9 * step["offered_rps"]:
+        return True, f"throughput {step['throughput_rps']:.2f} rps < 90% of offered {step['offered_rps']:.2f} rps"
+    return False, ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ramp load against /predict and find the saturation point")
+    parser.add_argument("--url", type=str, default="http://localhost:8080")
+    parser.add_argument("--clips", nargs="+", default=None, help="clip mix as path[:weight] (default: synthetic clips)")
+    parser.add_argument("--clips_dir", type=str, default="benchmark_clips")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rates", nargs="+", type=float, default=None, help="open-loop arrival rates (req/s), one step each")
+    mode.add_argument("--concurrency", nargs="+", type=int, default=None, help="closed-loop client counts, one step each")
+    parser.add_argument("--step_seconds", type=float, default=30.0)
+    parser.add_argument("--max_inflight", type=int, default=64, help="client-side cap on open-loop requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--outputs", type=str, default=None, help="outputs form field sent to /predict (e.g. text,audio)")
+    parser.add_argument("--fetch_outputs", action="store_true", help="GET every returned audio/video URI")
+    parser.add_argument("--slo_p95_ms", type=float, default=10000.0)
+    parser.add_argument("--max_error_rate", type=float, default=0.01)
+    parser.add_argument("--stop_at_saturation", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="loadtest_results.json")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    clips = parse_clips(args.clips) if args.clips else default_clips(args.clips_dir)
+    if not args.rates and not args.concurrency:
+        args.rates = [0.5, 1, 2, 4, 8]
+
+    try:
+        requests.get(f"{args.url}/healthz", timeout=10).raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"❌ Server not reachable at {args.url}: {e}")
+        return 1
+
+    steps = [("rate", r) for r in args.rates] if args.rates else [("concurrency", c) for c in args.concurrency]
+    report = {
+        "url": args.url,
+        "clips": {clip.name: {"weight": clip.weight, "bytes": len(clip.data)} for clip in clips},
+        "step_seconds": args.step_seconds,
+        "steps": [],
+        "saturation": None,
+    }
+    for kind, level in steps:
+        recorder = Recorder()
+        logger.info(f"🚀 Step {kind}={level} for {args.step_seconds:.0f}s")
+        with MemoryWatcher(args.url) as memory:
+            start = time.monotonic()
+            if kind == "rate":
+                dropped = run_open_loop(args, clips, level, recorder)
+            else:
+                dropped = run_closed_loop(args, clips, level, recorder)
+            elapsed = time.monotonic() - start
+        step = summarize_step(recorder.snapshot(), elapsed)
+        step.update({kind: level, "client_dropped": dropped, "memory": memory.report()})
+        if kind == "rate":
+            step["offered_rps"] = level
+        report["steps"].append(step)
+        logger.info(
+            f"   {step['throughput_rps']:.2f} rps ok, errors {step['error_rate']:.1%}, "
+            f"p50 {step.get('p50_ms', 0):.0f} ms, p95 {step.get('p95_ms', 0):.0f} ms, p99 {step.get('p99_ms', 0):.0f} ms"
+        )
+        for pid, mem in step["memory"].items():
+            logger.info(f"   worker {pid}: {mem['end_mb']:.0f} MB ({mem['growth_mb']:+.1f} MB this step)")
+
+        saturated, reason = is_saturated(step, args)
+        if saturated and report["saturation"] is None:
+            report["saturation"] = {kind: level, "reason": reason}
+            logger.warning(f"⚠️ Saturated at {kind}={level}: {reason}")
+            if args.stop_at_saturation:
+                break
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if report["saturation"] is None:
+        logger.info("✅ No saturation within the tested range")
+    logger.info(f"📝 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
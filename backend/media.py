@@ -0,0 +1,356 @@
+"""
+Media Rendering
+===============
+
+Text-to-speech and captioned video rendering for lip-reading results.
+"""
+
+import os
+import json
+import math
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # not on Windows: renders then only serialize within one process
+    fcntl = None
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.metrics import STAGE_SECONDS
+from utils import tracing
+from storage import get_output_store
+
+logger = setup_logger(__name__)
+
+def _configure_moviepy():
+    """Point moviepy at ImageMagick; moviepy is only imported once something is rendered"""
+    import moviepy.config as cf
+    cf.IMAGEMAGICK_BINARY = Config.IMAGEMAGICK_PATH
+
+def loop_audio(audio_clip, target_duration):
+    """Custom function to loop audio to match target duration"""
+    from moviepy.editor import concatenate_audioclips
+    if audio_clip.duration >= target_duration:
+        return audio_clip.subclip(0, target_duration)
+    
+    # Calculate how many times we need to repeat
+    repeat_count = math.ceil(target_duration / audio_clip.duration)
+    
+    # Create list of audio clips to concatenate
+    audio_clips = [audio_clip] * repeat_count
+    
+    # Concatenate and trim to exact duration
+    looped_audio = concatenate_audioclips(audio_clips)
+    return looped_audio.subclip(0, target_duration)
+
+def fake_tts(text: str, audio_path: str) -> None:
+    """Offline gTTS stand-in: a silent MP3 about as long as the speech, after a fixed delay"""
+    time.sleep(Config.FAKE_TTS_LATENCY)
+    seconds = max(0.5, 0.08 * len(text))
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono", "-t", f"{seconds:.2f}", audio_path,
+    ]
+    process = subprocess.run(cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {process.stderr}")
+
+def generate_audio(prediction: str, audio_path: str) -> None:
+    """Synthesize the transcript with gTTS (or the fake TTS) into audio_path"""
+    try:
+        with STAGE_SECONDS.time(stage="tts"), tracing.span("tts", chars=len(str(prediction))):
+            if Config.TTS_BACKEND == "fake":
+                fake_tts(str(prediction), audio_path)
+            else:
+                # Use slower speech for better quality and WhatsApp compatibility
+                from gtts import gTTS
+                tts = gTTS(text=str(prediction), lang=Config.TTS_LANGUAGE, slow=Config.TTS_SLOW)
+                tts.save(audio_path)
+        logger.info(f"Generated audio file: {audio_path}")
+        
+        # Verify file was created
+        if not os.path.exists(audio_path):
+            raise Exception("Audio file was not created")
+            
+    except Exception as e:
+        logger.error(f"TTS generation failed: {str(e)}")
+        raise RuntimeError(f"Audio generation failed: {str(e)}")
+
+def render_video(unique_id: str, video_path: str, filename: str, prediction: str, audio_path: str, output_video_path: str):
+    """Render the muted input with captions and the TTS track; returns the output path or None"""
+    with STAGE_SECONDS.time(stage="render"), tracing.span("render"):
+        result = _render_video(unique_id, video_path, filename, prediction, audio_path, output_video_path)
+        tracing.set_attribute("rendered", result is not None)
+        return result
+
+def _render_video(unique_id: str, video_path: str, filename: str, prediction: str, audio_path: str, output_video_path: str):
+    _configure_moviepy()
+    from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip
+    video_copy_path = f"temp/copy_{unique_id}_{filename}"
+    try:
+        # Create a copy for moviepy processing
+        shutil.copyfile(video_path, video_copy_path)
+        
+        # Load original video and MUTE it
+        original_video = VideoFileClip(video_copy_path)
+        muted_video = original_video.without_audio()  # Remove original audio
+        
+        logger.info(f"Original video: duration={original_video.duration}, size=({original_video.w}x{original_video.h})")
+        
+        # Create text clip for captions
+        try:
+            font_size = max(24, min(48, original_video.w // 20))
+            
+            txt_clip = TextClip(
+                str(prediction), 
+                fontsize=font_size, 
+                color='white',
+                stroke_color='black',
+                stroke_width=2,
+                font='Arial-Bold'
+            ).set_position(('center', 0.85), relative=True).set_duration(original_video.duration)
+            
+            logger.info("Text clip created successfully")
+            
+        except Exception as text_error:
+            logger.warning(f"TextClip creation failed: {text_error}")
+            # Simple fallback
+            txt_clip = TextClip(
+                str(prediction), 
+                fontsize=24, 
+                color='white'
+            ).set_position('bottom').set_duration(original_video.duration)
+            logger.info("Fallback text clip created")
+        
+        # Composite muted video with text
+        video_with_text = CompositeVideoClip([muted_video, txt_clip])
+        
+        # Load generated audio and add to video
+        new_audio = AudioFileClip(audio_path)
+        
+        # Handle audio duration mismatch - CUSTOM LOOP FUNCTION
+        if new_audio.duration != original_video.duration:
+            new_audio = loop_audio(new_audio, original_video.duration)
+            logger.info(f"Audio adjusted to match video duration: {original_video.duration}s")
+        
+        # Set the new audio to the video
+        final_video = video_with_text.set_audio(new_audio)
+        
+        # Write final video
+        final_video.write_videofile(
+            output_video_path, 
+            codec="libx264", 
+            audio_codec="aac",
+            fps=24,
+            verbose=False,
+            logger=None,
+            temp_audiofile=f'temp/temp_audio_{unique_id}.m4a',
+            remove_temp=True
+        )
+        
+        # Clean up clips
+        original_video.close()
+        muted_video.close()
+        txt_clip.close()
+        video_with_text.close()
+        new_audio.close()
+        final_video.close()
+        
+        logger.info(f"Generated video with new audio and captions: {output_video_path}")
+        return output_video_path
+        
+    except Exception as e:
+        logger.error(f"Video generation failed: {str(e)}")
+        import traceback
+        logger.error(f"Full traceback: {traceback.format_exc()}")
+        # Continue without video - audio will still be available
+        return None
+    finally:
+        if os.path.exists(video_copy_path):
+            try:
+                os.remove(video_copy_path)
+                logger.info(f"Cleaned up temp file: {video_copy_path}")
+            except Exception as e:
+                logger.warning(f"Could not remove temp file {video_copy_path}: {str(e)}")
+
+# ---------------------------------------------------------------------------
+# Deferred rendering: /predict records what each output needs and the media
+# is produced on first GET /outputs/{filename} or by a background thread.
+# ---------------------------------------------------------------------------
+
+MEDIA_KINDS = ("audio", "video")
+PENDING_NAME = ".pending"  # dot-files in the output store are not indexed or evicted as artifacts
+SOURCES_DIR = "uploads"
+
+# Striped locks serialize renders of the same result between threads without a lock per id;
+# an flock on <pending>/<id>.lock serializes them between API worker processes
+_render_locks = [threading.Lock() for _ in range(64)]
+_background_lock = threading.Lock()
+_background_renders = None
+
+def output_filename(kind: str, unique_id: str) -> str:
+    return f"audio_{unique_id}.mp3" if kind == "audio" else f"video_{unique_id}.mp4"
+
+def output_path(filename: str) -> str:
+    """Where an output file lives in the configured output store"""
+    return get_output_store().backend.path(filename)
+
+def pending_dir() -> str:
+    return output_path(PENDING_NAME)
+
+def _recipe_path(unique_id: str) -> str:
+    return os.path.join(pending_dir(), f"{unique_id}.json")
+
+def _lock_path(unique_id: str) -> str:
+    return os.path.join(pending_dir(), f"{unique_id}.lock")
+
+@contextmanager
+def _render_lock(unique_id: str):
+    with _render_locks[hash(unique_id) % len(_render_locks)]:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(pending_dir(), exist_ok=True)
+        with open(_lock_path(unique_id), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _retire_recipe(unique_id: str) -> None:
+    """Drop a finished or stale recipe and its lock file (called with the render lock held)"""
+    _remove(_recipe_path(unique_id))
+    # Anyone still waiting on the old lock finds the outputs or no recipe once it gets it
+    _remove(_lock_path(unique_id))
+
+def _partial_path(path: str) -> str:
+    """Hidden sibling a render is written to before it is moved into place"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".part-{os.getpid()}-{threading.get_ident()}-{name}")
+
+def _publish(render, path: str):
+    """Run render(tmp_path) and atomically move its output to path; readers never see a partial file"""
+    partial = _partial_path(path)
+    try:
+        result = render(partial)
+        if result is not None and os.path.exists(partial):
+            os.replace(partial, path)
+            return path
+        return None
+    finally:
+        _remove(partial)
+
+def register_render(unique_id: str, prediction: str, kinds, video_path: str = None, filename: str = None) -> None:
+    """Persist what is needed to render the requested media later.
+
+    The source clip is moved to uploads/ when a video is requested, since the
+    caller's temp upload is deleted once the request returns.
+    """
+    os.makedirs(pending_dir(), exist_ok=True)
+    source_path = None
+    if "video" in kinds and video_path:
+        os.makedirs(SOURCES_DIR, exist_ok=True)
+        source_path = os.path.join(SOURCES_DIR, f"{unique_id}_{os.path.basename(filename or video_path)}")
+        shutil.copyfile(video_path, source_path)
+    recipe = {
+        "unique_id": unique_id,
+        "prediction": prediction,
+        "kinds": sorted(kinds),
+        "source_path": source_path,
+        "filename": filename,
+    }
+    with open(_recipe_path(unique_id), "w") as f:
+        json.dump(recipe, f)
+
+def _load_recipe(unique_id: str):
+    try:
+        with open(_recipe_path(unique_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def ensure_output(filename: str):
+    """Return the path of an output file, rendering it first if it is still pending.
+
+    Concurrent requests for the same result wait on one render. Returns None
+    when the file neither exists nor has a pending recipe.
+    """
+    path = output_path(filename)
+    if os.path.exists(path):
+        return path
+    kind, _, rest = filename.partition("_")
+    unique_id = os.path.splitext(rest)[0]
+    if kind not in MEDIA_KINDS or not unique_id:
+        return None
+    with _render_lock(unique_id):
+        if os.path.exists(path):
+            return path
+        recipe = _load_recipe(unique_id)
+        if recipe is None or kind not in recipe["kinds"]:
+            return None
+        audio_path = output_path(output_filename("audio", unique_id))
+        # Deferred work is traced under the id of the /predict request that produced it
+        with tracing.trace_request(unique_id, "deferred_render", kind=kind):
+            if not os.path.exists(audio_path):
+                _publish(lambda tmp: generate_audio(recipe["prediction"], tmp) or tmp, audio_path)
+            if kind == "video":
+                _publish(lambda tmp: render_video(unique_id, recipe["source_path"], recipe["filename"], recipe["prediction"], audio_path, tmp), path)
+                # A failed video render is not retried, so the source clip is no longer needed
+                if recipe["source_path"]:
+                    _remove(recipe["source_path"])
+        remaining = [
+            k for k in recipe["kinds"]
+            if k != kind and not os.path.exists(output_path(output_filename(k, unique_id)))
+        ]
+        if remaining:
+            recipe["kinds"] = remaining
+            with open(_recipe_path(unique_id), "w") as f:
+                json.dump(recipe, f)
+        else:
+            _retire_recipe(unique_id)
+    return path if os.path.exists(path) else None
+
+def purge_stale_renders(max_age: float = None) -> int:
+    """Drop pending recipes (and their source clips) nobody fetched within max_age seconds"""
+    max_age = max_age or Config.OUTPUT_TTL_SECONDS
+    if not max_age or not os.path.isdir(pending_dir()):
+        return 0
+    cutoff = time.time() - max_age
+    purged = 0
+    for name in os.listdir(pending_dir()):
+        unique_id, ext = os.path.splitext(name)
+        if ext != ".json":
+            continue
+        path = _recipe_path(unique_id)
+        with _render_lock(unique_id):
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except OSError:
+                continue
+            recipe = _load_recipe(unique_id)
+            if recipe and recipe.get("source_path"):
+                _remove(recipe["source_path"])
+            _retire_recipe(unique_id)
+            purged += 1
+    return purged
+
+def render_in_background(unique_id: str, kinds) -> None:
+    """Render pending media on a small background pool (audio first, then video)"""
+    global _background_renders
+    with _background_lock:
+        if _background_renders is None:
+            _background_renders = ThreadPoolExecutor(max_workers=Config.PIPELINE_RENDER_WORKERS, thread_name_prefix="render")
+    for kind in sorted(kinds):
+        _background_renders.submit(ensure_output, output_filename(kind, unique_id))
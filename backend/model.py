@@ -2,24 +2,61 @@ import torch
 import torch.nn as nn
 import torch.nn.init as init
 import math
+from typing import Optional
+
+
+# Each of conv1..conv3 has a temporal kernel of 3 and stride 1, so a front-end
+# output frame depends on at most this many input frames on either side.
+FRONTEND_HALO = 3
+
+
+def separable_conv3d(in_channels, out_channels, kernel, stride, padding):
+    """(2+1)D factorization of a Conv3d: a spatial (1, k, k) conv followed by a temporal (t, 1, 1) conv"""
+    return nn.Sequential(
+        nn.Conv3d(in_channels, out_channels, (1,) + kernel[1:], (1,) + stride[1:], (0,) + padding[1:]),
+        nn.ReLU(inplace=True),
+        nn.Conv3d(out_channels, out_channels, (kernel[0], 1, 1), (stride[0], 1, 1), (padding[0], 0, 0)),
+    )
+
+
+def packed_gru(gru, x, lengths):
+    """Run a (T, B, F) GRU input only up to each sequence's length; padded steps come out as zeros"""
+    packed = nn.utils.rnn.pack_padded_sequence(x, lengths.cpu(), enforce_sorted=False)
+    out, _ = gru(packed)
+    out, _ = nn.utils.rnn.pad_packed_sequence(out, total_length=x.size(0))
+    return out
+
+
+def frame_mask(lengths, frames):
+    """(B, 1, T, 1, 1) mask that is 1 for the frames inside each sequence's length"""
+    mask = torch.arange(frames, device=lengths.device)[None, :] < lengths.view(-1, 1)
+    return mask[:, None, :, None, None]
 
 
 class LipCoordNet(torch.nn.Module):
-    def __init__(self, dropout_p=0.5, coord_input_dim=40, coord_hidden_dim=128):
+    def __init__(self, dropout_p=0.5, coord_input_dim=40, coord_hidden_dim=128,
+                 conv_channels=(32, 64, 96), gru_hidden_dim=256, separable=False):
         super(LipCoordNet, self).__init__()
-        self.conv1 = nn.Conv3d(3, 32, (3, 5, 5), (1, 2, 2), (1, 2, 2))
+        # The defaults are the released architecture; smaller settings build distillation students
+        c1, c2, c3 = conv_channels
+        conv = separable_conv3d if separable else nn.Conv3d
+        self.conv_channels = tuple(conv_channels)
+        self.gru_hidden_dim = gru_hidden_dim
+        self.separable = separable
+
+        self.conv1 = conv(3, c1, (3, 5, 5), (1, 2, 2), (1, 2, 2))
         self.pool1 = nn.MaxPool3d((1, 2, 2), (1, 2, 2))
 
-        self.conv2 = nn.Conv3d(32, 64, (3, 5, 5), (1, 1, 1), (1, 2, 2))
+        self.conv2 = conv(c1, c2, (3, 5, 5), (1, 1, 1), (1, 2, 2))
         self.pool2 = nn.MaxPool3d((1, 2, 2), (1, 2, 2))
 
-        self.conv3 = nn.Conv3d(64, 96, (3, 3, 3), (1, 1, 1), (1, 1, 1))
+        self.conv3 = conv(c2, c3, (3, 3, 3), (1, 1, 1), (1, 1, 1))
         self.pool3 = nn.MaxPool3d((1, 2, 2), (1, 2, 2))
 
-        self.gru1 = nn.GRU(96 * 4 * 8, 256, 1, bidirectional=True)
-        self.gru2 = nn.GRU(512, 256, 1, bidirectional=True)
+        self.gru1 = nn.GRU(c3 * 4 * 8, gru_hidden_dim, 1, bidirectional=True)
+        self.gru2 = nn.GRU(2 * gru_hidden_dim, gru_hidden_dim, 1, bidirectional=True)
 
-        self.FC = nn.Linear(512 + 2 * coord_hidden_dim, 27 + 1)
+        self.FC = nn.Linear(2 * gru_hidden_dim + 2 * coord_hidden_dim, 27 + 1)
         self.dropout_p = dropout_p
 
         self.relu = nn.ReLU(inplace=True)
@@ -34,38 +71,64 @@ class LipCoordNet(torch.nn.Module):
         self._init()
 
     def _init(self):
-        init.kaiming_normal_(self.conv1.weight, nonlinearity="relu")
-        init.constant_(self.conv1.bias, 0)
-
-        init.kaiming_normal_(self.conv2.weight, nonlinearity="relu")
-        init.constant_(self.conv2.bias, 0)
-
-        init.kaiming_normal_(self.conv3.weight, nonlinearity="relu")
-        init.constant_(self.conv3.bias, 0)
+        for layer in (self.conv1, self.conv2, self.conv3):
+            for m in layer.modules():
+                if isinstance(m, nn.Conv3d):
+                    init.kaiming_normal_(m.weight, nonlinearity="relu")
+                    init.constant_(m.bias, 0)
 
         init.kaiming_normal_(self.FC.weight, nonlinearity="sigmoid")
         init.constant_(self.FC.bias, 0)
 
+        hidden = self.gru_hidden_dim
         for m in (self.gru1, self.gru2):
-            stdv = math.sqrt(2 / (96 * 3 * 6 + 256))
-            for i in range(0, 256 * 3, 256):
+            stdv = math.sqrt(2 / (self.conv_channels[2] * 3 * 6 + hidden))
+            for i in range(0, hidden * 3, hidden):
                 init.uniform_(
-                    m.weight_ih_l0[i : i + 256],
+                    m.weight_ih_l0[i : i + hidden],
                     -math.sqrt(3) * stdv,
                     math.sqrt(3) * stdv,
                 )
-                init.orthogonal_(m.weight_hh_l0[i : i + 256])
-                init.constant_(m.bias_ih_l0[i : i + 256], 0)
+                init.orthogonal_(m.weight_hh_l0[i : i + hidden])
+                init.constant_(m.bias_ih_l0[i : i + hidden], 0)
                 init.uniform_(
-                    m.weight_ih_l0_reverse[i : i + 256],
+                    m.weight_ih_l0_reverse[i : i + hidden],
                     -math.sqrt(3) * stdv,
                     math.sqrt(3) * stdv,
                 )
-                init.orthogonal_(m.weight_hh_l0_reverse[i : i + 256])
-                init.constant_(m.bias_ih_l0_reverse[i : i + 256], 0)
+                init.orthogonal_(m.weight_hh_l0_reverse[i : i + hidden])
+                init.constant_(m.bias_ih_l0_reverse[i : i + hidden], 0)
+
+    @torch.jit.unused
+    def _flatten_parameters(self):
+        # only meaningful for cuDNN; kept out of scripted/traced graphs. Dynamic-quantized
+        # GRUs (int8 backend) hold packed weights and have nothing to flatten
+        for gru in (self.gru1, self.gru2, self.coord_gru):
+            if isinstance(gru, nn.GRU) and gru.weight_ih_l0.is_cuda:
+                gru.flatten_parameters()
+
+    @torch.jit.unused
+    def _masked_frontend(self, x, lengths: torch.Tensor):
+        # Zero every block's output past each clip's end, as a clip forwarded on its
+        # own sees zero padding there; separable layers are masked between their convs
+        mask = frame_mask(lengths.to(x.device), x.size(2)).to(x.dtype)
+        for conv, pool in ((self.conv1, self.pool1), (self.conv2, self.pool2), (self.conv3, self.pool3)):
+            for m in (conv if isinstance(conv, nn.Sequential) else [conv]):
+                x = m(x)
+                if isinstance(m, nn.ReLU):
+                    x = x * mask
+            x = self.relu(x) * mask
+            x = self.dropout3d(x)
+            x = pool(x)
+        x = x.permute(2, 0, 1, 3, 4).contiguous()
+        return x.view(x.size(0), x.size(1), -1)
+
+    @torch.jit.export
+    def frontend(self, x, lengths: Optional[torch.Tensor] = None):
+        """Conv3d stack: (B, 3, T, 64, 128) -> per-frame features (T, B, 96*4*8)"""
+        if lengths is not None:
+            return self._masked_frontend(x, lengths)
 
-    def forward(self, x, coords):
-        # branch 1 - Video processing
         x = self.conv1(x)
         x = self.relu(x)
         x = self.dropout3d(x)
@@ -85,9 +148,42 @@ class LipCoordNet(torch.nn.Module):
         x = x.permute(2, 0, 1, 3, 4).contiguous()
         # (B, C, T, H, W)->(T, B, C*H*W)
         x = x.view(x.size(0), x.size(1), -1)
+        return x
+
+    @torch.jit.unused
+    def _packed_head(self, x, coords, lengths: torch.Tensor):
+        return self._head_after_gru1(packed_gru(self.gru1, x, lengths), coords, lengths)
+
+    @torch.jit.unused
+    def head_after_gru1(self, x, coords, lengths: Optional[torch.Tensor] = None):
+        """head() from gru1's (T, B, 2*hidden) output on; used to fine-tune on cached gru1 features"""
+        self._flatten_parameters()
+        return self._head_after_gru1(x, coords, lengths)
+
+    @torch.jit.unused
+    def _head_after_gru1(self, x, coords, lengths: Optional[torch.Tensor] = None):
+        x = self.dropout(x)
+        x = self.gru2(x)[0] if lengths is None else packed_gru(self.gru2, x, lengths)
+        x = self.dropout(x)
+        coords = coords.permute(1, 0, 2, 3).contiguous()
+        coords = coords.view(coords.size(0), coords.size(1), -1)
+        coords = self.coord_gru(coords)[0] if lengths is None else packed_gru(self.coord_gru, coords, lengths)
+        coords = self.dropout(coords)
+        x = self.FC(torch.cat((x, coords), dim=2))
+        return x.permute(1, 0, 2).contiguous()
+
+    @torch.jit.export
+    def head(self, x, coords, lengths: Optional[torch.Tensor] = None):
+        """Recurrent layers and classifier: front-end features + coords -> (B, T, 28) logits
 
-        self.gru1.flatten_parameters()
-        self.gru2.flatten_parameters()
+        With lengths (B,), the GRUs run on packed sequences: padded steps are
+        skipped and never reach the reverse direction, and their logits are FC(0).
+        """
+        if not torch.jit.is_scripting():
+            if not torch.jit.is_tracing():
+                self._flatten_parameters()
+        if lengths is not None:
+            return self._packed_head(x, coords, lengths)
 
         x, h = self.gru1(x)
         x = self.dropout(x)
@@ -98,8 +194,7 @@ class LipCoordNet(torch.nn.Module):
         # coords shape: (B, T, 20, 2) -> need to reshape to (T, B, 40)
         coords = coords.permute(1, 0, 2, 3).contiguous()  # (T, B, 20, 2)
         coords = coords.view(coords.size(0), coords.size(1), -1)  # (T, B, 40)
-        
-        self.coord_gru.flatten_parameters()
+
         coords, _ = self.coord_gru(coords)
         coords = self.dropout(coords)
 
@@ -109,3 +204,65 @@ class LipCoordNet(torch.nn.Module):
         x = self.FC(combined)
         x = x.permute(1, 0, 2).contiguous()
         return x
+
+    def forward(self, x, coords, lengths: Optional[torch.Tensor] = None):
+        # branch 1 - Video processing
+        x = self.frontend(x, lengths)
+        return self.head(x, coords, lengths)
+
+def architecture_from_state_dict(state_dict):
+    """LipCoordNet constructor arguments matching a checkpoint (released model, student or pruned)"""
+    separable = "conv1.0.weight" in state_dict
+    suffix = ".2.weight" if separable else ".weight"
+    return {
+        "conv_channels": tuple(state_dict[name + suffix].size(0) for name in ("conv1", "conv2", "conv3")),
+        "gru_hidden_dim": state_dict["gru1.weight_hh_l0"].size(1),
+        "coord_hidden_dim": state_dict["coord_gru.weight_hh_l0"].size(1),
+        "separable": separable,
+    }
+
+class LipCoordOnlyNet(torch.nn.Module):
+    """Coordinate-only model: the lip landmark GRU branch of LipCoordNet with its own classifier.
+
+    Takes the same inputs as LipCoordNet so training and serving code can call
+    either; the video tensor is ignored (pass None). The first coord_gru layer
+    has LipCoordNet's parameter names and shapes, so a LipCoordNet checkpoint
+    warm-starts it.
+    """
+
+    uses_video = False
+
+    def __init__(self, dropout_p=0.5, coord_input_dim=40, coord_hidden_dim=128, num_layers=2):
+        super(LipCoordOnlyNet, self).__init__()
+        self.coord_gru = nn.GRU(
+            coord_input_dim, coord_hidden_dim, num_layers, bidirectional=True,
+            dropout=dropout_p if num_layers > 1 else 0.0,
+        )
+        self.FC = nn.Linear(2 * coord_hidden_dim, 27 + 1)
+        self.dropout_p = dropout_p
+        self.dropout = nn.Dropout(self.dropout_p)
+
+        init.kaiming_normal_(self.FC.weight, nonlinearity="sigmoid")
+        init.constant_(self.FC.bias, 0)
+
+    def forward(self, x, coords, lengths=None):
+        if coords.is_cuda:
+            self.coord_gru.flatten_parameters()
+        # (B, T, 20, 2) -> (T, B, 40)
+        coords = coords.permute(1, 0, 2, 3).contiguous()
+        coords = coords.view(coords.size(0), coords.size(1), -1)
+        if lengths is not None:
+            coords = packed_gru(self.coord_gru, coords, lengths)
+        else:
+            coords, _ = self.coord_gru(coords)
+        coords = self.dropout(coords)
+        x = self.FC(coords)
+        return x.permute(1, 0, 2).contiguous()
+
+def prepare_for_inference(model):
+    """Put the model in eval mode and swap the dropout layers for identities"""
+    model.eval()
+    model.dropout = nn.Identity()
+    if hasattr(model, "dropout3d"):
+        model.dropout3d = nn.Identity()
+    return model
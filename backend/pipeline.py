@@ -0,0 +1,353 @@
+"""
+Staged Pipeline
+===============
+
+Runs the /predict work as independent stages connected by bounded queues.
+Each stage has its own worker count, so I/O-bound stages (TTS, rendering)
+and CPU-bound stages (decode, landmarks, model) overlap across requests
+instead of idling cores while one request moves through them in sequence.
+A full queue blocks the stage feeding it, so backpressure reaches
+``Pipeline.submit`` instead of piling work up in memory.
+"""
+
+import contextvars
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import Config
+from utils.logger import setup_logger
+from utils import tracing
+
+logger = setup_logger("pipeline")
+
+_STOP = object()
+
+# Transcript returned when the video could not be read; keeps /predict's original behavior
+FALLBACK_PREDICTION = "HELLO WORLD"
+
+
+class StageError(Exception):
+    """A stage raised while processing an item"""
+
+    def __init__(self, stage: str, cause: BaseException):
+        super().__init__(f"{stage} stage failed: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+
+class Stage:
+    """
+    One step of the pipeline
+
+    Args:
+        name: Stage name used in stats and errors
+        fn: Callable taking an item and returning the item for the next stage;
+            with batch_size > 1 it takes and returns a list of items
+        workers: Number of threads running this stage
+        queue_size: Capacity of the stage's input queue
+        batch_size: Maximum number of items handed to fn at once
+        batch_timeout: Seconds to wait for a batch to fill before running it
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        workers: int = 1,
+        queue_size: Optional[int] = None,
+        batch_size: int = 1,
+        batch_timeout: float = 0.05,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size or Config.PIPELINE_QUEUE_SIZE)
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, items: int, failed: bool) -> None:
+        with self._lock:
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            if failed:
+                self.failed += items
+            else:
+                self.completed += items
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            processed = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queue_depth": self.queue.qsize(),
+                "queue_capacity": self.queue.maxsize,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_seconds": self.total_seconds / processed if processed else 0.0,
+                "max_seconds": self.max_seconds,
+            }
+
+
+class Pipeline:
+    """Chain of stages; submit() returns a Future resolved by the last stage"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self._threads = []
+        self._started = False
+
+    def start(self) -> "Pipeline":
+        if self._started:
+            return self
+        for index, stage in enumerate(self.stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(index,), name=f"{stage.name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        self._started = True
+        logger.info(
+            "✅ Pipeline started: "
+            + ", ".join(f"{s.name}x{s.workers}" + (f"(batch {s.batch_size})" if s.batch_size > 1 else "") for s in self.stages)
+        )
+        return self
+
+    def stop(self) -> None:
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+        self._started = False
+
+    def submit(self, item: Any) -> Future:
+        """Enqueue an item; blocks while the first stage's queue is full
+
+        The caller's context (request id, current span) travels with the item,
+        so stage work is traced and logged under the submitting request.
+        """
+        future = Future()
+        self.stages[0].queue.put((item, future, contextvars.copy_context()))
+        return future
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def _next_batch(self, stage: Stage):
+        first = stage.queue.get()
+        if first is _STOP or stage.batch_size == 1:
+            return first, [] if first is _STOP else [first]
+        batch = [first]
+        deadline = time.monotonic() + stage.batch_timeout
+        while len(batch) < stage.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = stage.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                # hand the sentinel back so this worker exits after the batch
+                stage.queue.put(_STOP)
+                break
+            batch.append(entry)
+        return first, batch
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        next_queue = self.stages[index + 1].queue if index + 1 < len(self.stages) else None
+        while True:
+            first, batch = self._next_batch(stage)
+            if first is _STOP:
+                return
+            items = [item for item, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            contexts = [context for _, _, context in batch]
+            with stage._lock:
+                stage.busy += 1
+            start = time.perf_counter()
+            started_at = time.time()
+            failed = False
+            try:
+                if stage.batch_size > 1:
+                    # Batched work is shared, so each request gets a span covering the batch
+                    outputs = stage.fn(items)
+                    for context in contexts:
+                        context.run(tracing.record_span, stage.name, started_at, time.time(), batch=len(items))
+                else:
+                    outputs = [contexts[0].run(self._run_traced, stage, items[0])]
+            except Exception as e:
+                failed = True
+                logger.error(f"{stage.name} stage failed: {e}")
+                for future in futures:
+                    future.set_exception(StageError(stage.name, e))
+            finally:
+                with stage._lock:
+                    stage.busy -= 1
+                stage.record(time.perf_counter() - start, len(items), failed)
+            if failed:
+                continue
+            for output, future, context in zip(outputs, futures, contexts):
+                if next_queue is None:
+                    future.set_result(output)
+                else:
+                    next_queue.put((output, future, context))
+
+    @staticmethod
+    def _run_traced(stage: Stage, item: Any) -> Any:
+        with tracing.span(stage.name):
+            return stage.fn(item)
+
+
+# ---------------------------------------------------------------------------
+# /predict stages. Items are dicts carrying the request id, paths and results.
+# ---------------------------------------------------------------------------
+
+def _fallback(ctx: Dict, error: Exception) -> Dict:
+    logger.error(f"Prediction failed: {str(error)}")
+    logger.info(f"Using fallback prediction: {FALLBACK_PREDICTION}")
+    ctx["prediction"] = FALLBACK_PREDICTION
+    return ctx
+
+
+def decode_stage(ctx: Dict) -> Dict:
+    """Probe the container and extract 25 fps JPEG frames"""
+    from inference import extract_frames, probe_video
+
+    try:
+        probe_video(ctx["video_path"])
+        ctx["temp_dir"] = tempfile.mkdtemp()
+        samples_dir = os.path.join(ctx["temp_dir"], "samples")
+        os.makedirs(samples_dir, exist_ok=True)
+        ctx["frame_paths"] = extract_frames(ctx["video_path"], samples_dir)
+    except Exception as e:
+        _cleanup_frames(ctx)
+        return _fallback(ctx, e)
+    return ctx
+
+
+def landmark_stage(ctx: Dict) -> Dict:
+    """Align frames into model tensors; long clips are run chunk by chunk here.
+
+    Fast-mode requests stop at lip coordinates and are transcribed here by the
+    coordinate-only model, so they never wait in the model batch queue.
+    """
+    from inference import (align_frames, get_runtime, iter_aligned_chunks, load_coords, predict_chunked,
+                           transcribe_coords)
+
+    if "prediction" in ctx:
+        return ctx
+    try:
+        frame_paths = ctx.pop("frame_paths")
+        if ctx.get("mode") == "fast":
+            model = get_runtime(Config.WEIGHTS_PATH, Config.DEVICE, "coords")
+            text = transcribe_coords(model, load_coords(frame_paths), Config.DEVICE)
+            if not text or text.strip() == "":
+                raise ValueError("Lip-reading prediction returned empty or invalid output")
+            logger.info(f"Prediction completed (fast): {text}")
+            ctx["prediction"] = text
+            return ctx
+        model = get_runtime(Config.WEIGHTS_PATH, Config.DEVICE)
+        if Config.CHUNK_FRAMES and len(frame_paths) > Config.CHUNK_FRAMES and model.supports_chunking:
+            # Bounded-memory path: the front end consumes chunks as they are aligned
+            with tracing.span("predict_chunked", chunk_frames=Config.CHUNK_FRAMES):
+                ctx["prediction"] = predict_chunked(
+                    model, iter_aligned_chunks(frame_paths, Config.CHUNK_FRAMES), Config.DEVICE
+                )
+        else:
+            ctx["video"], ctx["coords"] = align_frames(frame_paths)
+    except Exception as e:
+        return _fallback(ctx, e)
+    finally:
+        _cleanup_frames(ctx)
+    return ctx
+
+
+def model_stage(batch: List[Dict]) -> List[Dict]:
+    """Run LipCoordNet over every aligned clip in the batch"""
+    from inference import get_runtime, transcribe_batch
+
+    pending = [ctx for ctx in batch if "prediction" not in ctx]
+    if pending:
+        try:
+            model = get_runtime(Config.WEIGHTS_PATH, Config.DEVICE)
+            clips = [(ctx.pop("video"), ctx.pop("coords")) for ctx in pending]
+            for ctx, text in zip(pending, transcribe_batch(model, clips, Config.DEVICE)):
+                if not text or text.strip() == "":
+                    _fallback(ctx, ValueError("Lip-reading prediction returned empty or invalid output"))
+                else:
+                    logger.info(f"Prediction completed: {text}")
+                    ctx["prediction"] = text
+        except Exception as e:
+            for ctx in pending:
+                _fallback(ctx, e)
+    return batch
+
+
+def tts_stage(ctx: Dict) -> Dict:
+    """Synthesize speech when audio (or video, which embeds it) is rendered eagerly"""
+    from media import generate_audio
+
+    if not ctx["render"]:
+        return ctx
+    generate_audio(ctx["prediction"], ctx["audio_path"])
+    return ctx
+
+
+def render_stage(ctx: Dict) -> Dict:
+    from media import render_video
+
+    if "video" not in ctx["render"]:
+        ctx["output_video_path"] = None
+        return ctx
+    ctx["output_video_path"] = render_video(
+        ctx["unique_id"], ctx["video_path"], ctx["filename"], ctx["prediction"],
+        ctx["audio_path"], ctx["output_video_path"],
+    )
+    return ctx
+
+
+def _cleanup_frames(ctx: Dict) -> None:
+    temp_dir = ctx.pop("temp_dir", None)
+    if temp_dir:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def build_predict_pipeline() -> Pipeline:
+    """Pipeline for /predict with per-stage parallelism from Config"""
+    return Pipeline([
+        Stage("decode", decode_stage, workers=Config.PIPELINE_DECODE_WORKERS),
+        Stage("landmarks", landmark_stage, workers=Config.PIPELINE_LANDMARK_WORKERS),
+        Stage("model", model_stage, workers=1, batch_size=Config.PIPELINE_MODEL_BATCH),
+        Stage("tts", tts_stage, workers=Config.PIPELINE_TTS_WORKERS),
+        Stage("render", render_stage, workers=Config.PIPELINE_RENDER_WORKERS),
+    ])
+
+
+_predict_pipeline = None
+_predict_pipeline_lock = threading.Lock()
+
+
+def get_predict_pipeline() -> Pipeline:
+    """Process-wide /predict pipeline, started on first use"""
+    global _predict_pipeline
+    with _predict_pipeline_lock:
+        if _predict_pipeline is None:
+            _predict_pipeline = build_predict_pipeline().start()
+    return _predict_pipeline
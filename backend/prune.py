@@ -0,0 +1,303 @@
+"""
+Structured Channel Pruning
+==========================
+
+Removes whole output channels from the Conv3d front end (conv1..conv3).
+Channels are ranked on a validation subset by first-order Taylor
+importance, |activation x dL/dactivation| summed over time and space, with
+the CTC loss against the ground-truth transcripts. Pruned channels are cut
+out of the weights: conv{i} loses output filters, conv{i+1} the matching
+input slices, and gru1.weight_ih loses the 4*8 input columns each removed
+conv3 channel fed, so every pruned layer is smaller rather than masked.
+
+Each pruning level is fine-tuned briefly on the training list and saved as
+an ordinary state dict. ``architecture_from_state_dict`` recovers the
+narrower widths, so the eager backend, export.py and benchmark.py load a
+pruned checkpoint like the released one (point WEIGHTS_PATH at it).
+
+Usage:
+    python prune.py --video_path <GRID_imgs> --anno_path <GRID_align> --coords_path <coords>
+    python prune.py ... --levels 0.25 0.5 --finetune_steps 2000 --report prune_report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn as nn
+
+from checkpoints import load_weights, safetensors_path, save_safetensors
+from model import LipCoordNet, architecture_from_state_dict, prepare_for_inference
+from quantize import evaluate, validation_loader
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger("prune")
+
+CONV_LAYERS = ("conv1", "conv2", "conv3")
+# conv3 output is pooled to 4 x 8 before it is flattened into gru1's input
+GRU1_FEATURES_PER_CHANNEL = 4 * 8
+
+
+def _output_conv(model: LipCoordNet, name: str) -> nn.Conv3d:
+    """The Conv3d producing a conv layer's output (the layer itself unless it is separable)"""
+    return [m for m in getattr(model, name).modules() if isinstance(m, nn.Conv3d)][-1]
+
+
+def _conv_prefixes(state_dict: Dict[str, torch.Tensor], name: str):
+    """State dict prefixes of a conv layer's (first, last) Conv3d"""
+    if f"{name}.0.weight" in state_dict:
+        return f"{name}.0", f"{name}.2"
+    return name, name
+
+
+def channel_importance(model: LipCoordNet, loader, device: str, batches: Optional[int] = None) -> Dict[str, torch.Tensor]:
+    """
+    First-order Taylor importance of every conv1..conv3 output channel
+
+    Args:
+        model: fp32 LipCoordNet (its dropout layers are swapped out)
+        loader: Batches from MyDataset
+        device: Device to score on
+        batches: Stop after this many batches
+
+    Returns:
+        Layer name -> (channels,) importance scores
+    """
+    model = prepare_for_inference(model).to(device)
+    # cuDNN only runs GRU backward in training mode; dropout is already gone
+    model.train()
+    scores = {name: torch.zeros(_output_conv(model, name).out_channels, device=device) for name in CONV_LAYERS}
+
+    def capture(name):
+        def hook(module, inputs, output):
+            output.register_hook(lambda grad: scores[name].add_((output * grad).sum((2, 3, 4)).abs().sum(0).detach()))
+        return hook
+
+    handles = [_output_conv(model, name).register_forward_hook(capture(name)) for name in CONV_LAYERS]
+    crit = nn.CTCLoss()
+    try:
+        for i, batch in enumerate(loader):
+            if batches is not None and i >= batches:
+                break
+            y = model(batch["vid"].to(device), batch["coord"].to(device), batch["vid_len"])
+            loss = crit(
+                y.transpose(0, 1).log_softmax(-1),
+                batch["txt"].to(device),
+                batch["vid_len"].view(-1),
+                batch["txt_len"].view(-1),
+            )
+            model.zero_grad()
+            loss.backward()
+    finally:
+        for handle in handles:
+            handle.remove()
+    model.zero_grad()
+    return {name: score.cpu() for name, score in scores.items()}
+
+
+def keep_indices(scores: Dict[str, torch.Tensor], amount: float) -> Dict[str, torch.Tensor]:
+    """Sorted indices of the channels to keep when pruning ``amount`` of each layer"""
+    keep = {}
+    for name, score in scores.items():
+        count = max(1, int(round(score.numel() * (1 - amount))))
+        keep[name] = score.topk(count).indices.sort().values
+    return keep
+
+
+def prune_state_dict(state_dict: Dict[str, torch.Tensor], keep: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    """
+    Cut the pruned channels out of a LipCoordNet state dict
+
+    Args:
+        state_dict: Released, distilled or already pruned checkpoint
+        keep: Layer name -> indices of the output channels to keep
+
+    Returns:
+        A new state dict; layers not touched by pruning are shared with the input
+    """
+    pruned = dict(state_dict)
+    for i, name in enumerate(CONV_LAYERS):
+        idx = keep[name]
+        # Only a separable layer's final (temporal) conv loses outputs
+        _, last = _conv_prefixes(state_dict, name)
+        pruned[f"{last}.weight"] = pruned[f"{last}.weight"][idx].clone()
+        pruned[f"{last}.bias"] = pruned[f"{last}.bias"][idx].clone()
+        if i + 1 < len(CONV_LAYERS):
+            next_first, _ = _conv_prefixes(state_dict, CONV_LAYERS[i + 1])
+            pruned[f"{next_first}.weight"] = pruned[f"{next_first}.weight"][:, idx].clone()
+
+    columns = (keep["conv3"][:, None] * GRU1_FEATURES_PER_CHANNEL + torch.arange(GRU1_FEATURES_PER_CHANNEL)).flatten()
+    for suffix in ("", "_reverse"):
+        key = f"gru1.weight_ih_l0{suffix}"
+        pruned[key] = pruned[key][:, columns].clone()
+    return pruned
+
+
+def model_flops(model: nn.Module, frames: int = 75) -> int:
+    """Floating point operations (2 per multiply-accumulate) for one clip of ``frames`` frames"""
+    flops = [0]
+
+    def conv_hook(module, inputs, output):
+        per_output = module.in_channels // module.groups
+        for k in module.kernel_size:
+            per_output *= k
+        flops[0] += 2 * output.numel() * per_output
+
+    def gru_hook(module, inputs, output):
+        steps, batch = inputs[0].shape[:2]
+        directions = 2 if module.bidirectional else 1
+        gates = 3 * module.hidden_size
+        flops[0] += 2 * steps * batch * directions * gates * (module.input_size + module.hidden_size)
+
+    def linear_hook(module, inputs, output):
+        flops[0] += 2 * output.numel() * module.in_features
+
+    hooks = {nn.Conv3d: conv_hook, nn.GRU: gru_hook, nn.Linear: linear_hook}
+    handles = [m.register_forward_hook(hooks[type(m)]) for m in model.modules() if type(m) in hooks]
+    try:
+        with torch.no_grad():
+            model(torch.rand(1, 3, frames, 64, 128), torch.rand(1, frames, 20, 2))
+    finally:
+        for handle in handles:
+            handle.remove()
+    return flops[0]
+
+
+def train_loader(args):
+    """Shuffled DataLoader over the training list"""
+    from torch.utils.data import DataLoader
+    from dataset import MyDataset
+
+    dataset = MyDataset(
+        args.video_path,
+        args.anno_path,
+        args.coords_path,
+        args.train_list,
+        args.vid_padding,
+        args.txt_padding,
+        "train",
+    )
+    return DataLoader(dataset, batch_size=args.batch_size, shuffle=True, num_workers=args.num_workers, drop_last=True)
+
+
+def finetune(model: LipCoordNet, loader, steps: int, lr: float, device: str) -> LipCoordNet:
+    """Recover accuracy after pruning with a short CTC fine-tune"""
+    model = model.to(device).train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr, amsgrad=True)
+    crit = nn.CTCLoss()
+    step = 0
+    while step < steps:
+        for batch in loader:
+            optimizer.zero_grad()
+            y = model(batch["vid"].to(device), batch["coord"].to(device), batch["vid_len"])
+            loss = crit(
+                y.transpose(0, 1).log_softmax(-1),
+                batch["txt"].to(device),
+                batch["vid_len"].view(-1),
+                batch["txt_len"].view(-1),
+            )
+            loss.backward()
+            optimizer.step()
+            step += 1
+            if step % 100 == 0:
+                logger.info(f"  step {step}/{steps} loss={loss.item():.4f}")
+            if step >= steps:
+                break
+    return model.cpu()
+
+
+def pruned_path(weights_path: str, amount: float) -> str:
+    return f"{os.path.splitext(weights_path)[0]}.pruned{int(round(amount * 100))}.pt"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prune Conv3d channels from LipCoordNet and report the cost/accuracy trade-off")
+    parser.add_argument("--weights", type=str, default=Config.WEIGHTS_PATH, help="checkpoint to prune")
+    parser.add_argument("--video_path", type=str, required=True, help="root of the GRID frame folders")
+    parser.add_argument("--anno_path", type=str, required=True, help="root of the GRID alignments")
+    parser.add_argument("--coords_path", type=str, required=True, help="root of the lip coordinate json files")
+    parser.add_argument("--train_list", type=str, default="data/coords_train.txt")
+    parser.add_argument("--val_list", type=str, default="data/coords_val.txt")
+    parser.add_argument("--vid_padding", type=int, default=75)
+    parser.add_argument("--txt_padding", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--num_workers", type=int, default=4)
+    parser.add_argument("--levels", type=float, nargs="+", default=[0.25, 0.5, 0.75], help="fraction of each conv layer's channels to remove")
+    parser.add_argument("--score_clips", type=int, default=256, help="validation clips used to rank channels")
+    parser.add_argument("--limit", type=int, default=500, help="validation clips to evaluate (0 = all)")
+    parser.add_argument("--finetune_steps", type=int, default=1000, help="fine-tuning steps per level (0 = none)")
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--report", type=str, default="prune_report.json")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logger.error(f"❌ Weights file not found: {args.weights}")
+        return 1
+    if any(not 0 < level < 1 for level in args.levels):
+        logger.error(f"❌ Pruning levels must be between 0 and 1: {args.levels}")
+        return 1
+
+    state_dict = load_weights(args.weights)
+    base = LipCoordNet(**architecture_from_state_dict(state_dict))
+    base.load_state_dict(state_dict)
+
+    logger.info(f"📊 Ranking channels on {args.score_clips} validation clips...")
+    scores = channel_importance(base, validation_loader(args, args.score_clips), args.device)
+    base = prepare_for_inference(base.cpu())
+
+    loader = validation_loader(args, args.limit)
+    training = train_loader(args) if args.finetune_steps else None
+    rows: List[Dict] = []
+
+    def record(level: float, model: LipCoordNet, path: Optional[str]) -> None:
+        metrics = evaluate(model, loader)
+        rows.append(dict(
+            level=level,
+            path=path,
+            conv_channels=list(model.conv_channels),
+            params=sum(p.numel() for p in model.parameters()),
+            gflops=model_flops(model) / 1e9,
+            **metrics,
+        ))
+
+    logger.info("🔍 Evaluating unpruned checkpoint...")
+    record(0.0, base, args.weights)
+
+    for level in args.levels:
+        pruned_state = prune_state_dict(state_dict, keep_indices(scores, level))
+        model = LipCoordNet(**architecture_from_state_dict(pruned_state))
+        model.load_state_dict(pruned_state)
+        logger.info(f"✂️ Level {level:.2f}: conv channels {base.conv_channels} -> {model.conv_channels}")
+        if training is not None:
+            model = finetune(model, training, args.finetune_steps, args.lr, args.device)
+        output = pruned_path(args.weights, level)
+        torch.save(model.state_dict(), output)
+        save_safetensors(model.state_dict(), safetensors_path(output))
+        logger.info(f"📦 Saved {output}")
+        record(level, prepare_for_inference(model), output)
+
+    baseline = rows[0]
+    for row in rows:
+        row["wer_delta"] = row["wer"] - baseline["wer"]
+        row["speedup"] = baseline["latency_ms_per_clip"] / row["latency_ms_per_clip"]
+    with open(args.report, "w") as f:
+        json.dump({"weights": args.weights, "finetune_steps": args.finetune_steps, "levels": rows}, f, indent=2)
+
+    logger.info(f"{'level':<8}{'channels':>16}{'GFLOPs':>10}{'ms/clip':>10}{'speedup':>10}{'WER':>10}{'CER':>10}")
+    for row in rows:
+        channels = "/".join(str(c) for c in row["conv_channels"])
+        logger.info(
+            f"{row['level']:<8.2f}{channels:>16}{row['gflops']:>10.2f}{row['latency_ms_per_clip']:>10.1f}"
+            f"{row['speedup']:>10.2f}{row['wer']:>10.4f}{row['cer']:>10.4f}"
+        )
+    logger.info(f"📝 Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Post-Training Quantization
+==========================
+
+Builds an int8 serving variant of LipCoordNet. The three bidirectional
+GRUs and the FC head are quantized dynamically (int8 weights, activations
+quantized on the fly); the Conv3d front end can optionally be quantized
+statically using activation ranges calibrated on validation clips.
+
+The command also evaluates the fp32 checkpoint and the quantized model on
+the same validation subset and writes a WER/CER/latency regression report.
+
+Usage:
+    python quantize.py --video_path <GRID_imgs> --anno_path <GRID_align> --coords_path <coords>
+    python quantize.py ... --static_conv --limit 500 --report quantize_report.json
+
+Serve the result with ``MODEL_BACKEND=int8``.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Optional
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import DeQuantStub, QuantStub, convert, get_default_qconfig, prepare, quantize_dynamic
+
+from checkpoints import load_weights
+from model import LipCoordNet, architecture_from_state_dict, prepare_for_inference
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger("quantize")
+
+# Layers covered by dynamic quantization: gru1, gru2, coord_gru and FC
+DYNAMIC_LAYERS = {nn.GRU, nn.Linear}
+
+
+def _quantized_engine() -> str:
+    """Pick the quantized kernel backend available on this CPU"""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    return engines[0]
+
+
+def _wrap_conv_stack(model: LipCoordNet) -> LipCoordNet:
+    """Insert quant/dequant stubs around the conv1..pool3 front end"""
+    model.conv1 = nn.Sequential(QuantStub(), model.conv1)
+    model.pool3 = nn.Sequential(model.pool3, DeQuantStub())
+    return model
+
+
+def quantize_model(
+    model: LipCoordNet,
+    static_conv: bool = False,
+    calibration: Optional[Iterable] = None,
+) -> LipCoordNet:
+    """
+    Quantize an fp32 model in place
+
+    Args:
+        model: Inference-ready fp32 model (see ``prepare_for_inference``)
+        static_conv: Also statically quantize the Conv3d stack
+        calibration: Iterable of (video, coords) batches, required with static_conv
+
+    Returns:
+        The quantized model
+    """
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+
+    if static_conv:
+        if calibration is None:
+            raise ValueError("Static conv quantization needs calibration data")
+        _wrap_conv_stack(model)
+        qconfig = get_default_qconfig(engine)
+        for name in ("conv1", "conv2", "conv3", "pool3"):
+            getattr(model, name).qconfig = qconfig
+        prepare(model, inplace=True)
+        with torch.no_grad():
+            for video, coords in calibration:
+                model(video, coords)
+        convert(model, inplace=True)
+
+    return quantize_dynamic(model, DYNAMIC_LAYERS, dtype=torch.qint8)
+
+
+def save_quantized_model(model: LipCoordNet, path: str, static_conv: bool, architecture: Optional[Dict] = None) -> None:
+    """
+    Save the quantized weights together with the layout needed to rebuild them
+
+    Args:
+        model: Quantized model from ``quantize_model``
+        path: Output file
+        static_conv: Whether the Conv3d stack was statically quantized
+        architecture: LipCoordNet constructor arguments of the fp32 checkpoint
+            (``architecture_from_state_dict``); None for the released layout
+    """
+    torch.save({"static_conv": static_conv, "architecture": architecture or {}, "state_dict": model.state_dict()}, path)
+
+
+def load_quantized_model(path: str) -> LipCoordNet:
+    """Rebuild the quantized module layout and load an artifact from ``save_quantized_model``"""
+    # Packed int8 params are not plain tensors, so weights_only loading cannot be used;
+    # only load artifacts produced locally by this script.
+    artifact = torch.load(path, map_location="cpu", weights_only=False)
+    # Artifacts saved before the layout was recorded use the released widths
+    model = prepare_for_inference(LipCoordNet(**artifact.get("architecture", {})))
+    torch.backends.quantized.engine = _quantized_engine()
+    if artifact["static_conv"]:
+        # Calibrate on a dummy batch only to materialize quantized modules;
+        # their scales and zero points are overwritten by the state dict.
+        model = quantize_model(model, static_conv=True, calibration=[(torch.rand(1, 3, 3, 64, 128), torch.rand(1, 3, 20, 2))])
+    else:
+        model = quantize_model(model)
+    model.load_state_dict(artifact["state_dict"])
+    return model.eval()
+
+
+def model_size_mb(model: nn.Module) -> float:
+    """Serialized size of a model's state dict"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1e6
+
+
+def validation_loader(args, limit: Optional[int] = None):
+    """DataLoader over the validation list, optionally truncated to ``limit`` clips"""
+    from torch.utils.data import DataLoader, Subset
+    from dataset import MyDataset
+
+    dataset = MyDataset(
+        args.video_path,
+        args.anno_path,
+        args.coords_path,
+        args.val_list,
+        args.vid_padding,
+        args.txt_padding,
+        "test",
+    )
+    if limit:
+        dataset = Subset(dataset, range(min(limit, len(dataset))))
+    return DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.num_workers)
+
+
+def evaluate(model: nn.Module, loader) -> Dict[str, float]:
+    """WER, CER and per-clip CPU latency of a model over a loader"""
+    from dataset import MyDataset
+
+    wer, cer, elapsed, clips = [], [], 0.0, 0
+    with torch.no_grad():
+        for batch in loader:
+            vid, coord, txt = batch["vid"], batch["coord"], batch["txt"]
+            start = time.perf_counter()
+            y = model(vid, coord)
+            elapsed += time.perf_counter() - start
+            clips += vid.size(0)
+            pred = y.argmax(-1)
+            pred_txt = [MyDataset.ctc_arr2txt(pred[i], start=1) for i in range(pred.size(0))]
+            truth_txt = [MyDataset.arr2txt(txt[i], start=1) for i in range(txt.size(0))]
+            wer.extend(MyDataset.wer(pred_txt, truth_txt))
+            cer.extend(MyDataset.cer(pred_txt, truth_txt))
+    return {
+        "wer": sum(wer) / max(len(wer), 1),
+        "cer": sum(cer) / max(len(cer), 1),
+        "latency_ms_per_clip": 1000.0 * elapsed / max(clips, 1),
+        "clips": clips,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Quantize LipCoordNet to int8 and report the accuracy cost")
+    parser.add_argument("--weights", type=str, default=Config.WEIGHTS_PATH, help="fp32 .pt checkpoint")
+    parser.add_argument("--video_path", type=str, required=True, help="root of the GRID frame folders")
+    parser.add_argument("--anno_path", type=str, required=True, help="root of the GRID alignments")
+    parser.add_argument("--coords_path", type=str, required=True, help="root of the lip coordinate json files")
+    parser.add_argument("--val_list", type=str, default="data/coords_val.txt")
+    parser.add_argument("--vid_padding", type=int, default=75)
+    parser.add_argument("--txt_padding", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--num_workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=500, help="number of validation clips to evaluate (0 = all)")
+    parser.add_argument("--calibration_clips", type=int, default=64, help="clips used to calibrate static conv ranges")
+    parser.add_argument("--static_conv", action="store_true", help="also statically quantize the Conv3d stack")
+    parser.add_argument("--max_wer_increase", type=float, default=0.01, help="fail if WER regresses by more than this")
+    parser.add_argument("--output", type=str, default=None, help="output path (defaults to <weights>.int8.pt)")
+    parser.add_argument("--report", type=str, default="quantize_report.json")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logger.error(f"❌ Weights file not found: {args.weights}")
+        return 1
+    output = args.output or os.path.splitext(args.weights)[0] + ".int8.pt"
+    torch.set_grad_enabled(False)
+
+    state_dict = load_weights(args.weights)
+    # Pruned and distilled checkpoints are narrower than the default LipCoordNet
+    architecture = architecture_from_state_dict(state_dict)
+    fp32 = LipCoordNet(**architecture)
+    fp32.load_state_dict(state_dict)
+    prepare_for_inference(fp32)
+
+    calibration = None
+    if args.static_conv:
+        calibration_loader = validation_loader(args, args.calibration_clips)
+        calibration = [(batch["vid"], batch["coord"]) for batch in calibration_loader]
+        logger.info(f"🎯 Calibrating conv ranges on {args.calibration_clips} clips")
+
+    int8 = LipCoordNet(**architecture)
+    int8.load_state_dict(fp32.state_dict())
+    int8 = quantize_model(prepare_for_inference(int8), args.static_conv, calibration)
+    save_quantized_model(int8, output, args.static_conv, architecture)
+    logger.info(f"📦 Saved int8 model to {output}")
+
+    loader = validation_loader(args, args.limit)
+    logger.info("🔍 Evaluating fp32 checkpoint...")
+    baseline = evaluate(fp32, loader)
+    logger.info("🔍 Evaluating int8 model...")
+    quantized = evaluate(int8, loader)
+
+    report = {
+        "weights": args.weights,
+        "output": output,
+        "static_conv": args.static_conv,
+        "engine": torch.backends.quantized.engine,
+        "fp32": dict(baseline, size_mb=model_size_mb(fp32)),
+        "int8": dict(quantized, size_mb=model_size_mb(int8)),
+        "wer_delta": quantized["wer"] - baseline["wer"],
+        "cer_delta": quantized["cer"] - baseline["cer"],
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f"{'':<8}{'WER':>10}{'CER':>10}{'ms/clip':>10}{'MB':>10}")
+    for name in ("fp32", "int8"):
+        r = report[name]
+        logger.info(f"{name:<8}{r['wer']:>10.4f}{r['cer']:>10.4f}{r['latency_ms_per_clip']:>10.1f}{r['size_mb']:>10.1f}")
+    logger.info(f"📝 Report written to {args.report}")
+
+    if report["wer_delta"] > args.max_wer_increase:
+        logger.error(f"❌ WER regressed by {report['wer_delta']:.4f} (limit {args.max_wer_increase})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
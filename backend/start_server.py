@@ -7,6 +7,7 @@ Enhanced startup script for the lipreading backend service.
 Includes dependency checking, environment validation, and graceful startup.
 """
 
+import argparse
 import os
 import sys
 import subprocess
@@ -25,7 +26,8 @@ logger = setup_logger("startup")
 class ServerManager:
     """Manages server startup, validation, and shutdown"""
     
-    def __init__(self):
+    def __init__(self, dev: bool = False):
+        self.dev = dev
         self.server_process = None
         self.setup_signal_handlers()
     
@@ -113,7 +115,7 @@ class ServerManager:
     def create_directories(self) -> None:
         """Create necessary directories"""
         directories = [
-            "static", "uploads", "outputs", "temp", 
+            "static", "uploads", Config.OUTPUT_DIR, "temp", 
             "pretrain", "samples", "logs"
         ]
         
@@ -146,14 +148,7 @@ class ServerManager:
             logger.info(f"   API documentation: {Config.BASE_URL}/docs")
             
             # Start server
-            cmd = [
-                sys.executable, "-m", "uvicorn",
-                "api:app",
-                "--host", Config.HOST,
-                "--port", str(Config.PORT),
-                "--reload",
-                "--log-level", Config.LOG_LEVEL.lower()
-            ]
+            cmd = self.server_command()
             
             logger.info(f"   Command: {' '.join(cmd)}")
             
@@ -176,6 +171,30 @@ class ServerManager:
         except Exception as e:
             logger.error(f"❌ Failed to start server: {e}")
     
+    def server_command(self) -> list:
+        """Auto-reloading uvicorn for development, pre-fork gunicorn for production"""
+        if self.dev:
+            return [
+                sys.executable, "-m", "uvicorn",
+                "api:app",
+                "--host", Config.HOST,
+                "--port", str(Config.PORT),
+                "--reload",
+                "--log-level", Config.LOG_LEVEL.lower()
+            ]
+        if os.name == "posix":
+            return [sys.executable, "-m", "gunicorn", "api:app", "-c", "gunicorn.conf.py"]
+        # gunicorn needs fork(); uvicorn's workers each load their own model copy
+        logger.warning("⚠️ Pre-fork serving is not available on this platform; using uvicorn workers")
+        return [
+            sys.executable, "-m", "uvicorn",
+            "api:app",
+            "--host", Config.HOST,
+            "--port", str(Config.PORT),
+            "--workers", str(Config.default_server_workers()),
+            "--log-level", Config.LOG_LEVEL.lower()
+        ]
+    
     def shutdown(self) -> None:
         """Gracefully shutdown the server"""
         if self.server_process and self.server_process.poll() is None:
@@ -218,8 +237,11 @@ class ServerManager:
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Start the lipreading backend")
+    parser.add_argument("--dev", action="store_true", help="single process with auto-reload")
+    args = parser.parse_args()
     try:
-        server_manager = ServerManager()
+        server_manager = ServerManager(dev=args.dev)
         server_manager.run()
     except Exception as e:
         logger.error(f"❌ Fatal error: {e}")
@@ -0,0 +1,253 @@
+"""
+Output Storage
+==============
+
+Managed storage for generated audio/video files. Artifacts are kept in a
+pluggable backend (a local directory by default) and tracked in a small
+SQLite index with their size, ETag and last access time. A background
+sweeper expires artifacts past their TTL and evicts the least recently
+used ones whenever the store grows beyond its size quota, so ``outputs/``
+cannot fill the disk.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger("storage")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts (accessed_at);
+"""
+
+
+class LocalOutputBackend:
+    """Artifacts stored as files in a local directory"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, os.path.basename(name))
+
+    def stat(self, name: str) -> Optional[Tuple[int, float]]:
+        """(size, mtime) of an artifact, or None if it does not exist"""
+        try:
+            st = os.stat(self.path(name))
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def list(self) -> Iterator[Tuple[str, int, float]]:
+        """(name, size, mtime) of every artifact; dot-files (index, pending renders) are skipped"""
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                yield entry.name, st.st_size, st.st_mtime
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+
+OUTPUT_BACKENDS = {
+    LocalOutputBackend.name: LocalOutputBackend,
+}
+
+
+def make_etag(size: int, mtime: float) -> str:
+    return f'"{size:x}-{int(mtime * 1e6):x}"'
+
+
+class OutputStore:
+    """
+    Index and eviction policy on top of an output backend
+
+    Args:
+        backend: Where artifact bytes live
+        index_path: SQLite index file (shared by every API worker process)
+        ttl_seconds: Artifacts older than this are deleted (0 disables)
+        max_bytes: Size quota; least recently used artifacts are evicted above it (0 disables)
+    """
+
+    def __init__(self, backend, index_path: str = None, ttl_seconds: int = None, max_bytes: int = None):
+        self.backend = backend
+        self.index_path = index_path or Config.OUTPUT_INDEX_PATH
+        self.ttl_seconds = Config.OUTPUT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_bytes = Config.OUTPUT_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, name: str) -> Optional[Dict]:
+        """Index an artifact written to the backend; returns its entry or None if missing"""
+        st = self.backend.stat(name)
+        if st is None:
+            return None
+        size, mtime = st
+        now = time.time()
+        entry = {"name": name, "size": size, "etag": make_etag(size, mtime), "created_at": mtime, "accessed_at": now}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO artifacts (name, size, etag, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET size = excluded.size, etag = excluded.etag,"
+                " created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                (name, size, entry["etag"], mtime, now),
+            )
+        return entry
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """Entry for a servable artifact, marking it as recently used"""
+        st = self.backend.stat(name)
+        if st is None:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM artifacts WHERE name = ?", (name,)).fetchone()
+            if row is not None and row["etag"] == make_etag(*st):
+                conn.execute("UPDATE artifacts SET accessed_at = ? WHERE name = ?", (time.time(), name))
+                return dict(row)
+        # Written outside the store (or rewritten since indexed)
+        return self.record(name)
+
+    def reconcile(self) -> None:
+        """Bring the index in line with the backend contents"""
+        present = {}
+        for name, size, mtime in self.backend.list():
+            present[name] = make_etag(size, mtime)
+        with self._connect() as conn:
+            indexed = {row["name"]: row["etag"] for row in conn.execute("SELECT name, etag FROM artifacts")}
+            gone = [name for name in indexed if name not in present]
+            conn.executemany("DELETE FROM artifacts WHERE name = ?", [(name,) for name in gone])
+        for name, etag in present.items():
+            if indexed.get(name) != etag:
+                self.record(name)
+
+    def evict(self, now: float = None) -> Tuple[int, int]:
+        """
+        Apply the TTL and the size quota
+
+        Returns:
+            (artifacts deleted, bytes freed)
+        """
+        now = now or time.time()
+        victims: List[sqlite3.Row] = []
+        with self._connect() as conn:
+            if self.ttl_seconds:
+                victims.extend(conn.execute(
+                    "SELECT name, size FROM artifacts WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).fetchall())
+            if self.max_bytes:
+                expired = {row["name"] for row in victims}
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+                total -= sum(row["size"] for row in victims)
+                for row in conn.execute("SELECT name, size FROM artifacts ORDER BY accessed_at"):
+                    if total <= self.max_bytes:
+                        break
+                    if row["name"] in expired:
+                        continue
+                    victims.append(row)
+                    total -= row["size"]
+        for row in victims:
+            self.delete(row["name"])
+        return len(victims), sum(row["size"] for row in victims)
+
+    def delete(self, name: str) -> None:
+        self.backend.delete(name)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM artifacts WHERE name = ?", (name,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return {"artifacts": count, "bytes": total, "max_bytes": self.max_bytes, "ttl_seconds": self.ttl_seconds}
+
+
+class OutputSweeper:
+    """Background thread that periodically reconciles and evicts an output store"""
+
+    def __init__(self, store: OutputStore, interval: float = None, hooks: List[Callable[[], None]] = None):
+        self.store = store
+        self.interval = interval or Config.OUTPUT_SWEEP_SECONDS
+        self.hooks = hooks or []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> None:
+        try:
+            self.store.reconcile()
+            deleted, freed = self.store.evict()
+            if deleted:
+                logger.info(f"🧹 Evicted {deleted} output(s), freed {freed / 1e6:.1f} MB")
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Output sweep failed: {e}")
+        for hook in self.hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"Output sweep hook failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="output-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sweep()
+            self._stop.wait(self.interval)
+
+
+_output_store = None
+_output_store_lock = threading.Lock()
+
+
+def get_output_store() -> OutputStore:
+    """Process-wide output store for Config.OUTPUT_BACKEND"""
+    global _output_store
+    with _output_store_lock:
+        if _output_store is None:
+            if Config.OUTPUT_BACKEND not in OUTPUT_BACKENDS:
+                raise ValueError(
+                    f"Unknown output backend '{Config.OUTPUT_BACKEND}', expected one of {sorted(OUTPUT_BACKENDS)}"
+                )
+            backend = OUTPUT_BACKENDS[Config.OUTPUT_BACKEND](Config.OUTPUT_DIR)
+            _output_store = OutputStore(backend)
+    return _output_store
@@ -0,0 +1,80 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("cv2")
+pytest.importorskip("dlib")
+
+from inference import ctc_greedy_text, predict_chunked
+from model import LipCoordNet, prepare_for_inference
+from utils.config import Config
+
+
+class Recorder:
+    """Runtime stand-in that records what reaches the recurrent head"""
+
+    def __init__(self, model):
+        self.model = model
+        self.heads = []
+
+    def frontend(self, video):
+        with torch.no_grad():
+            return self.model.frontend(video)
+
+    def head(self, features, coords):
+        self.heads.append(features)
+        with torch.no_grad():
+            return self.model.head(features, coords)
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return prepare_for_inference(LipCoordNet(conv_channels=(8, 16, 24), gru_hidden_dim=32, coord_hidden_dim=16))
+
+
+def split(video, coords, size):
+    return [(video[:, i:i + size], coords[i:i + size]) for i in range(0, video.size(1), size)]
+
+
+@pytest.mark.parametrize("chunk", [1, 4, 7, 40])
+def test_stitched_features_match_full_forward(model, chunk):
+    torch.manual_seed(1)
+    video, coords = torch.rand(3, 40, 64, 128), torch.rand(40, 20, 2)
+    runtime = Recorder(model)
+
+    text = predict_chunked(runtime, split(video, coords, chunk))
+
+    with torch.no_grad():
+        full_features = model.frontend(video.unsqueeze(0))
+        full = model(video.unsqueeze(0), coords.unsqueeze(0))
+    assert torch.allclose(runtime.heads[-1], full_features, atol=1e-5)
+    assert text == ctc_greedy_text(full[0])
+
+
+def test_partials_decode_a_bounded_window(model, monkeypatch):
+    monkeypatch.setattr(Config, "PARTIAL_WINDOW_FRAMES", 10)
+    torch.manual_seed(2)
+    video, coords = torch.rand(3, 60, 64, 128), torch.rand(60, 20, 2)
+    runtime = Recorder(model)
+    partials = []
+
+    predict_chunked(runtime, split(video, coords, 5), on_partial=partials.append)
+
+    assert len(partials) == len(runtime.heads) - 1
+    # every provisional head pass is at most the window plus one chunk
+    assert max(features.size(0) for features in runtime.heads[:-1]) <= 10 + 5
+
+
+def test_partials_match_full_decode_when_window_covers_clip(model, monkeypatch):
+    monkeypatch.setattr(Config, "PARTIAL_WINDOW_FRAMES", 1000)
+    torch.manual_seed(3)
+    video, coords = torch.rand(3, 30, 64, 128), torch.rand(30, 20, 2)
+    runtime = Recorder(model)
+    partials = []
+
+    predict_chunked(runtime, split(video, coords, 10), on_partial=partials.append)
+
+    seen = runtime.heads[-1][: runtime.heads[-2].size(0)]
+    with torch.no_grad():
+        expected = model.head(seen, coords[: seen.size(0)].unsqueeze(0))
+    assert partials[-1] == ctc_greedy_text(expected[0])
@@ -0,0 +1,39 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("cv2")
+pytest.importorskip("dlib")
+
+from export import check_parity, export_onnx, export_torchscript
+from inference import artifact_path
+from model import LipCoordNet, prepare_for_inference
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    """A small random-weight model saved where export.py expects a checkpoint"""
+    torch.manual_seed(0)
+    model = prepare_for_inference(LipCoordNet(conv_channels=(8, 16, 24), gru_hidden_dim=32, coord_hidden_dim=16))
+    weights_path = str(tmp_path / "random.pt")
+    torch.save(model.state_dict(), weights_path)
+    return model, weights_path
+
+
+def test_torchscript_matches_eager(checkpoint):
+    model, weights_path = checkpoint
+    export_torchscript(model, artifact_path(weights_path, "torchscript"))
+
+    worst = check_parity(model, weights_path, ["torchscript"], atol=1e-4)
+
+    assert worst["torchscript"] <= 1e-4
+
+
+def test_onnx_matches_eager(checkpoint):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    model, weights_path = checkpoint
+    export_onnx(model, artifact_path(weights_path, "onnx"))
+
+    worst = check_parity(model, weights_path, ["onnx"], atol=1e-4)
+
+    assert worst["onnx"] <= 1e-4
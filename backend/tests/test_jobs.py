@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobStore, JobWorker, send_callback, validate_callback_url
+
+
+def make_store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def make_input(tmp_path, name="clip.mp4"):
+    path = tmp_path / name
+    path.write_bytes(b"video")
+    return str(path)
+
+
+def test_claim_returns_oldest_queued_job_once(tmp_path):
+    store = make_store(tmp_path)
+    first = store.submit("a.mp4", "a.mp4")
+    time.sleep(0.01)
+    second = store.submit("b.mp4", "b.mp4")
+
+    job = store.claim()
+    assert job["id"] == first
+    assert job["attempts"] == 1
+    assert job["lease_token"]
+    assert store.get(first)["status"] == RUNNING
+
+    assert store.claim()["id"] == second
+    assert store.claim() is None
+
+
+def test_concurrent_claims_never_share_a_job(tmp_path):
+    store = make_store(tmp_path)
+    for i in range(20):
+        store.submit(f"{i}.mp4", f"{i}.mp4")
+    claimed, lock = [], threading.Lock()
+
+    def drain():
+        while True:
+            job = store.claim()
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=drain) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 20
+    assert len(set(claimed)) == 20
+
+
+def test_recover_requeues_only_expired_leases(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.submit("a.mp4", "a.mp4")
+    job = store.claim()
+
+    assert store.recover(lease_seconds=60, max_attempts=3) == 0
+    time.sleep(0.05)
+    assert store.recover(lease_seconds=0.01, max_attempts=3) == 1
+
+    requeued = store.get(job_id)
+    assert requeued["status"] == QUEUED
+    assert requeued["lease_token"] is None
+    assert not store.heartbeat(job_id, job["lease_token"])
+
+
+def test_recover_fails_jobs_out_of_attempts(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.submit("a.mp4", "a.mp4")
+    store.claim()
+    time.sleep(0.05)
+
+    assert store.recover(lease_seconds=0.01, max_attempts=1) == 0
+    assert store.get(job_id)["status"] == FAILED
+
+
+def test_heartbeat_keeps_a_long_job_leased(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.submit("a.mp4", "a.mp4")
+    job = store.claim()
+    for _ in range(3):
+        time.sleep(0.03)
+        assert store.heartbeat(job_id, job["lease_token"])
+        assert store.recover(lease_seconds=0.05, max_attempts=3) == 0
+    assert store.get(job_id)["status"] == RUNNING
+
+
+def test_stale_owner_cannot_complete_after_takeover(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.submit("a.mp4", "a.mp4")
+    stale = store.claim()
+    time.sleep(0.05)
+    store.recover(lease_seconds=0.01, max_attempts=3)
+    current = store.claim()
+
+    assert not store.complete(job_id, {"prediction": "stale"}, stale["lease_token"])
+    assert store.complete(job_id, {"prediction": "fresh"}, current["lease_token"])
+    job = store.get(job_id)
+    assert job["status"] == DONE
+    assert job["result"] == {"prediction": "fresh"}
+
+
+def test_worker_heartbeats_and_removes_input_when_done(tmp_path):
+    store = make_store(tmp_path)
+    input_path = make_input(tmp_path)
+    job_id = store.submit(input_path, "clip.mp4")
+
+    def handler(job_id, video_path, filename):
+        time.sleep(0.2)
+        # the lease is far shorter than the job; heartbeats keep it alive
+        assert store.recover(lease_seconds=0.1, max_attempts=3) == 0
+        return {"prediction": "BIN BLUE"}
+
+    worker = JobWorker(store, handler, workers=1, heartbeat_interval=0.02)
+    assert worker._run_job(store.claim())
+    assert store.get(job_id)["status"] == DONE
+    assert not os.path.exists(input_path)
+
+
+def test_worker_keeps_input_when_lease_was_taken_over(tmp_path):
+    store = make_store(tmp_path)
+    input_path = make_input(tmp_path)
+    job_id = store.submit(input_path, "clip.mp4")
+
+    def handler(job_id, video_path, filename):
+        # another process declares this run dead and claims the job
+        store.recover(lease_seconds=-1, max_attempts=3)
+        store.claim()
+        return {"prediction": "stale"}
+
+    worker = JobWorker(store, handler, workers=1, heartbeat_interval=60)
+    assert not worker._run_job(store.claim())
+    assert store.get(job_id)["status"] == RUNNING
+    assert os.path.exists(input_path)
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/admin",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://[::1]/hook",
+    "ftp://93.184.216.34/hook",
+    "file:///etc/passwd",
+])
+def test_callback_urls_into_the_server_network_are_refused(url):
+    with pytest.raises(ValueError):
+        validate_callback_url(url)
+
+
+def test_public_callback_url_is_accepted():
+    assert validate_callback_url("https://93.184.216.34/hook") == "https://93.184.216.34/hook"
+
+
+def test_refused_callback_is_never_sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(jobs.requests, "post", lambda *args, **kwargs: sent.append(args))
+    job = {"id": "job", "status": DONE, "created_at": 0, "updated_at": 0, "result": "{}",
+           "callback_url": "http://169.254.169.254/latest/meta-data/"}
+
+    send_callback(job)
+    assert sent == []
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+np = pytest.importorskip("numpy")
+dlib = pytest.importorskip("dlib")
+
+from landmarks import LandmarkService, find_predictor_path
+
+
+@pytest.fixture(scope="module")
+def service():
+    try:
+        return LandmarkService(find_predictor_path()).load()
+    except FileNotFoundError:
+        pytest.skip("dlib shape predictor file not available")
+
+
+def landmarks(service, image):
+    _, predictor = service.models()
+    shape = predictor(image, dlib.rectangle(150, 100, 450, 400))
+    return [(shape.part(n).x, shape.part(n).y) for n in range(68)]
+
+
+def test_threads_get_their_own_detector_and_share_the_predictor(service):
+    barrier = threading.Barrier(4)
+
+    def models(_):
+        barrier.wait()  # keeps all four tasks on distinct threads
+        return service.models()
+
+    with ThreadPoolExecutor(4) as pool:
+        pairs = list(pool.map(models, range(4)))
+    assert len({id(detector) for detector, _ in pairs}) == 4
+    assert all(predictor is service.predictor for _, predictor in pairs)
+
+
+def test_concurrent_extraction_matches_sequential(service):
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (500, 600), dtype=np.uint8) for _ in range(32)]
+    expected = [landmarks(service, image) for image in images]
+
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(3):
+            assert list(pool.map(lambda image: landmarks(service, image), images)) == expected
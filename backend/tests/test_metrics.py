@@ -0,0 +1,107 @@
+import itertools
+
+import pytest
+
+from utils.metrics import Counter, Gauge, Histogram, render_metrics
+
+# Metrics register themselves globally, so every test needs fresh names
+_ids = itertools.count()
+
+
+def unique(name):
+    return f"test_{name}_{next(_ids)}"
+
+
+def test_counter_renders_help_type_and_samples():
+    name = unique("requests_total")
+    counter = Counter(name, "Requests handled", ["route"])
+    counter.inc(route="/predict")
+    counter.inc(2, route="/predict")
+    counter.inc(0.5, route="/health")
+
+    assert counter.render().splitlines() == [
+        f"# HELP {name} Requests handled",
+        f"# TYPE {name} counter",
+        f'{name}{{route="/health"}} 0.5',
+        f'{name}{{route="/predict"}} 3',
+    ]
+    assert counter.value(route="/predict") == 3
+
+
+def test_unlabelled_metrics_render_zero_before_first_update():
+    counter = Counter(unique("frames_total"), "Frames")
+    gauge = Gauge(unique("in_flight"), "In flight")
+
+    assert counter.render().splitlines()[-1] == f"{counter.name} 0"
+    assert gauge.render().splitlines()[-1] == f"{gauge.name} 0"
+
+
+def test_label_values_are_escaped():
+    counter = Counter(unique("errors_total"), "Errors", ["detail"])
+    counter.inc(detail='bad "path"\\x\nnext')
+
+    assert counter.render().splitlines()[-1] == f'{counter.name}{{detail="bad \\"path\\"\\\\x\\nnext"}} 1'
+
+
+def test_wrong_labels_and_duplicate_names_are_rejected():
+    counter = Counter(unique("jobs_total"), "Jobs", ["status"])
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.inc(status="done", queue="jobs")
+    with pytest.raises(ValueError):
+        Counter(counter.name, "Jobs again")
+
+
+def test_gauge_callback_is_read_at_render_time():
+    gauge = Gauge(unique("queue_depth"), "Queued items", ["queue"])
+    depth = {"jobs": 1}
+    gauge.set_function(lambda: {("jobs",): depth["jobs"]})
+
+    assert gauge.render().splitlines()[-1] == f'{gauge.name}{{queue="jobs"}} 1'
+    depth["jobs"] = 4
+    assert gauge.render().splitlines()[-1] == f'{gauge.name}{{queue="jobs"}} 4'
+
+
+def test_failing_gauge_callback_renders_no_samples():
+    gauge = Gauge(unique("broken"), "Broken callback")
+    gauge.set_function(lambda: 1 / 0)
+
+    assert gauge.render().splitlines() == [f"# HELP {gauge.name} Broken callback", f"# TYPE {gauge.name} gauge"]
+
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    name = unique("stage_seconds")
+    histogram = Histogram(name, "Stage time", ["stage"], buckets=(0.5, 0.1, 1))
+    for value in (0.05, 0.1, 0.3, 2):
+        histogram.observe(value, stage="tts")
+
+    assert histogram.render().splitlines()[2:] == [
+        f'{name}_bucket{{stage="tts",le="0.1"}} 2',
+        f'{name}_bucket{{stage="tts",le="0.5"}} 3',
+        f'{name}_bucket{{stage="tts",le="1"}} 3',
+        f'{name}_bucket{{stage="tts",le="+Inf"}} 4',
+        f'{name}_sum{{stage="tts"}} 2.45',
+        f'{name}_count{{stage="tts"}} 4',
+    ]
+    assert histogram.totals(stage="tts") == (4, pytest.approx(2.45))
+
+
+def test_histogram_time_observes_the_block():
+    histogram = Histogram(unique("block_seconds"), "Block time", buckets=(60,))
+    with histogram.time():
+        pass
+
+    count, total = histogram.totals()
+    assert count == 1
+    assert 0 <= total < 60
+
+
+def test_render_metrics_includes_every_registered_metric():
+    counter = Counter(unique("scraped_total"), "Scraped")
+    counter.inc()
+    text = render_metrics()
+
+    assert text.endswith("\n")
+    assert f"# TYPE {counter.name} counter\n{counter.name} 1\n" in text
+    assert "# TYPE lipreading_stage_seconds histogram" in text
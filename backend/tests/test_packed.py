@@ -0,0 +1,78 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from model import LipCoordNet, LipCoordOnlyNet, prepare_for_inference
+
+
+def small_model(**kwargs):
+    torch.manual_seed(0)
+    return prepare_for_inference(LipCoordNet(conv_channels=(8, 16, 24), gru_hidden_dim=32, coord_hidden_dim=16, **kwargs))
+
+
+def padded_batch(lengths):
+    torch.manual_seed(1)
+    frames = max(lengths)
+    clips = [(torch.rand(3, n, 64, 128), torch.rand(n, 20, 2)) for n in lengths]
+    video = torch.zeros(len(clips), 3, frames, 64, 128)
+    coords = torch.zeros(len(clips), frames, 20, 2)
+    for i, (v, c) in enumerate(clips):
+        video[i, :, : v.size(1)] = v
+        coords[i, : c.size(0)] = c
+    return clips, video, coords, torch.tensor(lengths)
+
+
+@pytest.mark.parametrize("separable", [False, True])
+def test_packed_batch_matches_each_clip_alone(separable):
+    model = small_model(separable=separable)
+    clips, video, coords, lengths = padded_batch([12, 7, 3])
+
+    with torch.no_grad():
+        batched = model(video, coords, lengths)
+        for i, (v, c) in enumerate(clips):
+            alone = model(v.unsqueeze(0), c.unsqueeze(0))[0]
+            assert torch.allclose(batched[i, : lengths[i]], alone, atol=1e-5)
+
+
+def test_full_lengths_match_unpacked_forward():
+    model = small_model()
+    _, video, coords, _ = padded_batch([9, 9])
+
+    with torch.no_grad():
+        packed = model(video, coords, torch.tensor([9, 9]))
+        plain = model(video, coords)
+
+    assert torch.allclose(packed, plain, atol=1e-5)
+
+
+def test_coord_only_model_packs_too():
+    torch.manual_seed(0)
+    model = prepare_for_inference(LipCoordOnlyNet(coord_hidden_dim=16))
+    clips, _, coords, lengths = padded_batch([10, 4])
+
+    with torch.no_grad():
+        batched = model(None, coords, lengths)
+        for i, (_, c) in enumerate(clips):
+            alone = model(None, c.unsqueeze(0))[0]
+            assert torch.allclose(batched[i, : lengths[i]], alone, atol=1e-5)
+
+
+def test_transcribe_batch_pads_mixed_lengths_for_eager():
+    pytest.importorskip("cv2")
+    pytest.importorskip("dlib")
+    from inference import TorchRuntime, ctc_greedy_text, transcribe_batch
+
+    class Eager(TorchRuntime):
+        supports_lengths = True
+
+        def __init__(self, model):
+            self.model = model
+
+    model = small_model()
+    clips, _, _, _ = padded_batch([12, 7, 3])
+
+    texts = transcribe_batch(Eager(model), clips)
+
+    with torch.no_grad():
+        expected = [ctc_greedy_text(model(v.unsqueeze(0), c.unsqueeze(0))[0]) for v, c in clips]
+    assert texts == expected
@@ -0,0 +1,80 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from model import LipCoordNet, architecture_from_state_dict, prepare_for_inference
+from prune import CONV_LAYERS, keep_indices, prune_state_dict
+from quantize import load_quantized_model, quantize_model, save_quantized_model
+
+
+def pruned_state_dict(amount=0.5):
+    """State dict of a randomly initialised LipCoordNet with ``amount`` of each conv layer cut"""
+    state_dict = LipCoordNet().state_dict()
+    scores = {name: torch.rand(state_dict[f"{name}.weight"].size(0)) for name in CONV_LAYERS}
+    return prune_state_dict(state_dict, keep_indices(scores, amount))
+
+
+def test_dynamic_int8_model_runs_forward():
+    torch.manual_seed(0)
+    model = quantize_model(prepare_for_inference(LipCoordNet()))
+    video = torch.rand(2, 3, 6, 64, 128)
+    coords = torch.rand(2, 6, 20, 2)
+
+    with torch.no_grad():
+        y = model(video, coords)
+
+    assert y.shape == (2, 6, 28)
+    assert torch.isfinite(y).all()
+
+
+def test_dynamic_int8_model_runs_frontend_and_head():
+    torch.manual_seed(0)
+    model = quantize_model(prepare_for_inference(LipCoordNet()))
+    video = torch.rand(1, 3, 6, 64, 128)
+    coords = torch.rand(1, 6, 20, 2)
+
+    with torch.no_grad():
+        y = model.head(model.frontend(video), coords)
+
+    assert y.shape == (1, 6, 28)
+
+
+def test_pruned_checkpoint_round_trips_through_the_int8_artifact(tmp_path):
+    torch.manual_seed(0)
+    state_dict = pruned_state_dict()
+    architecture = architecture_from_state_dict(state_dict)
+    assert architecture["conv_channels"] != architecture_from_state_dict(LipCoordNet().state_dict())["conv_channels"]
+    fp32 = LipCoordNet(**architecture)
+    fp32.load_state_dict(state_dict)
+    int8 = quantize_model(prepare_for_inference(fp32)).eval()
+    path = str(tmp_path / "pruned.int8.pt")
+
+    save_quantized_model(int8, path, static_conv=False, architecture=architecture)
+    loaded = load_quantized_model(path)
+
+    video = torch.rand(1, 3, 6, 64, 128)
+    coords = torch.rand(1, 6, 20, 2)
+    with torch.no_grad():
+        assert torch.allclose(loaded(video, coords), int8(video, coords))
+
+
+@pytest.mark.parametrize("separable", [False, True])
+def test_static_conv_model_survives_save_and_reload(tmp_path, separable):
+    torch.manual_seed(0)
+    architecture = {"conv_channels": (8, 16, 24), "gru_hidden_dim": 32, "coord_hidden_dim": 16, "separable": separable}
+    calibration = [(torch.rand(2, 3, 4, 64, 128), torch.rand(2, 4, 20, 2))]
+    int8 = quantize_model(prepare_for_inference(LipCoordNet(**architecture)), static_conv=True, calibration=calibration).eval()
+    path = str(tmp_path / "static.int8.pt")
+
+    save_quantized_model(int8, path, static_conv=True, architecture=architecture)
+    loaded = load_quantized_model(path)
+
+    video = torch.rand(1, 3, 6, 64, 128)
+    coords = torch.rand(1, 6, 20, 2)
+    with torch.no_grad():
+        features = loaded.frontend(video)
+        expected = int8.frontend(video)
+        assert not features.is_quantized
+        assert features.shape == (6, 1, 24 * 4 * 8)
+        assert torch.allclose(features, expected)
+        assert torch.allclose(loaded.head(features, coords), int8.head(expected, coords))
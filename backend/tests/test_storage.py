@@ -0,0 +1,91 @@
+import os
+import time
+
+from storage import LocalOutputBackend, OutputStore
+
+
+def make_store(tmp_path, ttl_seconds=0, max_bytes=0):
+    backend = LocalOutputBackend(str(tmp_path / "outputs"))
+    return OutputStore(backend, str(tmp_path / "outputs" / ".index.db"), ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+
+
+def write(store, name, size, mtime=None):
+    path = store.backend.path(name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    store.record(name)
+    time.sleep(0.01)
+    return path
+
+
+def test_evict_removes_artifacts_past_the_ttl(tmp_path):
+    store = make_store(tmp_path, ttl_seconds=3600)
+    now = time.time()
+    old = write(store, "old.mp4", 10, mtime=now - 7200)
+    fresh = write(store, "fresh.mp4", 20, mtime=now - 60)
+
+    assert store.evict(now) == (1, 10)
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh)
+    assert store.stats()["artifacts"] == 1
+
+
+def test_evict_drops_least_recently_used_until_under_quota(tmp_path):
+    store = make_store(tmp_path, max_bytes=250)
+    a = write(store, "a.mp4", 100)
+    b = write(store, "b.mp4", 100)
+    c = write(store, "c.mp4", 100)
+    # Serving "a" makes "b" the least recently used
+    assert store.lookup("a.mp4") is not None
+
+    assert store.evict() == (1, 100)
+    assert not os.path.exists(b)
+    assert os.path.exists(a) and os.path.exists(c)
+    assert store.stats()["bytes"] == 200
+
+
+def test_evict_does_not_double_count_expired_artifacts(tmp_path):
+    store = make_store(tmp_path, ttl_seconds=3600, max_bytes=150)
+    now = time.time()
+    write(store, "expired.mp4", 100, mtime=now - 7200)
+    write(store, "a.mp4", 100, mtime=now)
+    write(store, "b.mp4", 100, mtime=now)
+
+    # The TTL frees 100 bytes, so one LRU eviction reaches the quota
+    assert store.evict(now) == (2, 200)
+    assert [name for name, _, _ in store.backend.list()] == ["b.mp4"]
+    assert store.stats() == {"artifacts": 1, "bytes": 100, "max_bytes": 150, "ttl_seconds": 3600}
+
+
+def test_evict_is_a_no_op_when_disabled(tmp_path):
+    store = make_store(tmp_path)
+    write(store, "old.mp4", 10, mtime=time.time() - 10 ** 6)
+
+    assert store.evict() == (0, 0)
+    assert store.stats()["artifacts"] == 1
+
+
+def test_reconcile_indexes_new_files_and_forgets_deleted_ones(tmp_path):
+    store = make_store(tmp_path)
+    gone = write(store, "gone.mp4", 10)
+    os.remove(gone)
+    with open(store.backend.path("new.mp4"), "wb") as f:
+        f.write(b"x" * 30)
+
+    store.reconcile()
+    assert store.stats()["artifacts"] == 1
+    assert store.stats()["bytes"] == 30
+
+
+def test_lookup_reindexes_a_rewritten_artifact(tmp_path):
+    store = make_store(tmp_path)
+    path = write(store, "clip.mp4", 10, mtime=time.time() - 60)
+    etag = store.lookup("clip.mp4")["etag"]
+    with open(path, "wb") as f:
+        f.write(b"x" * 40)
+
+    entry = store.lookup("clip.mp4")
+    assert entry["size"] == 40
+    assert entry["etag"] != etag
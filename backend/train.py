@@ -5,7 +5,11 @@ import os
 from dataset import MyDataset
 import numpy as np
 import time
-from model import LipCoordNet
+import copy
+import json
+from model import LipCoordNet, LipCoordOnlyNet, architecture_from_state_dict
+from checkpoints import load_weights, safetensors_path, save_safetensors
+from feature_cache import CachedFeatureDataset, FeatureCache, freeze_backbone, head_from_features
 import torch.optim as optim
 from tensorboardX import SummaryWriter
 import options as opt
@@ -30,11 +34,86 @@ def show_lr(optimizer):
     return np.array(lr).mean()
 
 
-def ctc_decode(y):
+def ctc_decode(y, lengths=None):
     y = y.argmax(-1)
+    if lengths is not None:
+        # packed GRUs leave constant logits on padded frames; decode only the clip
+        return [MyDataset.ctc_arr2txt(y[_, : lengths[_]], start=1) for _ in range(y.size(0))]
     return [MyDataset.ctc_arr2txt(y[_], start=1) for _ in range(y.size(0))]
 
 
+def load_teacher(weights):
+    """Frozen LipCoordNet teacher for distillation, sized from its checkpoint"""
+    state_dict = load_weights(weights)
+    teacher = LipCoordNet(**architecture_from_state_dict(state_dict))
+    teacher.load_state_dict(state_dict)
+    teacher = teacher.cuda().eval()
+    for param in teacher.parameters():
+        param.requires_grad = False
+    return teacher
+
+
+def distillation_loss(y, teacher_y, vid_len, temperature):
+    """
+    Per-frame KL(teacher || student) on temperature-softened logits, averaged
+    over the frames inside vid_len and scaled by T^2 so its gradients stay
+    comparable to the CTC term
+    """
+    log_p = (y / temperature).log_softmax(-1)
+    teacher_log_p = (teacher_y / temperature).log_softmax(-1)
+    kl = (teacher_log_p.exp() * (teacher_log_p - log_p)).sum(-1)
+    mask = torch.arange(kl.size(1), device=kl.device)[None, :] < vid_len.view(-1, 1)
+    return (kl * mask).sum() / mask.sum().clamp(min=1) * temperature**2
+
+
+def cpu_latency_ms(model, frames=75, repeats=10):
+    """Median batch-1 CPU latency of a copy of model on a frames-long clip"""
+    model = copy.deepcopy(model).cpu().eval()
+    vid = torch.randn(1, 3, frames, 64, 128) if getattr(model, "uses_video", True) else None
+    coord = torch.randn(1, frames, 20, 2)
+    timings = []
+    with torch.no_grad():
+        model(vid, coord)
+        for _ in range(repeats):
+            tic = time.perf_counter()
+            model(vid, coord)
+            timings.append((time.perf_counter() - tic) * 1000)
+    return float(np.median(timings))
+
+
+def distill_report(student, teacher, student_metrics, teacher_metrics, savename):
+    """Print teacher and student WER/CER/CPU latency side by side and write <savename>.distill.json"""
+    rows = {}
+    for name, m, (loss, wer, cer) in (
+        ("teacher", teacher, teacher_metrics),
+        ("student", student, student_metrics),
+    ):
+        rows[name] = {
+            "params": sum(p.numel() for p in m.parameters()),
+            "loss": float(loss),
+            "wer": float(wer),
+            "cer": float(cer),
+            "cpu_ms": cpu_latency_ms(m),
+        }
+    rows["speedup"] = rows["teacher"]["cpu_ms"] / rows["student"]["cpu_ms"]
+    rows["student_config"] = {
+        "conv_channels": list(student.conv_channels),
+        "gru_hidden_dim": student.gru_hidden_dim,
+        "separable": student.separable,
+    }
+
+    print("".join(101 * "-"))
+    print("{:<10}|{:>12}|{:>10}|{:>10}|{:>16}".format("model", "params", "wer", "cer", "cpu ms (T=75)"))
+    for name in ("teacher", "student"):
+        r = rows[name]
+        print("{:<10}|{:>12}|{:>10.4f}|{:>10.4f}|{:>16.1f}".format(name, r["params"], r["wer"], r["cer"], r["cpu_ms"]))
+    print("student speedup: {:.2f}x".format(rows["speedup"]))
+    print("".join(101 * "-"))
+    with open(os.path.splitext(savename)[0] + ".distill.json", "w") as f:
+        json.dump(rows, f, indent=2)
+    return rows
+
+
 def test(model, net):
     with torch.no_grad():
         dataset = MyDataset(
@@ -58,13 +137,13 @@ def test(model, net):
         print("RUNNING VALIDATION")
         pbar = tqdm(loader)
         for i_iter, input in enumerate(pbar):
-            vid = input.get("vid").cuda(non_blocking=opt.pin_memory)
+            vid = input.get("vid").cuda(non_blocking=opt.pin_memory) if getattr(model, "uses_video", True) else None
             txt = input.get("txt").cuda(non_blocking=opt.pin_memory)
             vid_len = input.get("vid_len").cuda(non_blocking=opt.pin_memory)
             txt_len = input.get("txt_len").cuda(non_blocking=opt.pin_memory)
             coord = input.get("coord").cuda(non_blocking=opt.pin_memory)
 
-            y = net(vid, coord)
+            y = net(vid, coord, vid_len)
 
             loss = (
                 crit(
@@ -78,7 +157,7 @@ def test(model, net):
                 .numpy()
             )
             loss_list.append(loss)
-            pred_txt = ctc_decode(y)
+            pred_txt = ctc_decode(y, vid_len)
 
             truth_txt = [MyDataset.arr2txt(txt[_], start=1) for _ in range(txt.size(0))]
             wer.extend(MyDataset.wer(pred_txt, truth_txt))
@@ -103,7 +182,7 @@ def test(model, net):
         return (np.array(loss_list).mean(), np.array(wer).mean(), np.array(cer).mean())
 
 
-def train(model, net):
+def train(model, net, teacher=None):
     dataset = MyDataset(
         opt.video_path,
         opt.anno_path,
@@ -122,6 +201,11 @@ def train(model, net):
     print("num_train_data:{}".format(len(dataset.data)))
     crit = nn.CTCLoss()
     tic = time.time()
+    teacher_metrics = None
+    if teacher is not None:
+        alpha = getattr(opt, "distill_alpha", 0.5)
+        temperature = getattr(opt, "distill_temperature", 2.0)
+        print("distilling: alpha={},temperature={}".format(alpha, temperature))
 
     train_wer = []
     for epoch in range(opt.max_epoch):
@@ -130,20 +214,26 @@ def train(model, net):
 
         for i_iter, input in enumerate(pbar):
             model.train()
-            vid = input.get("vid").cuda(non_blocking=opt.pin_memory)
+            vid = input.get("vid").cuda(non_blocking=opt.pin_memory) if getattr(model, "uses_video", True) else None
             txt = input.get("txt").cuda(non_blocking=opt.pin_memory)
             vid_len = input.get("vid_len").cuda(non_blocking=opt.pin_memory)
             txt_len = input.get("txt_len").cuda(non_blocking=opt.pin_memory)
             coord = input.get("coord").cuda(non_blocking=opt.pin_memory)
 
             optimizer.zero_grad()
-            y = net(vid, coord)
+            y = net(vid, coord, vid_len)
             loss = crit(
                 y.transpose(0, 1).log_softmax(-1),
                 txt,
                 vid_len.view(-1),
                 txt_len.view(-1),
             )
+            if teacher is not None:
+                with torch.no_grad():
+                    teacher_y = teacher(input.get("vid").cuda(non_blocking=opt.pin_memory), coord, vid_len)
+                loss = (1 - alpha) * loss + alpha * distillation_loss(
+                    y, teacher_y, vid_len, temperature
+                )
             loss.backward()
 
             if opt.is_optimize:
@@ -151,7 +241,7 @@ def train(model, net):
 
             tot_iter = i_iter + epoch * len(loader)
 
-            pred_txt = ctc_decode(y)
+            pred_txt = ctc_decode(y, vid_len)
 
             truth_txt = [MyDataset.arr2txt(txt[_], start=1) for _ in range(txt.size(0))]
             train_wer.extend(MyDataset.wer(pred_txt, truth_txt))
@@ -193,15 +283,111 @@ def train(model, net):
                 if not os.path.exists(path):
                     os.makedirs(path)
                 torch.save(model.state_dict(), savename)
+                if getattr(opt, "save_safetensors", False):
+                    save_safetensors(model.state_dict(), safetensors_path(savename))
+                if teacher is not None:
+                    if teacher_metrics is None:
+                        teacher_metrics = test(teacher, teacher)
+                    distill_report(model, teacher, (loss, wer, cer), teacher_metrics, savename)
                 if not opt.is_optimize:
                     exit()
 
 
+def finetune(model, stage):
+    """Train the layers above a frozen backbone from cached per-clip features"""
+    datasets = {}
+    for phase, file_list in (("train", opt.train_list), ("test", opt.val_list)):
+        # cached clips are computed without the training-time random flip
+        dataset = MyDataset(
+            opt.video_path,
+            opt.anno_path,
+            opt.coords_path,
+            file_list,
+            opt.vid_padding,
+            opt.txt_padding,
+            "test",
+        )
+        cache = FeatureCache(getattr(opt, "feature_cache", "feature_cache"), model, stage)
+        cache.build(model, dataset, opt.batch_size, opt.num_workers)
+        datasets[phase] = CachedFeatureDataset(dataset, cache)
+
+    loader = dataset2dataloader(datasets["train"])
+    val_loader = dataset2dataloader(datasets["test"], shuffle=False)
+    params = [p for p in model.parameters() if p.requires_grad]
+    optimizer = optim.Adam(params, lr=opt.base_lr, weight_decay=0.0, amsgrad=True)
+    crit = nn.CTCLoss()
+    print("num_train_data:{},trainable params:{}".format(len(datasets["train"]), sum(p.numel() for p in params)))
+
+    def run(input):
+        features = input.get("features").cuda(non_blocking=opt.pin_memory).transpose(0, 1)
+        coord = input.get("coord").cuda(non_blocking=opt.pin_memory)
+        vid_len = input.get("vid_len").cuda(non_blocking=opt.pin_memory)
+        txt = input.get("txt").cuda(non_blocking=opt.pin_memory)
+        txt_len = input.get("txt_len").cuda(non_blocking=opt.pin_memory)
+        y = head_from_features(model, features, coord, vid_len, stage)
+        loss = crit(y.transpose(0, 1).log_softmax(-1), txt, vid_len.view(-1), txt_len.view(-1))
+        pred_txt = ctc_decode(y, vid_len)
+        truth_txt = [MyDataset.arr2txt(txt[_], start=1) for _ in range(txt.size(0))]
+        return loss, MyDataset.wer(pred_txt, truth_txt), MyDataset.cer(pred_txt, truth_txt)
+
+    tot_iter = 0
+    for epoch in range(opt.max_epoch):
+        model.train()
+        train_wer = []
+        for input in tqdm(loader):
+            optimizer.zero_grad()
+            loss, wer, _ = run(input)
+            loss.backward()
+            optimizer.step()
+            train_wer.extend(wer)
+            tot_iter += 1
+            if tot_iter % opt.display == 0:
+                writer.add_scalar("train loss", loss, tot_iter)
+                writer.add_scalar("train wer", np.array(train_wer).mean(), tot_iter)
+
+        model.eval()
+        loss_list, wer, cer = [], [], []
+        with torch.no_grad():
+            for input in val_loader:
+                loss, batch_wer, batch_cer = run(input)
+                loss_list.append(loss.item())
+                wer.extend(batch_wer)
+                cer.extend(batch_cer)
+        (loss, wer, cer) = (np.mean(loss_list), np.mean(wer), np.mean(cer))
+        print(
+            "epoch={},train_wer={},val loss={},wer={},cer={}".format(
+                epoch, np.array(train_wer).mean(), loss, wer, cer
+            )
+        )
+        writer.add_scalar("val loss", loss, tot_iter)
+        writer.add_scalar("wer", wer, tot_iter)
+        writer.add_scalar("cer", cer, tot_iter)
+        # the full model is saved, so the checkpoint serves like any other
+        savename = "{}_finetune_{}_loss_{}_wer_{}_cer_{}.pt".format(
+            opt.save_prefix, stage, loss, wer, cer
+        )
+        (path, name) = os.path.split(savename)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        torch.save(model.state_dict(), savename)
+        if getattr(opt, "save_safetensors", False):
+            save_safetensors(model.state_dict(), safetensors_path(savename))
+
+
 if __name__ == "__main__":
     print("Loading options...")
     os.environ["CUDA_VISIBLE_DEVICES"] = opt.gpu
     writer = SummaryWriter()
-    model = LipCoordNet()
+    # coord_only trains the fast-tier model; save it as <weights>.coords.pt for serving
+    teacher = None
+    if getattr(opt, "coord_only", False):
+        model = LipCoordOnlyNet()
+    elif getattr(opt, "distill", False):
+        # opt.student: LipCoordNet kwargs, e.g. dict(conv_channels=(16, 32, 48), gru_hidden_dim=128, separable=True)
+        model = LipCoordNet(**getattr(opt, "student", {}))
+        teacher = load_teacher(getattr(opt, "teacher_weights", None) or opt.weights)
+    else:
+        model = LipCoordNet()
     model = model.cuda()
     net = nn.DataParallel(model).cuda()
 
@@ -214,10 +400,6 @@ if __name__ == "__main__":
             if k in model_dict.keys() and v.size() == model_dict[k].size()
         }
 
-        # freeze the pretrained layers
-        for k, param in pretrained_dict.items():
-            param.requires_grad = False
-
         missed_params = [
             k for k, v in model_dict.items() if not k in pretrained_dict.keys()
         ]
@@ -234,4 +416,11 @@ if __name__ == "__main__":
     torch.cuda.manual_seed_all(opt.random_seed)
     torch.backends.cudnn.benchmark = True
 
-    train(model, net)
+    if getattr(opt, "finetune", False):
+        # freeze the pretrained backbone on the model itself and train the rest from cached features
+        stage = "gru1" if getattr(opt, "freeze_gru1", False) else "frontend"
+        frozen = freeze_backbone(model, stage)
+        print("frozen params:{}".format(frozen))
+        finetune(model, stage)
+    else:
+        train(model, net, teacher)
@@ -6,6 +6,12 @@ Common utilities for the lipreading backend service.
 """
 
 from .config import Config
-from .logger import setup_logger, default_logger
+from .logger import setup_logger
+
+def __getattr__(name):
+    if name == "default_logger":
+        from .logger import default_logger
+        return default_logger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = ["Config", "setup_logger", "default_logger"]
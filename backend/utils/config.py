@@ -9,6 +9,21 @@ Handles environment variables, paths, and application settings.
 import os
 from typing import List
 
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a cgroup (container) CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on Windows/macOS
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
 class Config:
     """Application configuration"""
     
@@ -31,6 +46,86 @@ class Config:
         "pretrain/LipCoordNet_coords_loss_0.025581153109669685_wer_0.01746208431890914_cer_0.006488426950253695.pt"
     )
     DEVICE: str = os.getenv("DEVICE", "cpu")
+    # Check .safetensors weights against their .sha256 sidecar before loading
+    VERIFY_CHECKSUMS: bool = os.getenv("VERIFY_CHECKSUMS", "true").lower() == "true"
+    # Frames per front-end window for long clips (0 runs the whole clip at once)
+    CHUNK_FRAMES: int = int(os.getenv("CHUNK_FRAMES", 250))
+    # Trailing frames re-decoded for each provisional transcript of a chunked clip
+    PARTIAL_WINDOW_FRAMES: int = int(os.getenv("PARTIAL_WINDOW_FRAMES", 250))
+    # eager | optimized | torchscript | onnx | int8 (export.py / quantize.py build the artifacts)
+    MODEL_BACKEND: str = os.getenv("MODEL_BACKEND", "eager")
+    # Fast tier: coordinate-only model at <weights>.coords.pt, used for mode=fast and, with
+    # mode=auto, once this many clips are queued in the pipeline (0 disables the switch)
+    FAST_MODE_QUEUE_DEPTH: int = int(os.getenv("FAST_MODE_QUEUE_DEPTH", 6))
+    # MODEL_BACKEND=optimized: auto (self-benchmark at load) | inference_mode | channels_last |
+    # channels_last_bf16 | compile | compile_bf16
+    CPU_OPT_VARIANT: str = os.getenv("CPU_OPT_VARIANT", "auto")
+    CPU_OPT_COMPILE: bool = os.getenv("CPU_OPT_COMPILE", "false").lower() == "true"  # adds tens of seconds to load
+    CPU_OPT_BENCH_FRAMES: int = int(os.getenv("CPU_OPT_BENCH_FRAMES", 75))
+    CPU_OPT_TRIALS: int = int(os.getenv("CPU_OPT_TRIALS", 3))
+    # Share of decoded frames a bf16 variant must keep identical to fp32
+    CPU_OPT_MIN_AGREEMENT: float = float(os.getenv("CPU_OPT_MIN_AGREEMENT", 0.98))
+    # MODEL_BACKEND=mock: no weights, fixed latency and transcript (load testing)
+    MOCK_MODEL_MS_PER_FRAME: float = float(os.getenv("MOCK_MODEL_MS_PER_FRAME", 2.0))
+    MOCK_TRANSCRIPT: str = os.getenv("MOCK_TRANSCRIPT", "BIN BLUE AT F TWO NOW")
+    # dlib 68-landmark predictor; empty searches the usual locations (landmarks.PREDICTOR_PATHS)
+    PREDICTOR_PATH: str = os.getenv("PREDICTOR_PATH", "")
+    # Synthetic clip run through the whole path before a worker reports ready (75 frames = one GRID clip)
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_FRAMES: int = int(os.getenv("WARMUP_FRAMES", 75))
+    WARMUP_PASSES: int = int(os.getenv("WARMUP_PASSES", 2))
+    
+    # Concurrency
+    CPU_COUNT: int = available_cpus()
+    # Torch intra-op threads per API worker; the pre-fork server runs one worker per this many cores
+    INTRA_OP_THREADS: int = max(1, int(os.getenv("INTRA_OP_THREADS", min(4, CPU_COUNT))))
+    API_WORKERS: int = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+    # Load weights and the dlib predictor in the server parent so forked workers share the pages.
+    # Off by default: workers are only forked (and /healthz answered) once the parent has loaded them
+    PRELOAD_MODELS: bool = os.getenv("PRELOAD_MODELS", "false").lower() == "true"
+    # Per-request frame pool; defaults to an even share of the cores per API worker
+    FRAME_WORKERS: int = max(1, int(os.getenv("FRAME_WORKERS", CPU_COUNT // API_WORKERS)))
+    # Thread budget (see thread_budget): each worker's cores are split between concurrent
+    # model forwards (MODEL_CONCURRENCY, default cores // INTRA_OP_THREADS) and intra-op threads
+    MODEL_CONCURRENCY: int = int(os.getenv("MODEL_CONCURRENCY", 0))
+    INTEROP_THREADS: int = max(1, int(os.getenv("INTEROP_THREADS", 1)))
+    # Threads per OpenCV call; frames are already spread over the frame pool
+    OPENCV_THREADS: int = max(1, int(os.getenv("OPENCV_THREADS", 1)))
+    # Endpoint threadpool (file I/O, waiting on the pipeline); compute is bounded by the slots above
+    API_THREADS: int = max(1, int(os.getenv("API_THREADS", 40)))
+    
+    # Staged /predict pipeline: workers per stage and bounded queues between them
+    PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", 8))
+    PIPELINE_DECODE_WORKERS: int = int(os.getenv("PIPELINE_DECODE_WORKERS", 2))
+    PIPELINE_LANDMARK_WORKERS: int = int(os.getenv("PIPELINE_LANDMARK_WORKERS", 2))
+    PIPELINE_MODEL_BATCH: int = int(os.getenv("PIPELINE_MODEL_BATCH", 4))
+    PIPELINE_TTS_WORKERS: int = int(os.getenv("PIPELINE_TTS_WORKERS", 4))
+    PIPELINE_RENDER_WORKERS: int = int(os.getenv("PIPELINE_RENDER_WORKERS", 2))
+    # eager: TTS + video before /predict returns; lazy: on first GET /outputs; background: right after
+    RENDER_MODE: str = os.getenv("RENDER_MODE", "lazy").lower()
+    
+    # Live streaming (/ws/predict)
+    LIVE_WINDOW_FRAMES: int = int(os.getenv("LIVE_WINDOW_FRAMES", 75))  # sliding window decoded each time
+    LIVE_STRIDE_FRAMES: int = int(os.getenv("LIVE_STRIDE_FRAMES", 25))  # new frames between partial transcripts
+    LIVE_QUEUE_FRAMES: int = int(os.getenv("LIVE_QUEUE_FRAMES", 50))  # oldest frames are dropped beyond this
+    
+    # Asynchronous jobs (/jobs)
+    JOBS_DIR: str = os.getenv("JOBS_DIR", "jobs")
+    JOBS_DB_PATH: str = os.getenv("JOBS_DB_PATH", os.path.join(JOBS_DIR, "jobs.db"))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 1))
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", 900))  # running jobs not heartbeating for this long are requeued
+    JOB_HEARTBEAT_SECONDS: float = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    CALLBACK_TIMEOUT: float = float(os.getenv("CALLBACK_TIMEOUT", 10))
+    CALLBACK_ALLOW_PRIVATE: bool = os.getenv("CALLBACK_ALLOW_PRIVATE", "false").lower() == "true"  # local development only
+    
+    # Generated outputs: local directory store with TTL and LRU size quota
+    OUTPUT_BACKEND: str = os.getenv("OUTPUT_BACKEND", "local")
+    OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", "outputs")
+    OUTPUT_INDEX_PATH: str = os.getenv("OUTPUT_INDEX_PATH", os.path.join(OUTPUT_DIR, ".index.db"))
+    OUTPUT_TTL_SECONDS: int = int(os.getenv("OUTPUT_TTL_SECONDS", 24 * 3600))
+    OUTPUT_MAX_MB: int = int(os.getenv("OUTPUT_MAX_MB", 512))
+    OUTPUT_SWEEP_SECONDS: int = int(os.getenv("OUTPUT_SWEEP_SECONDS", 300))
     
     # External Dependencies
     IMAGEMAGICK_PATH: str = os.getenv(
@@ -46,14 +141,55 @@ class Config:
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     
+    # Tracing: none | json (flat span lines) | otlp (OTLP/JSON file exporter format)
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none").lower()
+    TRACE_FILE: str = os.getenv("TRACE_FILE", os.path.join("traces", "spans.jsonl"))
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "lipreading-backend")
+    
     # TTS Configuration
     TTS_LANGUAGE: str = os.getenv("TTS_LANGUAGE", "en")
     TTS_SLOW: bool = os.getenv("TTS_SLOW", "false").lower() == "true"
+    # gtts | fake (silent local MP3 after FAKE_TTS_LATENCY seconds, for offline load tests)
+    TTS_BACKEND: str = os.getenv("TTS_BACKEND", "gtts").lower()
+    FAKE_TTS_LATENCY: float = float(os.getenv("FAKE_TTS_LATENCY", 0.3))
+    
+    # Rate limiting (api_complete.py, slowapi syntax)
+    PREDICT_RATE_LIMIT: str = os.getenv("PREDICT_RATE_LIMIT", "5/minute")
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
     
     # Video Processing
     VIDEO_CODEC: str = os.getenv("VIDEO_CODEC", "libx264")
     AUDIO_CODEC: str = os.getenv("AUDIO_CODEC", "aac")
     
+    @classmethod
+    def default_server_workers(cls) -> int:
+        """Worker processes for the pre-fork server: WEB_CONCURRENCY, else cores / intra-op threads"""
+        if os.getenv("WEB_CONCURRENCY"):
+            return cls.API_WORKERS
+        return max(1, cls.CPU_COUNT // cls.INTRA_OP_THREADS)
+    
+    @classmethod
+    def set_api_workers(cls, workers: int) -> None:
+        """Record the number of server processes and re-split the per-process frame pool"""
+        cls.API_WORKERS = max(1, workers)
+        if not os.getenv("FRAME_WORKERS"):
+            cls.FRAME_WORKERS = max(1, cls.CPU_COUNT // cls.API_WORKERS)
+    
+    @classmethod
+    def thread_budget(cls) -> dict:
+        """Effective per-worker thread layout for torch, OpenCV, the frame pool and the API executor"""
+        cores = max(1, cls.CPU_COUNT // cls.API_WORKERS)
+        intra_op = min(cls.INTRA_OP_THREADS, cores)
+        return {
+            "cores": cores,
+            "model_concurrency": cls.MODEL_CONCURRENCY or max(1, cores // intra_op),
+            "intra_op_threads": intra_op,
+            "interop_threads": cls.INTEROP_THREADS,
+            "opencv_threads": cls.OPENCV_THREADS,
+            "frame_workers": cls.FRAME_WORKERS,
+            "api_threads": cls.API_THREADS,
+        }
+    
     @classmethod
     def validate(cls) -> bool:
         """Validate configuration"""
@@ -74,4 +210,9 @@ class Config:
         print(f"  Base URL: {cls.BASE_URL}")
         print(f"  Device: {cls.DEVICE}")
         print(f"  Weights: {cls.WEIGHTS_PATH}")
+        print(f"  Backend: {cls.MODEL_BACKEND}")
+        print(f"  Render Mode: {cls.RENDER_MODE}")
+        print(f"  Workers: {cls.API_WORKERS} API x {cls.FRAME_WORKERS} frame threads ({cls.CPU_COUNT} cores)")
+        budget = cls.thread_budget()
+        print(f"  Model Threads: {budget['model_concurrency']} concurrent forward(s) x {budget['intra_op_threads']} intra-op")
         print(f"  Log Level: {cls.LOG_LEVEL}")
@@ -10,6 +10,7 @@ import logging
 import sys
 from typing import Optional
 from .config import Config
+from .tracing import current_request_id
 
 class ColoredFormatter(logging.Formatter):
     """Colored log formatter for better readability"""
@@ -35,6 +36,13 @@ class ColoredFormatter(logging.Formatter):
         
         return super().format(record)
 
+class RequestIdFilter(logging.Filter):
+    """Tag records with the request id bound by utils.tracing ("-" outside a request)"""
+    
+    def filter(self, record):
+        record.request_id = current_request_id() or "-"
+        return True
+
 def setup_logger(name: Optional[str] = None) -> logging.Logger:
     """
     Setup enhanced logger with colors and proper formatting
@@ -59,10 +67,11 @@ def setup_logger(name: Optional[str] = None) -> logging.Logger:
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
+    console_handler.addFilter(RequestIdFilter())
     
     # Create formatter
     formatter = ColoredFormatter(
-        fmt='%(asctime)s | %(name)s | %(levelname)s | %(message)s',
+        fmt='%(asctime)s | %(name)s | %(levelname)s | %(request_id)s | %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
@@ -74,5 +83,10 @@ def setup_logger(name: Optional[str] = None) -> logging.Logger:
     
     return logger
 
-# Create default logger
-default_logger = setup_logger("lipreading")
+def __getattr__(name):
+    # default_logger is created on first access rather than at import
+    if name == "default_logger":
+        global default_logger
+        default_logger = setup_logger("lipreading")
+        return default_logger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
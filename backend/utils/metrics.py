@@ -0,0 +1,261 @@
+"""
+Metrics
+=======
+
+Minimal Prometheus-compatible metrics for the lipreading backend.
+Counters, gauges and histograms are kept in process memory and rendered
+in the Prometheus text exposition format by ``render_metrics`` (served
+at ``/metrics``). Gauges can be backed by a callback so values such as
+queue depth are read at scrape time.
+
+Note:
+    Values are per process; with several API workers each worker reports
+    its own series, so scrape them individually or aggregate by instance.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans per-frame landmark work (ms) up to whole-clip rendering (tens of s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.label_names:
+            values = {(): 0}
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """
+        Read the gauge from a callback when metrics are scraped
+
+        Args:
+            function: Returns {label values tuple: value}; use () as the key for an unlabelled gauge
+        """
+        self._function = function
+
+    def samples(self) -> Iterable[str]:
+        if self._function is not None:
+            try:
+                values = dict(self._function())
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+            if not values and not self.label_names:
+                values = {(): 0}
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket distribution of observed values (seconds by convention)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def totals(self, **labels) -> Tuple[int, float]:
+        """(observation count, sum) for one label set"""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0], 0.0))
+            return sum(counts), total
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, (("le", _format_value(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text format"""
+    return REGISTRY.render()
+
+
+# ---------------------------------------------------------------------------
+# Service metrics
+# ---------------------------------------------------------------------------
+
+# upload, decode, face_detection, alignment, model_forward, ctc_decode, tts, render
+STAGE_SECONDS = Histogram(
+    "lipreading_stage_seconds",
+    "Time spent per processing stage (face_detection/alignment are per frame, the rest per request)",
+    ["stage"],
+)
+HTTP_REQUESTS = Counter("lipreading_http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram("lipreading_http_request_seconds", "HTTP request latency", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("lipreading_http_requests_in_flight", "HTTP requests currently being handled")
+FRAMES_PROCESSED = Counter("lipreading_frames_processed_total", "Video frames run through landmark detection")
+FRAMES_NO_FACE = Counter("lipreading_frames_no_face_total", "Frames in which no face was detected")
+MODEL_LOAD_SECONDS = Gauge("lipreading_model_load_seconds", "Time taken to load each model runtime", ["backend"])
+QUEUE_DEPTH = Gauge("lipreading_queue_depth", "Items waiting in a queue", ["queue"])
+PROCESS_MEMORY = Gauge("lipreading_process_resident_memory_bytes", "Resident memory of this worker process", ["pid"])
+LANDMARK_LOAD_SECONDS = Gauge("lipreading_landmark_load_seconds", "Time taken to parse the dlib shape predictor")
+LANDMARK_MEMORY_BYTES = Gauge("lipreading_landmark_memory_bytes", "Resident memory added by loading the dlib shape predictor")
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Resident memory of this process, or None where it cannot be read (Windows)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        try:
+            import resource
+        except ImportError:  # Windows
+            return None
+        # No procfs (macOS): peak RSS in bytes is the closest portable figure
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _resident_memory() -> Dict[Tuple[str, ...], float]:
+    rss = resident_memory_bytes()
+    if rss is None:
+        return {}
+    return {(str(os.getpid()),): rss}
+
+
+PROCESS_MEMORY.set_function(_resident_memory)
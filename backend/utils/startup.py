@@ -0,0 +1,83 @@
+"""
+Startup State
+=============
+
+Phase timings and readiness for one API process. Liveness (``/healthz``)
+is answered as soon as the app is serving; heavy subsystems (torch, dlib,
+the model runtime and the landmark predictor) are loaded and warmed up on
+a background thread afterwards, and readiness (``/readyz``) flips only once
+that is done. Phase timings and warmup latency are reported by ``/startup``.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .logger import setup_logger
+
+logger = setup_logger("startup")
+
+
+class StartupState:
+    """Ordered phase timings and a readiness flag"""
+
+    def __init__(self):
+        self.created = time.time()
+        self.ready_at: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.warmup: Dict = {"status": "pending"}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time one startup phase
+
+        Failures are recorded under the phase name and re-raised.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(name, seconds)
+            logger.info(f"⏱️ Startup phase {name}: {seconds:.2f}s")
+
+    def set_warmup(self, status: str, **details) -> None:
+        with self._lock:
+            self.warmup = {"status": status, **details}
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.time()
+        logger.info(f"✅ Ready {self.ready_at - self.created:.2f}s after import")
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def report(self) -> Dict:
+        with self._lock:
+            phases = {name: round(seconds, 3) for name, seconds in self.phases.items()}
+            errors = dict(self.errors)
+            warmup = dict(self.warmup)
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.created, 3),
+            "time_to_ready_seconds": round(self.ready_at - self.created, 3) if self.ready else None,
+            "phases": phases,
+            "errors": errors,
+            "warmup": warmup,
+        }
+
+
+STARTUP = StartupState()
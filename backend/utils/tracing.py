@@ -0,0 +1,199 @@
+"""
+Request Tracing
+===============
+
+Lightweight spans for following one request through the backend.
+``trace_request`` binds a request id (the ``unique_id`` of /predict, or a
+job id) to the current context; ``span`` records nested, timed sections
+with attributes such as frame count or faces found. Finished spans are
+appended to a local file, either as flat JSON lines or as OTLP/JSON
+(one ``ExportTraceServiceRequest`` per line, the OpenTelemetry collector
+file format). The request id is also added to every ``utils.logger`` line.
+
+Context lives in ``contextvars``: it follows ``run_in_threadpool`` calls,
+and ``wrap`` carries it into plain thread pools.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from .config import Config
+
+_current_request_id = contextvars.ContextVar("request_id", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+
+_export_lock = threading.Lock()
+
+
+class Span:
+    """A timed section of work inside a trace"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes or {})
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return 1000.0 * ((self.end or time.time()) - self.start)
+
+    def to_json(self, request_id: Optional[str]) -> Dict[str, Any]:
+        return {
+            "request_id": request_id,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(int(self.start * 1e9)),
+            "endTimeUnixNano": str(int((self.end or time.time()) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _trace_id(request_id: str) -> str:
+    """32-hex trace id; uuid request ids map onto it directly"""
+    try:
+        return uuid.UUID(str(request_id)).hex
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_OID, str(request_id)).hex
+
+
+def _export(span: Span, request_id: Optional[str]) -> None:
+    exporter = Config.TRACE_EXPORTER
+    if exporter == "none":
+        return
+    if exporter == "otlp":
+        record = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": Config.TRACE_SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "lipreading"}, "spans": [span.to_otlp()]}],
+            }]
+        }
+    else:
+        record = span.to_json(request_id)
+    line = json.dumps(record, default=str)
+    with _export_lock:
+        os.makedirs(os.path.dirname(Config.TRACE_FILE) or ".", exist_ok=True)
+        with open(Config.TRACE_FILE, "a") as f:
+            f.write(line + "\n")
+
+
+def current_request_id() -> Optional[str]:
+    return _current_request_id.get()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def trace_request(request_id: str, name: str = "request", **attributes):
+    """
+    Start a trace for a request and bind its id to the current context
+
+    Args:
+        request_id: Id shown in logs and used to derive the trace id
+        name: Name of the root span
+        **attributes: Initial root span attributes
+    """
+    request_token = _current_request_id.set(str(request_id))
+    try:
+        with span(name, **attributes) as root:
+            yield root
+    finally:
+        _current_request_id.reset(request_token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a section of work as a child of the current span
+
+    Outside a trace this is a no-op and yields None.
+    """
+    request_id = _current_request_id.get()
+    if request_id is None:
+        yield None
+        return
+    parent = _current_span.get()
+    trace_id = parent.trace_id if parent else _trace_id(request_id)
+    current = Span(name, trace_id, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_attribute("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.end = time.time()
+        _current_span.reset(token)
+        _export(current, request_id)
+
+
+def record_span(name: str, start: float, end: float, **attributes) -> None:
+    """Record an already finished section (e.g. shared batch work) under the current span"""
+    request_id = _current_request_id.get()
+    if request_id is None:
+        return
+    parent = _current_span.get()
+    trace_id = parent.trace_id if parent else _trace_id(request_id)
+    finished = Span(name, trace_id, parent.span_id if parent else None, attributes)
+    finished.start, finished.end = start, end
+    _export(finished, request_id)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute on the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def wrap(fn: Callable) -> Callable:
+    """Bind fn to the caller's trace context so it can run on another thread"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # a copy per call, since one Context cannot be entered by two threads at once
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run